@@ -1,14 +1,96 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, send_file
+from flask import (Flask, render_template, request, redirect, url_for, jsonify, session, send_file,
+                   g, has_request_context)
+import click
 import json
 import os
+import random
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
 import base64
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from thumbnails import (ThumbnailCache, ThumbnailError, render_placeholders,
+                        ALLOWED_SIZES as THUMB_SIZES, FORMATS as THUMB_FORMATS)
+from streaming import BlockCache, FaststartCache, StreamProxy, UpstreamBusy, UpstreamError
+from local_media import open_local_media
+from uploads import UploadStore, UploadError, UploadNotFound, UploadConflict
+import mp4
+import storage
+from catalog_import import import_catalog, ingest_videos, CatalogImportError
+from media_metadata import MetadataIndexer, apply_metadata, next_retry
+from link_health import LinkHealthChecker
+from jobs import JobQueue, JobError
+from metrics import Metrics
+from profiling import ProfileStore
+from invalidation import Generations
+from slow_log import SlowRequestLog
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 app.secret_key = 'vc7day_secret_key_2024'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['MEDIA_CHUNK_SIZE'] = 256 * 1024
+# Subidas por partes en curso (fuera de static/ para que no se publiquen a medias)
+app.config['UPLOAD_PARTIAL_FOLDER'] = 'cache/uploads'
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['UPLOAD_MAX_BYTES'] = 20 * 1024 * 1024 * 1024
+app.config['THUMB_CACHE_DIR'] = 'cache/thumbs'
+app.config['THUMB_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+# Servir los videos a través de /stream en lugar de enlazar el origen
+app.config['STREAM_PROXY'] = True
+app.config['STREAM_CHUNK_SIZE'] = 64 * 1024
+app.config['STREAM_MAX_CONNECTIONS_PER_HOST'] = 8
+# Caché en disco de bloques de video (None para desactivarla)
+app.config['STREAM_CACHE_DIR'] = 'cache/stream'
+app.config['STREAM_CACHE_BLOCK_SIZE'] = 1024 * 1024
+app.config['STREAM_CACHE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024
+# Copias "faststart" (moov al principio) de los videos de origen que lo necesiten
+app.config['FASTSTART_CACHE_DIR'] = 'cache/faststart'
+app.config['FASTSTART_CACHE_MAX_BYTES'] = 20 * 1024 * 1024 * 1024
+# Hilos para leer duración, resolución y códecs de los videos
+app.config['METADATA_WORKERS'] = 4
+# Comprobación de enlaces rotos (intervalo en segundos; 0 la desactiva)
+app.config['LINK_HEALTH_DB'] = 'link_health.db'
+app.config['LINK_CHECK_INTERVAL'] = 300
+app.config['LINK_CHECK_MAX_AGE'] = 6 * 3600
+# Registros que se acumulan en memoria antes de volcarse durante una importación
+app.config['IMPORT_BATCH_SIZE'] = 500
+# Cola de trabajos en segundo plano (JOB_WORKERS = 0 si se ejecuta aparte con 'flask run-jobs')
+app.config['JOBS_DB'] = 'jobs.db'
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_UPLOAD_FOLDER'] = 'cache/jobs'
+# Cabecera Server-Timing con el tiempo de cada fase (para las herramientas del navegador)
+app.config['SERVER_TIMING'] = False
+# Registro JSON lines de las peticiones que superan SLOW_REQUEST_MS
+# (SLOW_LOG = None lo activa siempre que la aplicación no esté en modo debug)
+app.config['SLOW_LOG'] = None
+app.config['SLOW_LOG_FILE'] = 'logs/slow_requests.jsonl'
+app.config['SLOW_REQUEST_MS'] = 500
+# Directorio compartido por los workers para las métricas de /metrics
+app.config['METRICS_DIR'] = 'cache/metrics'
+# Contadores de generación compartidos por los workers: un cambio del catálogo en un
+# worker invalida la copia en memoria de los demás sin un os.stat() por petición.
+# CATALOG_STAT_INTERVAL: cada cuántos segundos se mira igualmente data.json (ediciones externas)
+app.config['GENERATIONS_FILE'] = 'cache/generations'
+app.config['CATALOG_STAT_INTERVAL'] = 1.0
+# Modo ASGI (asgi.py): hilos que ejecutan las vistas y leen los cuerpos de las respuestas,
+# y cada cuántos segundos se consulta un trabajo para enviar sus eventos
+app.config['ASGI_THREADS'] = 64
+app.config['JOB_EVENTS_INTERVAL'] = 1.0
+# Perfilado de peticiones: fracción muestreada al azar (0 lo desactiva) y modo
+# ('sampling' o 'cprofile'). Un administrador puede pedirlo con la cabecera X-Profile: 1
+app.config['PROFILE_SAMPLE_RATE'] = 0.0
+app.config['PROFILE_MODE'] = 'sampling'
+app.config['PROFILE_DIR'] = 'cache/profiles'
+app.config['PROFILE_KEEP'] = 200
+# Filas por página en los listados de administración
+app.config['ADMIN_PAGE_SIZE'] = 50
 
 # Archivo JSON para almacenar datos
 DATA_FILE = 'data.json'
@@ -93,20 +175,119 @@ def init_data():
         }
         save_data(default_data)
 
-def load_data():
+def save_data(data):
+    storage.save_catalog(DATA_FILE, data)
+
+# Métricas por endpoint (latencia total y tiempo de cada fase) en formato Prometheus
+metrics = Metrics(app.config['METRICS_DIR'])
+metrics.counter('requests_total', 'Peticiones atendidas por endpoint, método y código de estado')
+metrics.histogram('request_duration_seconds', 'Duración de las peticiones por endpoint')
+metrics.histogram('request_phase_seconds',
+                  'Tiempo de cada fase de la petición (lectura e índices del catálogo, relacionados, plantillas, guardado)')
+
+@contextmanager
+def request_phase(name):
+    """Suma el tiempo del bloque a la fase name de la petición en curso"""
+    if not has_request_context() or 'phases' not in g:
+        yield
+        return
+    started = time.perf_counter()
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {"categories": [], "playlists": [], "videos": [], "settings": {
-            "related_videos_count": 6,
-            "auto_related": True,
-            "default_related_strategy": "category"
-        }}
+        yield
+    finally:
+        g.phases[name] = g.phases.get(name, 0) + time.perf_counter() - started
 
-def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.phases = {}
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - g.request_started
+        metrics.observe('request_duration_seconds', elapsed, endpoint=endpoint)
+        metrics.inc('requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+        for phase, seconds in g.phases.items():
+            metrics.observe('request_phase_seconds', seconds, endpoint=endpoint, phase=phase)
+        if app.config['SERVER_TIMING']:
+            timings = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in g.phases.items()]
+            timings.append(f'total;dur={elapsed * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        if elapsed * 1000 >= app.config['SLOW_REQUEST_MS'] and slow_log_enabled():
+            log_slow_request(endpoint, response, elapsed)
+    return response
+
+slow_log = SlowRequestLog(app.config['SLOW_LOG_FILE'])
+
+def slow_log_enabled():
+    enabled = app.config['SLOW_LOG']
+    return not app.debug if enabled is None else enabled
+
+def log_slow_request(endpoint, response, elapsed):
+    # Solo se mira la versión del catálogo que ya está en memoria, sin recargarla
+    catalog = catalog_store.cached()
+    slow_log.log({
+        'method': request.method,
+        'path': request.path,
+        'args': request.args.to_dict(flat=False),
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in g.phases.items()},
+        'catalog': {section: len(getattr(catalog, section)) for section in storage.SECTIONS} if catalog else None,
+        'worker': os.getpid(),
+    })
+
+profile_store = ProfileStore(app.config['PROFILE_DIR'], keep=app.config['PROFILE_KEEP'])
+
+@app.before_request
+def start_profiler():
+    # Sin perfilar, el coste es una comparación con un número aleatorio
+    if not (random.random() < app.config['PROFILE_SAMPLE_RATE']
+            or request.headers.get('X-Profile') == '1' and session.get('logged_in')):
+        return
+    profiler = profile_store.profiler(app.config['PROFILE_MODE'])
+    try:
+        profiler.start()
+    except ValueError:
+        # Solo puede haber un cProfile activo a la vez
+        return
+    g.profiler = profiler
+
+@app.after_request
+def save_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        name = profile_store.save(profiler, app.config['PROFILE_MODE'], {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+            'phases': {phase: round(seconds * 1000, 2) for phase, seconds in g.phases.items()},
+            'pid': os.getpid(),
+        })
+        response.headers['X-Profile-Name'] = name
+    return response
+
+@app.teardown_request
+def stop_profiler(error=None):
+    # Si la petición terminó sin pasar por after_request, el muestreador no debe seguir vivo
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Catálogo en memoria con índices; se recarga solo cuando data.json cambia
+generations = Generations(app.config['GENERATIONS_FILE'])
+catalog_store = storage.CatalogStore(DATA_FILE, timer=request_phase, generations=generations,
+                                     stat_interval=app.config['CATALOG_STAT_INTERVAL'])
 
 # Middleware para verificar autenticación
 def login_required(f):
@@ -119,24 +300,55 @@ def login_required(f):
     return decorated_function
 
 # Funciones auxiliares
-def get_category_name(category_id, categories):
-    category = next((c for c in categories if c['id'] == category_id), None)
+def get_category_name(category_id, catalog):
+    category = catalog.categories.get(category_id)
     return category['name'] if category else 'Sin categoría'
 
-def get_playlist_name(playlist_id, playlists):
-    playlist = next((p for p in playlists if p['id'] == playlist_id), None)
+def get_playlist_name(playlist_id, catalog):
+    playlist = catalog.playlists.get(playlist_id)
     return playlist['name'] if playlist else 'Sin playlist'
 
+def admin_listing(catalog, section, default_sort):
+    """Página de un listado de administración según los parámetros de la URL"""
+    sort = request.args.get('sort', default_sort)
+    if sort not in storage.SORT_KEYS[section]:
+        sort = default_sort
+    descending = request.args.get('order', 'desc') != 'asc'
+    per_page = app.config['ADMIN_PAGE_SIZE']
+    page = max(request.args.get('page', 1, type=int), 1)
+    filters = {
+        'category_id': request.args.get('category', type=int),
+        'playlist_id': request.args.get('playlist', type=int) if section == 'videos' else None,
+        'text': request.args.get('q', '').strip(),
+    }
+    total, records = catalog.query(section, sort, descending, offset=(page - 1) * per_page,
+                                   limit=per_page, **filters)
+    return {
+        'records': records,
+        'total': total,
+        'page': page,
+        'pages': max(-(-total // per_page), 1),
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'filters': filters,
+    }
+
+@app.template_global()
+def listing_url(**changes):
+    """URL del listado actual cambiando algunos parámetros (página, orden, filtros)"""
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **{key: value for key, value in args.items() if value not in (None, '')})
+
 # Rutas principales
 @app.route('/')
 def index():
-    data = load_data()
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
-    playlists = data.get('playlists', [])
+    catalog = catalog_store.read()
+    categories = catalog.data['categories']
+    playlists = catalog.data['playlists']
     
     # Ordenar videos por fecha de creación (más recientes primero)
-    videos.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    videos = sorted(catalog.data['videos'], key=lambda x: x.get('created_at', ''), reverse=True)
     
     return render_template('index.html', 
                          categories=categories, 
@@ -145,84 +357,75 @@ def index():
 
 @app.route('/category/<int:category_id>')
 def category_videos(category_id):
-    data = load_data()
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
-    playlists = data.get('playlists', [])
+    catalog = catalog_store.read()
     
-    category_videos = [v for v in videos if v['category_id'] == category_id]
-    category_playlists = [p for p in playlists if p['category_id'] == category_id]
-    category = next((c for c in categories if c['id'] == category_id), None)
+    category_videos = catalog.videos_in_category(category_id)
+    category_playlists = catalog.playlists_in_category(category_id)
+    category = catalog.categories.get(category_id)
     
     return render_template('category.html', 
-                         categories=categories,
+                         categories=catalog.data['categories'],
                          videos=category_videos,
                          playlists=category_playlists,
                          current_category=category)
 
 @app.route('/playlist/<int:playlist_id>')
 def playlist_videos(playlist_id):
-    data = load_data()
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
-    playlists = data.get('playlists', [])
+    catalog = catalog_store.read()
     
-    playlist = next((p for p in playlists if p['id'] == playlist_id), None)
+    playlist = catalog.playlists.get(playlist_id)
     if not playlist:
         return "Playlist no encontrada", 404
     
-    playlist_videos = [v for v in videos if v['id'] in playlist.get('videos', [])]
-    category = next((c for c in categories if c['id'] == playlist['category_id']), None)
+    playlist_videos = catalog.playlist_videos(playlist)
+    category = catalog.categories.get(playlist['category_id'])
     
     return render_template('playlist.html', 
-                         categories=categories,
+                         categories=catalog.data['categories'],
                          videos=playlist_videos,
                          playlist=playlist,
                          category=category)
 
 @app.route('/video/<int:video_id>')
 def watch_video(video_id):
-    data = load_data()
-    videos = data.get('videos', [])
-    categories = data.get('categories', [])
-    playlists = data.get('playlists', [])
-    settings = data.get('settings', {})
-    
-    video = next((v for v in videos if v['id'] == video_id), None)
-    if not video:
+    if video_id not in catalog_store.read().videos:
         return "Video no encontrado", 404
     
     # Incrementar vistas
-    video['views'] = video.get('views', 0) + 1
-    save_data(data)
+    with catalog_store.write() as catalog:
+        video = catalog.increment(video_id, 'views')
+    if not video:
+        return "Video no encontrado", 404
     
     # Obtener videos relacionados
-    related_videos = get_related_videos(video, videos, settings)
+    with request_phase('related'):
+        related_videos = get_related_videos(video, catalog, catalog.settings)
     
     # Obtener categoría del video
-    video_category = next((c for c in categories if c['id'] == video['category_id']), None)
+    video_category = catalog.categories.get(video['category_id'])
     
     # Obtener playlist del video si existe
     video_playlist = None
     if video.get('playlist_id'):
-        video_playlist = next((p for p in playlists if p['id'] == video['playlist_id']), None)
+        video_playlist = catalog.playlists.get(video['playlist_id'])
     
     return render_template('watch.html', 
                          video=video,
                          video_category=video_category,
                          video_playlist=video_playlist,
-                         categories=categories,
+                         categories=catalog.data['categories'],
                          related_videos=related_videos)
 
-def get_related_videos(current_video, all_videos, settings):
+def get_related_videos(current_video, catalog, settings):
     """Obtiene videos relacionados basado en la configuración"""
     related_videos = []
+    all_videos = catalog.data['videos']
     
     # Primero usar videos relacionados configurados manualmente
     manual_related = current_video.get('related_videos', [])
     if manual_related:
         for video_id in manual_related:
-            related_video = next((v for v in all_videos if v['id'] == video_id), None)
+            related_video = catalog.videos.get(video_id)
             if related_video and related_video['id'] != current_video['id']:
                 related_videos.append(related_video)
     
@@ -233,9 +436,8 @@ def get_related_videos(current_video, all_videos, settings):
         
         if strategy == 'category':
             # Videos de la misma categoría
-            category_related = [v for v in all_videos 
-                              if v['category_id'] == current_video['category_id'] 
-                              and v['id'] != current_video['id']
+            category_related = [v for v in catalog.videos_in_category(current_video['category_id'])
+                              if v['id'] != current_video['id']
                               and v not in related_videos]
             related_videos.extend(category_related)
         
@@ -268,7 +470,7 @@ def get_related_videos(current_video, all_videos, settings):
 @app.route('/search')
 def search():
     query = request.args.get('q', '')
-    data = load_data()
+    data = catalog_store.read().data
     categories = data.get('categories', [])
     videos = data.get('videos', [])
     playlists = data.get('playlists', [])
@@ -307,7 +509,7 @@ def admin_logout():
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    data = load_data()
+    data = catalog_store.read().data
     return render_template('admin_dashboard.html', 
                          categories=data.get('categories', []),
                          videos=data.get('videos', []),
@@ -317,88 +519,77 @@ def admin_dashboard():
 @app.route('/admin/settings', methods=['GET', 'POST'])
 @login_required
 def admin_settings():
-    data = load_data()
-    
     if request.method == 'POST':
-        settings = data.get('settings', {})
-        settings['related_videos_count'] = int(request.form.get('related_videos_count', 6))
-        settings['auto_related'] = 'auto_related' in request.form
-        settings['default_related_strategy'] = request.form.get('default_related_strategy', 'category')
-        
-        data['settings'] = settings
-        save_data(data)
+        with catalog_store.write() as catalog:
+            settings = catalog.settings
+            settings['related_videos_count'] = int(request.form.get('related_videos_count', 6))
+            settings['auto_related'] = 'auto_related' in request.form
+            settings['default_related_strategy'] = request.form.get('default_related_strategy', 'category')
         return redirect(url_for('admin_settings'))
     
     return render_template('admin_settings.html', 
-                         settings=data.get('settings', {}))
+                         settings=catalog_store.read().settings)
 
 @app.route('/admin/categories')
 @login_required
 def admin_categories():
-    data = load_data()
-    return render_template('admin_categories.html', categories=data.get('categories', []))
+    return render_template('admin_categories.html', categories=catalog_store.read().data['categories'])
 
 @app.route('/admin/categories/add', methods=['POST'])
 @login_required
 def add_category():
-    data = load_data()
-    categories = data.get('categories', [])
-    
-    new_category = {
-        "id": max([c['id'] for c in categories], default=0) + 1,
-        "name": request.form.get('name'),
-        "icon": request.form.get('icon'),
-        "created_at": datetime.now().isoformat()
-    }
-    
-    categories.append(new_category)
-    data['categories'] = categories
-    save_data(data)
+    with catalog_store.write() as catalog:
+        catalog.add_category({
+            "id": catalog.next_id('categories'),
+            "name": request.form.get('name'),
+            "icon": request.form.get('icon'),
+            "created_at": datetime.now().isoformat()
+        })
     
     return redirect(url_for('admin_categories'))
 
 @app.route('/admin/categories/delete/<int:category_id>')
 @login_required
 def delete_category(category_id):
-    data = load_data()
-    categories = data.get('categories', [])
-    
-    # Verificar si hay videos en esta categoría
-    videos_in_category = [v for v in data.get('videos', []) if v['category_id'] == category_id]
-    if videos_in_category:
+    # Comprobación con el índice inverso antes de abrir la transacción
+    catalog = catalog_store.read()
+    if catalog.videos_in_category(category_id):
         return "No se puede eliminar la categoría porque tiene videos asociados", 400
+    if catalog.playlists_in_category(category_id):
+        return "No se puede eliminar la categoría porque tiene playlists asociadas", 400
     
-    data['categories'] = [c for c in categories if c['id'] != category_id]
-    save_data(data)
+    try:
+        with catalog_store.write() as catalog:
+            catalog.delete_category(category_id)
+    except storage.CatalogError as e:
+        return str(e), 400
     
     return redirect(url_for('admin_categories'))
 
 @app.route('/admin/playlists')
 @login_required
 def admin_playlists():
-    data = load_data()
-    playlists = data.get('playlists', [])
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
+    catalog = catalog_store.read()
+    listing = admin_listing(catalog, 'playlists', 'created_at')
     
-    # Agregar información adicional a las playlists
-    for playlist in playlists:
-        playlist['category_name'] = get_category_name(playlist['category_id'], categories)
-        playlist['videos_count'] = len(playlist.get('videos', []))
+    # Agregar información adicional a las playlists de la página (en copias: el catálogo es compartido)
+    playlists = []
+    for playlist in listing['records']:
+        playlist = dict(playlist,
+                        category_name=get_category_name(playlist['category_id'], catalog),
+                        videos_count=len(playlist.get('videos', [])))
         if playlist.get('videos'):
-            playlist['first_video'] = next((v for v in videos if v['id'] == playlist['videos'][0]), None)
+            playlist['first_video'] = catalog.videos.get(playlist['videos'][0])
+        playlists.append(playlist)
     
     return render_template('admin_playlists.html', 
                          playlists=playlists, 
-                         categories=categories,
-                         videos=videos)
+                         categories=catalog.data['categories'],
+                         listing=listing)
 
 @app.route('/admin/playlists/add', methods=['POST'])
 @login_required
 def add_playlist():
-    data = load_data()
-    playlists = data.get('playlists', [])
-    
     # Procesar videos de la playlist
     videos_input = request.form.get('videos', '')
     playlist_videos = []
@@ -408,31 +599,25 @@ def add_playlist():
         except:
             playlist_videos = []
     
-    new_playlist = {
-        "id": max([p['id'] for p in playlists], default=0) + 1,
-        "name": request.form.get('name'),
-        "description": request.form.get('description'),
-        "category_id": int(request.form.get('category_id')),
-        "videos": playlist_videos,
-        "thumbnail": request.form.get('thumbnail'),
-        "created_at": datetime.now().isoformat()
-    }
-    
-    playlists.append(new_playlist)
-    data['playlists'] = playlists
-    save_data(data)
+    with catalog_store.write() as catalog:
+        catalog.add_playlist({
+            "id": catalog.next_id('playlists'),
+            "name": request.form.get('name'),
+            "description": request.form.get('description'),
+            "category_id": int(request.form.get('category_id')),
+            "videos": playlist_videos,
+            "thumbnail": request.form.get('thumbnail'),
+            "created_at": datetime.now().isoformat()
+        })
     
     return redirect(url_for('admin_playlists'))
 
 @app.route('/admin/playlists/edit/<int:playlist_id>', methods=['GET', 'POST'])
 @login_required
 def edit_playlist(playlist_id):
-    data = load_data()
-    playlists = data.get('playlists', [])
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
+    catalog = catalog_store.read()
     
-    playlist = next((p for p in playlists if p['id'] == playlist_id), None)
+    playlist = catalog.playlists.get(playlist_id)
     if not playlist:
         return "Playlist no encontrada", 404
     
@@ -446,65 +631,70 @@ def edit_playlist(playlist_id):
             except:
                 playlist_videos = []
         
-        playlist['name'] = request.form.get('name')
-        playlist['description'] = request.form.get('description')
-        playlist['category_id'] = int(request.form.get('category_id'))
-        playlist['thumbnail'] = request.form.get('thumbnail')
-        playlist['videos'] = playlist_videos
-        
-        save_data(data)
+        with catalog_store.write() as catalog:
+            catalog.update_playlist(playlist_id,
+                                    name=request.form.get('name'),
+                                    description=request.form.get('description'),
+                                    category_id=int(request.form.get('category_id')),
+                                    thumbnail=request.form.get('thumbnail'),
+                                    videos=playlist_videos)
         return redirect(url_for('admin_playlists'))
     
     # Obtener información de videos de la playlist
-    playlist_videos_info = []
-    for video_id in playlist.get('videos', []):
-        video = next((v for v in videos if v['id'] == video_id), None)
-        if video:
-            playlist_videos_info.append(video)
+    playlist_videos_info = catalog.playlist_videos(playlist)
     
     return render_template('admin_edit_playlist.html', 
                          playlist=playlist, 
-                         categories=categories,
-                         videos=videos,
+                         categories=catalog.data['categories'],
+                         videos=catalog.data['videos'],
                          playlist_videos_info=playlist_videos_info)
 
 @app.route('/admin/playlists/delete/<int:playlist_id>')
 @login_required
 def delete_playlist(playlist_id):
-    data = load_data()
-    playlists = data.get('playlists', [])
-    
-    data['playlists'] = [p for p in playlists if p['id'] != playlist_id]
-    save_data(data)
+    # Los videos que apuntaban a la playlist quedan sin playlist
+    with catalog_store.write() as catalog:
+        catalog.delete_playlist(playlist_id)
     
     return redirect(url_for('admin_playlists'))
 
 @app.route('/admin/videos')
 @login_required
 def admin_videos():
-    data = load_data()
-    categories = data.get('categories', [])
-    videos = data.get('videos', [])
-    playlists = data.get('playlists', [])
+    catalog = catalog_store.read()
+    categories = catalog.data['categories']
+    playlists = catalog.data['playlists']
+    listing = admin_listing(catalog, 'videos', 'created_at')
+    
+    # Agregar información adicional a los videos de la página (en copias: el catálogo es compartido)
+    videos = [dict(video,
+                   category_name=get_category_name(video['category_id'], catalog),
+                   playlist_name=get_playlist_name(video.get('playlist_id'), catalog))
+              for video in listing['records']]
     
-    # Agregar información adicional a cada video
-    for video in videos:
-        video['category_name'] = get_category_name(video['category_id'], categories)
-        video['playlist_name'] = get_playlist_name(video.get('playlist_id'), playlists)
+    # Estado de los enlaces según la última comprobación (sin peticiones de red)
+    link_health = link_checker.statuses([url for v in videos for url in (v.get('video_url'), v.get('thumbnail')) if url])
     
     return render_template('admin_videos.html', 
                          videos=videos, 
                          categories=categories,
-                         playlists=playlists)
+                         playlists=playlists,
+                         link_health=link_health,
+                         listing=listing)
 
 @app.route('/admin/videos/add', methods=['POST'])
 @login_required
 def add_video():
-    data = load_data()
-    videos = data.get('videos', [])
+    with catalog_store.write() as catalog:
+        catalog.add_video(build_video(catalog, request.form))
+    job_queue.enqueue('index_metadata', unique=True)
     
+    return redirect(url_for('admin_videos'))
+
+def build_video(catalog, form, **overrides):
+    """Crea un video nuevo a partir de los campos del formulario"""
     # Procesar videos relacionados
-    related_videos_input = request.form.get('related_videos', '')
+    related_videos_input = form.get('related_videos', '')
     related_videos = []
     if related_videos_input:
         try:
@@ -513,41 +703,34 @@ def add_video():
             related_videos = []
     
     # Procesar playlist_id (puede estar vacío)
-    playlist_id = request.form.get('playlist_id')
+    playlist_id = form.get('playlist_id')
     if playlist_id and playlist_id != 'None':
         playlist_id = int(playlist_id)
     else:
         playlist_id = None
     
     new_video = {
-        "id": max([v['id'] for v in videos], default=0) + 1,
-        "title": request.form.get('title'),
-        "description": request.form.get('description'),
-        "video_url": request.form.get('video_url'),
-        "thumbnail": request.form.get('thumbnail'),
-        "category_id": int(request.form.get('category_id')),
+        "id": catalog.next_id('videos'),
+        "title": form.get('title'),
+        "description": form.get('description'),
+        "video_url": form.get('video_url'),
+        "thumbnail": form.get('thumbnail'),
+        "category_id": int(form.get('category_id')),
         "playlist_id": playlist_id,
         "views": 0,
         "likes": 0,
         "related_videos": related_videos,
         "created_at": datetime.now().isoformat()
     }
-    
-    videos.append(new_video)
-    data['videos'] = videos
-    save_data(data)
-    
-    return redirect(url_for('admin_videos'))
+    new_video.update(overrides)
+    return new_video
 
 @app.route('/admin/videos/edit/<int:video_id>', methods=['GET', 'POST'])
 @login_required
 def edit_video(video_id):
-    data = load_data()
-    videos = data.get('videos', [])
-    categories = data.get('categories', [])
-    playlists = data.get('playlists', [])
+    catalog = catalog_store.read()
     
-    video = next((v for v in videos if v['id'] == video_id), None)
+    video = catalog.videos.get(video_id)
     if not video:
         return "Video no encontrado", 404
     
@@ -568,21 +751,22 @@ def edit_video(video_id):
         else:
             playlist_id = None
         
-        video['title'] = request.form.get('title')
-        video['description'] = request.form.get('description')
-        video['video_url'] = request.form.get('video_url')
-        video['thumbnail'] = request.form.get('thumbnail')
-        video['category_id'] = int(request.form.get('category_id'))
-        video['playlist_id'] = playlist_id
-        video['related_videos'] = related_videos
-        
-        save_data(data)
+        with catalog_store.write() as catalog:
+            catalog.update_video(video_id,
+                                 title=request.form.get('title'),
+                                 description=request.form.get('description'),
+                                 video_url=request.form.get('video_url'),
+                                 thumbnail=request.form.get('thumbnail'),
+                                 category_id=int(request.form.get('category_id')),
+                                 playlist_id=playlist_id,
+                                 related_videos=related_videos)
+        job_queue.enqueue('index_metadata', unique=True)
         return redirect(url_for('admin_videos'))
     
     # Agregar nombres de videos relacionados para mostrar
     related_videos_info = []
     for related_id in video.get('related_videos', []):
-        related_video = next((v for v in videos if v['id'] == related_id), None)
+        related_video = catalog.videos.get(related_id)
         if related_video:
             related_videos_info.append({
                 'id': related_video['id'],
@@ -591,27 +775,39 @@ def edit_video(video_id):
     
     return render_template('admin_edit_video.html', 
                          video=video, 
-                         categories=categories,
-                         playlists=playlists,
+                         categories=catalog.data['categories'],
+                         playlists=catalog.data['playlists'],
                          related_videos_info=related_videos_info,
-                         all_videos=[v for v in videos if v['id'] != video_id])
+                         all_videos=[v for v in catalog.data['videos'] if v['id'] != video_id])
 
 @app.route('/admin/videos/delete/<int:video_id>')
 @login_required
 def delete_video(video_id):
-    data = load_data()
-    videos = data.get('videos', [])
-    
-    data['videos'] = [v for v in videos if v['id'] != video_id]
-    save_data(data)
+    # También se quita de las playlists y de los relacionados de otros videos
+    with catalog_store.write() as catalog:
+        catalog.delete_video(video_id)
     
     return redirect(url_for('admin_videos'))
 
 @app.route('/admin/export')
 @login_required
 def export_data():
-    data = load_data()
-    return jsonify(data)
+    # Se envía entidad por entidad leyendo data.json, sin cargar el catálogo
+    if request.args.get('format') == 'ndjson':
+        chunks = storage.export_ndjson(DATA_FILE)
+        mimetype, filename = 'application/x-ndjson', 'vc7day_data.ndjson'
+    else:
+        chunks = storage.export_json(DATA_FILE)
+        mimetype, filename = 'application/json', 'vc7day_data.json'
+
+    if request.args.get('gzip') == '1':
+        chunks = storage.gzip_chunks(chunks)
+        mimetype, filename = 'application/gzip', f'{filename}.gz'
+
+    response = app.response_class(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/admin/import', methods=['POST'])
 @login_required
@@ -623,27 +819,23 @@ def import_data():
     if file.filename == '':
         return "No se seleccionó archivo", 400
     
-    if file and file.filename.endswith('.json'):
-        try:
-            imported_data = json.load(file)
-            save_data(imported_data)
-            return redirect(url_for('admin_dashboard'))
-        except:
-            return "Error al importar el archivo", 400
-    
-    return "Archivo no válido", 400
+    filename = file.filename.lower().removesuffix('.gz')
+    if not filename.endswith(('.json', '.ndjson', '.jsonl')):
+        return "Archivo no válido", 400
+
+    # La importación se hace en segundo plano; el catálogo solo se sustituye si el archivo es válido
+    path = save_job_upload(file.stream, filename)
+    job_id = job_queue.enqueue('import_catalog', {'path': path, 'ndjson': not filename.endswith('.json')})
+    return job_accepted(job_id)
 
 # API para likes
 @app.route('/api/video/<int:video_id>/like', methods=['POST'])
 def like_video(video_id):
-    data = load_data()
-    videos = data.get('videos', [])
-    
-    video = next((v for v in videos if v['id'] == video_id), None)
-    if video:
-        video['likes'] = video.get('likes', 0) + 1
-        save_data(data)
-        return jsonify({'likes': video['likes']})
+    if video_id in catalog_store.read().videos:
+        with catalog_store.write() as catalog:
+            video = catalog.increment(video_id, 'likes')
+        if video:
+            return jsonify({'likes': video['likes']})
     
     return jsonify({'error': 'Video no encontrado'}), 404
 
@@ -651,8 +843,7 @@ def like_video(video_id):
 @app.route('/api/videos/search')
 def api_videos_search():
     query = request.args.get('q', '')
-    data = load_data()
-    videos = data.get('videos', [])
+    videos = catalog_store.read().data['videos']
     
     if query:
         results = [{'id': v['id'], 'title': v['title']} 
@@ -666,8 +857,7 @@ def api_videos_search():
 @app.route('/api/playlists/search')
 def api_playlists_search():
     query = request.args.get('q', '')
-    data = load_data()
-    playlists = data.get('playlists', [])
+    playlists = catalog_store.read().data['playlists']
     
     if query:
         results = [{'id': p['id'], 'name': p['name']} 
@@ -677,6 +867,494 @@ def api_playlists_search():
     
     return jsonify(results)
 
+# Miniaturas redimensionadas desde la caché local
+@app.route('/thumb/<int:video_id>/<int:width>x<int:height>')
+def video_thumbnail(video_id, width, height):
+    video = catalog_store.read().videos.get(video_id)
+    if not video or not video.get('thumbnail'):
+        return "Miniatura no encontrada", 404
+    return serve_thumbnail(video['thumbnail'], width, height)
+
+@app.route('/thumb/playlist/<int:playlist_id>/<int:width>x<int:height>')
+def playlist_thumbnail(playlist_id, width, height):
+    playlist = catalog_store.read().playlists.get(playlist_id)
+    if not playlist or not playlist.get('thumbnail'):
+        return "Miniatura no encontrada", 404
+    return serve_thumbnail(playlist['thumbnail'], width, height)
+
+def serve_thumbnail(source_url, width, height):
+    if (width, height) not in THUMB_SIZES:
+        return "Tamaño no permitido", 404
+    
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    try:
+        path, etag = thumbnail_cache.get(source_url, width, height, fmt)
+    except ThumbnailError:
+        return "No se pudo obtener la miniatura", 502
+    
+    response = send_file(path, mimetype=THUMB_FORMATS[fmt][1], etag=etag, max_age=7 * 24 * 3600)
+    response.cache_control.public = True
+    response.vary.add('Accept')
+    return response
+
+# Imágenes de reemplazo generadas al arrancar, sin depender de terceros
+@app.route('/placeholder/<kind>/<int:width>x<int:height>.png')
+def placeholder_image(kind, width, height):
+    image = placeholder_images.get((kind, width, height))
+    if image is None:
+        return "Imagen no encontrada", 404
+    
+    response = app.response_class(image, mimetype='image/png')
+    response.set_etag(f'{kind}-{width}x{height}')
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def placeholder_url(width, height, kind='video'):
+    return url_for('placeholder_image', kind=kind, width=width, height=height)
+
+def thumb_url(item, width, height, kind='video'):
+    if kind == 'playlist':
+        return url_for('playlist_thumbnail', playlist_id=item['id'], width=width, height=height)
+    return url_for('video_thumbnail', video_id=item['id'], width=width, height=height)
+
+def thumb_srcset(item, width, height, kind='video'):
+    return (f"{thumb_url(item, width, height, kind)} 1x, "
+            f"{thumb_url(item, width * 2, height * 2, kind)} 2x")
+
+thumbnail_cache = ThumbnailCache(app.config['THUMB_CACHE_DIR'], app.config['THUMB_CACHE_MAX_BYTES'])
+placeholder_images = render_placeholders()
+
+# Streaming de video a través del proxy
+@app.route('/stream/<int:video_id>', methods=['GET', 'HEAD'])
+def stream_video(video_id):
+    video = catalog_store.read().videos.get(video_id)
+    if not video or not video.get('video_url'):
+        return "Video no encontrado", 404
+    
+    try:
+        local_copy = None
+        if faststart_cache is not None:
+            local_copy = faststart_cache.lookup(video['video_url'], background.submit)
+        if local_copy:
+            status, headers, body = open_local_media(local_copy, request.environ, app.config['MEDIA_CHUNK_SIZE'])
+        else:
+            status, headers, body = stream_proxy.open(video['video_url'],
+                                                      range_header=request.headers.get('Range'),
+                                                      if_range=request.headers.get('If-Range'),
+                                                      method=request.method)
+    except UpstreamBusy:
+        return "Servidor de video ocupado", 503, {'Retry-After': '1'}
+    except UpstreamError:
+        return "No se pudo obtener el video", 502
+    
+    return app.response_class(body, status=status, headers=headers, direct_passthrough=True)
+
+# Archivos de video locales con rangos y envío sin copia (sendfile)
+@app.route('/media/<path:filename>', methods=['GET', 'HEAD'])
+def local_media(filename):
+    path = safe_join(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+    if path is None or not os.path.isfile(path):
+        return "Archivo no encontrado", 404
+    
+    status, headers, body = open_local_media(path, request.environ, app.config['MEDIA_CHUNK_SIZE'])
+    return app.response_class(body, status=status, headers=headers, direct_passthrough=True)
+
+# Subida de videos por partes: crear -> PUT de cada parte -> finalizar
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    payload = request.get_json(silent=True) or {}
+    fields = {name: payload.get(name) for name in
+              ('title', 'description', 'thumbnail', 'category_id', 'playlist_id', 'related_videos')}
+    if not str(fields['category_id'] or '').isdigit():
+        return jsonify({'error': 'Categoría no válida'}), 400
+    
+    status = upload_store.create(payload.get('filename'), payload.get('size'), fields)
+    return jsonify(status), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    return jsonify(upload_store.status(upload_id))
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'error': 'Faltan offset o Content-Length'}), 400
+    
+    # request.stream se lee por bloques: la parte nunca se carga entera en memoria
+    checksum = upload_store.write_chunk(upload_id, offset, request.content_length, request.stream,
+                                        sha256=request.headers.get('X-Chunk-Sha256'))
+    return jsonify({'offset': offset, 'sha256': checksum})
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    upload_store.abort(upload_id)
+    return '', 204
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    # Si no se puede crear el video, el archivo vuelve a la subida y se puede reintentar
+    with upload_store.finalize(upload_id) as (final_name, meta):
+        with catalog_store.write() as catalog:
+            new_video = catalog.add_video(build_video(catalog, meta['fields'],
+                                                      video_url=url_for('local_media', filename=final_name)))
+    
+    # Mover moov al principio sin hacer esperar al administrador
+    path = os.path.join(upload_store.upload_folder, final_name)
+    job_queue.enqueue('faststart', {'path': path})
+    
+    return jsonify(new_video), 201
+
+@app.errorhandler(UploadError)
+def handle_upload_error(error):
+    if isinstance(error, UploadNotFound):
+        return jsonify({'error': 'Subida no encontrada'}), 404
+    if isinstance(error, UploadConflict):
+        return jsonify({'error': str(error)}), 409
+    return jsonify({'error': str(error)}), 400
+
+# Tareas internas cortas (comprobaciones de la caché faststart del proxy)
+background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='vc7day-bg')
+
+upload_store = UploadStore(app.config['UPLOAD_PARTIAL_FOLDER'], app.config['UPLOAD_FOLDER'],
+                           chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+                           max_bytes=app.config['UPLOAD_MAX_BYTES'])
+
+def local_media_path(video_url):
+    """Ruta en disco de un video servido desde /media/, o None si es externo"""
+    if not video_url.startswith('/media/'):
+        return None
+    path = safe_join(os.path.abspath(app.config['UPLOAD_FOLDER']), video_url[len('/media/'):])
+    return path if path and os.path.isfile(path) else None
+
+# Metadatos de los videos (duración, resolución, códecs)
+def refresh_metadata(force=False):
+    """Lee los metadatos de los videos nuevos o con URL cambiada y los guarda"""
+    results = metadata_indexer.index(catalog_store.read().data['videos'], force=force)
+    if not results:
+        return 0
+    # Se aplica sobre la versión actual para no pisar cambios hechos mientras se leían los videos
+    with catalog_store.write() as catalog:
+        return apply_metadata(catalog, results)
+
+# Carga masiva de videos desde CSV o NDJSON
+def ingest_format(filename, content_type=''):
+    filename = (filename or '').lower().removesuffix('.gz')
+    if filename.endswith('.csv') or content_type.startswith('text/csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')) or content_type.startswith('application/x-ndjson'):
+        return 'ndjson'
+    return None
+
+@app.route('/admin/videos/bulk', methods=['POST'])
+@login_required
+def bulk_add_videos():
+    # Se admite un archivo de formulario o el CSV/NDJSON directamente como cuerpo
+    file = request.files.get('file')
+    if file and file.filename:
+        source, fmt = file.stream, ingest_format(file.filename)
+    else:
+        source, fmt = request.stream, ingest_format('', request.mimetype)
+    if fmt is None:
+        return jsonify({'error': 'Formato no válido: usa CSV o NDJSON'}), 400
+
+    path = save_job_upload(source, f'videos.{fmt}')
+    job_id = job_queue.enqueue('ingest_videos', {'path': path, 'fmt': fmt,
+                                                 'strict': request.values.get('strict') == '1'})
+    return job_accepted(job_id, json_response=file is None)
+
+@app.cli.command('ingest-videos')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--strict', is_flag=True, help='No añadir nada si alguna fila no es válida')
+def ingest_videos_command(path, strict):
+    """Añade en bloque los videos de un archivo CSV o NDJSON"""
+    fmt = ingest_format(path)
+    if fmt is None:
+        raise click.UsageError('El archivo debe ser .csv, .ndjson o .jsonl (opcionalmente .gz)')
+    error = None
+    with open(path, 'rb') as f:
+        try:
+            report = ingest_videos(f, DATA_FILE, fmt, strict=strict,
+                                   batch_size=app.config['IMPORT_BATCH_SIZE'], lock=catalog_store.locked)
+        except CatalogImportError as e:
+            report, error = e.report, str(e)
+    if report:
+        for item in report.rejected:
+            click.echo(f"Fila {item['position']}: {'; '.join(item['errors'])}", err=True)
+        click.echo(f"{report.accepted['videos']} videos añadidos, {report.rejected_count} filas rechazadas")
+    if error:
+        raise click.ClickException(error)
+    if report.accepted['videos']:
+        refresh_metadata()
+
+@app.route('/admin/videos/index-metadata', methods=['POST'])
+@login_required
+def index_metadata():
+    job_id = job_queue.enqueue('index_metadata', {'force': 'force' in request.form}, unique=True)
+    return job_accepted(job_id)
+
+@app.cli.command('index-metadata')
+@click.option('--force', is_flag=True, help='Volver a leer también los videos ya indexados')
+def index_metadata_command(force):
+    """Lee duración, resolución y códecs de los videos del catálogo"""
+    click.echo(f'{refresh_metadata(force=force)} videos actualizados')
+
+@app.template_filter('duration')
+def format_duration(seconds):
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+@app.template_filter('time_ago')
+def format_time_ago(created_at):
+    try:
+        seconds = (datetime.now() - datetime.fromisoformat(created_at)).total_seconds()
+    except (TypeError, ValueError):
+        return ''
+    for unit_seconds, singular, plural in ((365 * 86400, 'año', 'años'), (30 * 86400, 'mes', 'meses'),
+                                           (7 * 86400, 'semana', 'semanas'), (86400, 'día', 'días'),
+                                           (3600, 'hora', 'horas'), (60, 'minuto', 'minutos')):
+        count = int(seconds // unit_seconds)
+        if count >= 1:
+            return f'hace {count} {singular if count == 1 else plural}'
+    return 'hace un momento'
+
+metadata_indexer = MetadataIndexer(local_media_path, max_workers=app.config['METADATA_WORKERS'])
+
+# Salud de los enlaces de video y miniatura
+def catalog_urls():
+    return [url for v in catalog_store.read().data['videos']
+            for url in (v.get('video_url'), v.get('thumbnail')) if url]
+
+@app.route('/admin/videos/check-links', methods=['POST'])
+@login_required
+def check_links():
+    return job_accepted(job_queue.enqueue('check_links', unique=True))
+
+@app.template_filter('timestamp_ago')
+def format_timestamp_ago(timestamp):
+    return format_time_ago(datetime.fromtimestamp(timestamp).isoformat())
+
+# Perfiles guardados por el perfilado de peticiones
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    return render_template('admin_profiles.html', profiles=profile_store.list()[:100])
+
+@app.route('/admin/profiles/<name>')
+@login_required
+def download_profile(name):
+    path = profile_store.path(name)
+    if path is None:
+        return "Perfil no encontrado", 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+link_checker = LinkHealthChecker(app.config['LINK_HEALTH_DB'], local_media_path,
+                                 max_age=app.config['LINK_CHECK_MAX_AGE'])
+
+def video_src(video):
+    if app.config['STREAM_PROXY'] and video['video_url'].startswith(('http://', 'https://')):
+        return url_for('stream_video', video_id=video['id'])
+    return video['video_url']
+
+stream_block_cache = None
+if app.config['STREAM_CACHE_DIR']:
+    stream_block_cache = BlockCache(app.config['STREAM_CACHE_DIR'],
+                                    block_size=app.config['STREAM_CACHE_BLOCK_SIZE'],
+                                    max_bytes=app.config['STREAM_CACHE_MAX_BYTES'])
+stream_proxy = StreamProxy(chunk_size=app.config['STREAM_CHUNK_SIZE'],
+                           max_connections_per_host=app.config['STREAM_MAX_CONNECTIONS_PER_HOST'],
+                           block_cache=stream_block_cache)
+faststart_cache = None
+if app.config['FASTSTART_CACHE_DIR']:
+    faststart_cache = FaststartCache(app.config['FASTSTART_CACHE_DIR'], stream_proxy,
+                                     max_bytes=app.config['FASTSTART_CACHE_MAX_BYTES'])
+
+# Trabajos en segundo plano de las operaciones largas de administración
+job_queue = JobQueue(app.config['JOBS_DB'], workers=app.config['JOB_WORKERS'])
+
+JOB_LABELS = {
+    'import_catalog': 'Importar catálogo',
+    'ingest_videos': 'Carga masiva de videos',
+    'index_metadata': 'Metadatos de videos',
+    'check_links': 'Comprobar enlaces',
+    'warm_thumbnails': 'Generar miniaturas',
+    'faststart': 'Optimizar video subido',
+}
+
+def save_job_upload(stream, filename):
+    """Copia por bloques un archivo subido a disco para que lo procese un trabajo"""
+    folder = os.path.abspath(app.config['JOB_UPLOAD_FOLDER'])
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}-{secure_filename(filename) or 'upload'}")
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, 1024 * 1024)
+    return path
+
+def job_accepted(job_id, json_response=False):
+    if json_response or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+    return redirect(url_for('job_status', job_id=job_id))
+
+@job_queue.register('import_catalog', max_attempts=1)
+def import_catalog_job(job, path, ndjson):
+    try:
+        # El catálogo solo se bloquea para publicar el resultado, no mientras se lee la subida
+        with open(path, 'rb') as f:
+            report = import_catalog(f, DATA_FILE, ndjson=ndjson, batch_size=app.config['IMPORT_BATCH_SIZE'],
+                                    progress=job.progress, lock=catalog_store.locked)
+    except CatalogImportError as e:
+        raise JobError(str(e), e.report.to_dict() if e.report else None)
+    finally:
+        os.remove(path)
+    job_queue.enqueue('index_metadata', unique=True)
+    return report.to_dict()
+
+@job_queue.register('ingest_videos', max_attempts=1)
+def ingest_videos_job(job, path, fmt, strict):
+    try:
+        with open(path, 'rb') as f:
+            report = ingest_videos(f, DATA_FILE, fmt, strict=strict, batch_size=app.config['IMPORT_BATCH_SIZE'],
+                                   progress=job.progress, lock=catalog_store.locked)
+    except CatalogImportError as e:
+        raise JobError(str(e), e.report.to_dict() if e.report else None)
+    finally:
+        os.remove(path)
+    if report.accepted['videos']:
+        job_queue.enqueue('index_metadata', unique=True)
+    return report.to_dict()
+
+@job_queue.register('index_metadata')
+def index_metadata_job(job, force=False, retry=False):
+    # retry solo distingue los reintentos programados de las pasadas normales, que no deben esperar
+    job.progress(0, 'Leyendo metadatos')
+    updated = refresh_metadata(force=force)
+    retry_at = next_retry(catalog_store.read().data['videos'])
+    if retry_at is not None:
+        job_queue.enqueue('index_metadata', {'retry': True}, unique=True,
+                          delay=max((retry_at - datetime.now()).total_seconds(), 0))
+    return {'updated': updated}
+
+@job_queue.register('check_links')
+def check_links_job(job, batch=100):
+    # Espera a que termine la pasada periódica de cualquier worker en lugar de repetir sus URLs
+    with link_checker.pass_lock():
+        pending = link_checker.stale(catalog_urls())
+        for start in range(0, len(pending), batch):
+            job.progress(start / len(pending), f'{start} de {len(pending)} enlaces comprobados')
+            link_checker.check_urls(pending[start:start + batch])
+    return {'checked': len(pending)}
+
+@job_queue.register('warm_thumbnails')
+def warm_thumbnails_job(job, fmt='webp'):
+    """Genera de antemano las miniaturas de todos los tamaños que usan las plantillas"""
+    catalog = catalog_store.read()
+    sources = sorted({item['thumbnail'] for item in catalog.data['videos'] + catalog.data['playlists']
+                      if item.get('thumbnail')})
+    rendered, errors = 0, 0
+    for index, source_url in enumerate(sources):
+        job.progress(index / len(sources), f'{index} de {len(sources)} imágenes')
+        for width, height in sorted(THUMB_SIZES):
+            try:
+                thumbnail_cache.get(source_url, width, height, fmt)
+                rendered += 1
+            except ThumbnailError:
+                errors += 1
+                break
+    return {'images': len(sources), 'rendered': rendered, 'errors': errors}
+
+@job_queue.register('faststart')
+def faststart_job(job, path):
+    try:
+        mp4.faststart(path, path)
+    except mp4.MP4Error as e:
+        raise JobError(f'No se pudo aplicar faststart: {e}')
+    finally:
+        job_queue.enqueue('index_metadata', unique=True)
+
+@app.route('/admin/jobs')
+@login_required
+def job_list():
+    jobs = job_queue.recent(limit=request.args.get('limit', 20, type=int))
+    for job in jobs:
+        job['label'] = JOB_LABELS.get(job['kind'], job['kind'])
+    return jsonify(jobs)
+
+def labeled_job(job_id):
+    """El trabajo con el nombre legible de su tipo, o None si no existe"""
+    job = job_queue.get(job_id)
+    if job is not None:
+        job['label'] = JOB_LABELS.get(job['kind'], job['kind'])
+    return job
+
+def sse_event(data, retry=None):
+    """Un evento de text/event-stream con data serializado a JSON"""
+    prefix = f'retry: {retry}\n' if retry is not None else ''
+    return f'{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+@app.route('/admin/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = labeled_job(job_id)
+    if job is None:
+        return "Trabajo no encontrado", 404
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        return jsonify(job)
+    # Las importaciones terminadas muestran directamente su informe
+    if job['status'] in ('succeeded', 'failed') and job['result'] and 'accepted' in job['result']:
+        return render_template('admin_import_report.html', report=job['result'], error=job['error'])
+    return render_template('admin_job.html', job=job)
+
+# Progreso del trabajo como eventos. Aquí se envía solo el estado actual y el navegador
+# vuelve a conectar al cabo de JOB_EVENTS_INTERVAL; en modo ASGI la conexión sigue abierta
+# y asgi.py envía cada cambio sin ocupar un hilo mientras espera
+@app.route('/admin/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    job = labeled_job(job_id)
+    if job is None:
+        return "Trabajo no encontrado", 404
+    retry = int(app.config['JOB_EVENTS_INTERVAL'] * 1000)
+    response = app.response_class(sse_event(job, retry=retry), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/admin/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job)
+
+@app.route('/admin/thumbnails/warm', methods=['POST'])
+@login_required
+def warm_thumbnails():
+    return job_accepted(job_queue.enqueue('warm_thumbnails', unique=True))
+
+@app.cli.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help='Hilos que ejecutan trabajos')
+def run_jobs_command(workers):
+    """Ejecuta la cola de trabajos en primer plano (como proceso aparte del servidor web)"""
+    job_queue.workers = workers
+    job_queue.start()
+    click.echo(f'Ejecutando trabajos con {workers} hilos (Ctrl+C para salir)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_queue.stop(timeout=30)
+
 # Templates HTML embebidos
 templates = {
     'index.html': '''
@@ -1212,8 +1890,8 @@ templates = {
                     {% for playlist in playlists %}
                     <div class="playlist-card" onclick="window.location.href='/playlist/{{ playlist.id }}'">
                         <div class="playlist-thumbnail">
-                            <img src="{{ playlist.thumbnail }}" alt="{{ playlist.name }}" 
-                                 onerror="this.src='https://via.placeholder.com/320x180/333333/ffffff?text=Playlist'">
+                            <img src="{{ thumb_url(playlist, 320, 180, kind='playlist') }}" srcset="{{ thumb_srcset(playlist, 320, 180, kind='playlist') }}" alt="{{ playlist.name }}" 
+                                 onerror="this.srcset='';this.src='{{ placeholder_url(320, 180, kind='playlist') }}'">
                             <div class="playlist-video-count">{{ playlist.videos|length }} videos</div>
                         </div>
                         <div class="playlist-info">
@@ -1231,15 +1909,17 @@ templates = {
                 {% for video in videos %}
                 <div class="video-card" onclick="window.location.href='/video/{{ video.id }}'">
                     <div class="video-thumbnail">
-                        <img src="{{ video.thumbnail }}" alt="{{ video.title }}" 
-                             onerror="this.src='https://via.placeholder.com/320x180/333333/ffffff?text=Thumbnail'">
-                        <div class="video-duration">10:30</div>
+                        <img src="{{ thumb_url(video, 320, 180) }}" srcset="{{ thumb_srcset(video, 320, 180) }}" alt="{{ video.title }}" 
+                             onerror="this.srcset='';this.src='{{ placeholder_url(320, 180) }}'">
+                        {% if video.media and video.media.duration %}
+                        <div class="video-duration">{{ video.media.duration|duration }}</div>
+                        {% endif %}
                     </div>
                     <div class="video-info">
                         <h3 class="video-title">{{ video.title }}</h3>
                         <div class="video-meta">
                             <span class="video-views">{{ video.views }} vistas</span>
-                            <span>hace 2 días</span>
+                            <span>{{ video.created_at|time_ago }}</span>
                         </div>
                     </div>
                 </div>
@@ -1798,8 +2478,8 @@ templates = {
                     {% for playlist in playlists %}
                     <div class="playlist-card" onclick="window.location.href='/playlist/{{ playlist.id }}'">
                         <div class="playlist-thumbnail">
-                            <img src="{{ playlist.thumbnail }}" alt="{{ playlist.name }}" 
-                                 onerror="this.src='https://via.placeholder.com/320x180/333333/ffffff?text=Playlist'">
+                            <img src="{{ thumb_url(playlist, 320, 180, kind='playlist') }}" srcset="{{ thumb_srcset(playlist, 320, 180, kind='playlist') }}" alt="{{ playlist.name }}" 
+                                 onerror="this.srcset='';this.src='{{ placeholder_url(320, 180, kind='playlist') }}'">
                             <div class="playlist-video-count">{{ playlist.videos|length }} videos</div>
                         </div>
                         <div class="playlist-info">
@@ -1816,15 +2496,17 @@ templates = {
                 {% for video in videos %}
                 <div class="video-card" onclick="window.location.href='/video/{{ video.id }}'">
                     <div class="video-thumbnail">
-                        <img src="{{ video.thumbnail }}" alt="{{ video.title }}"
-                             onerror="this.src='https://via.placeholder.com/320x180/333333/ffffff?text=Thumbnail'">
-                        <div class="video-duration">10:30</div>
+                        <img src="{{ thumb_url(video, 320, 180) }}" srcset="{{ thumb_srcset(video, 320, 180) }}" alt="{{ video.title }}"
+                             onerror="this.srcset='';this.src='{{ placeholder_url(320, 180) }}'">
+                        {% if video.media and video.media.duration %}
+                        <div class="video-duration">{{ video.media.duration|duration }}</div>
+                        {% endif %}
                     </div>
                     <div class="video-info">
                         <h3 class="video-title">{{ video.title }}</h3>
                         <div class="video-meta">
                             <span class="video-views">{{ video.views }} vistas</span>
-                            <span>hace 2 días</span>
+                            <span>{{ video.created_at|time_ago }}</span>
                         </div>
                     </div>
                 </div>
@@ -2198,8 +2880,8 @@ templates = {
     <div class="container">
         <div class="playlist-header">
             <div class="playlist-thumbnail-large">
-                <img src="{{ playlist.thumbnail }}" alt="{{ playlist.name }}"
-                     onerror="this.src='https://via.placeholder.com/320x180/333333/ffffff?text=Playlist'">
+                <img src="{{ thumb_url(playlist, 320, 180, kind='playlist') }}" srcset="{{ thumb_srcset(playlist, 320, 180, kind='playlist') }}" alt="{{ playlist.name }}"
+                     onerror="this.srcset='';this.src='{{ placeholder_url(320, 180, kind='playlist') }}'">
             </div>
             <div class="playlist-info">
                 <h1 class="playlist-title">{{ playlist.name }}</h1>
@@ -2227,8 +2909,8 @@ templates = {
                 <div class="playlist-video" onclick="window.location.href='/video/{{ video.id }}'">
                     <div class="video-number">{{ loop.index }}</div>
                     <div class="video-thumbnail-small">
-                        <img src="{{ video.thumbnail }}" alt="{{ video.title }}"
-                             onerror="this.src='https://via.placeholder.com/200x112/333333/ffffff?text=Thumbnail'">
+                        <img src="{{ thumb_url(video, 200, 112) }}" srcset="{{ thumb_srcset(video, 200, 112) }}" alt="{{ video.title }}"
+                             onerror="this.srcset='';this.src='{{ placeholder_url(200, 112) }}'">
                     </div>
                     <div class="video-info">
                         <h3 class="video-title">{{ video.title }}</h3>
@@ -2236,7 +2918,9 @@ templates = {
                             {{ video.views }} vistas • {{ video.likes }} likes
                         </div>
                     </div>
-                    <div class="video-duration">10:30</div>
+                    {% if video.media and video.media.duration %}
+                    <div class="video-duration">{{ video.media.duration|duration }}</div>
+                    {% endif %}
                 </div>
                 {% endfor %}
             {% else %}
@@ -2710,7 +3394,7 @@ templates = {
                     poster="{{ video.thumbnail }}"
                     preload="metadata"
                 >
-                    <source src="{{ video.video_url }}" type="video/mp4">
+                    <source src="{{ video_src(video) }}" type="video/mp4">
                     Tu navegador no soporta el elemento de video.
                 </video>
             </div>
@@ -2764,13 +3448,13 @@ templates = {
                 {% for related in related_videos %}
                 <div class="related-video" onclick="window.location.href='/video/{{ related.id }}'">
                     <div class="related-thumbnail">
-                        <img src="{{ related.thumbnail }}" alt="{{ related.title }}"
-                             onerror="this.src='https://via.placeholder.com/168x94/333333/ffffff?text=Thumbnail'">
+                        <img src="{{ thumb_url(related, 168, 94) }}" srcset="{{ thumb_srcset(related, 168, 94) }}" alt="{{ related.title }}"
+                             onerror="this.srcset='';this.src='{{ placeholder_url(168, 94) }}'">
                     </div>
                     <div class="related-info">
                         <div class="related-title">{{ related.title }}</div>
                         <div class="related-channel">VC7Day Channel</div>
-                        <div class="related-meta">{{ related.views }} vistas • hace 2 días</div>
+                        <div class="related-meta">{{ related.views }} vistas • {{ related.created_at|time_ago }}</div>
                     </div>
                 </div>
                 {% endfor %}
@@ -3171,13 +3855,13 @@ templates = {
                     {% for video in videos %}
                     <div class="search-video" onclick="window.location.href='/video/{{ video.id }}'">
                         <div class="search-thumbnail">
-                            <img src="{{ video.thumbnail }}" alt="{{ video.title }}"
-                                 onerror="this.src='https://via.placeholder.com/360x202/333333/ffffff?text=Thumbnail'">
+                            <img src="{{ thumb_url(video, 360, 202) }}" srcset="{{ thumb_srcset(video, 360, 202) }}" alt="{{ video.title }}"
+                                 onerror="this.srcset='';this.src='{{ placeholder_url(360, 202) }}'">
                         </div>
                         <div class="search-info">
                             <h3 class="search-title">{{ video.title }}</h3>
                             <div class="search-meta">
-                                {{ video.views }} vistas • hace 2 días
+                                {{ video.views }} vistas • {{ video.created_at|time_ago }}
                             </div>
                             <div class="search-channel">
                                 <div class="channel-avatar-small">VC</div>
@@ -3205,8 +3889,8 @@ templates = {
                     {% for playlist in playlists %}
                     <div class="search-playlist" onclick="window.location.href='/playlist/{{ playlist.id }}'">
                         <div class="playlist-thumbnail">
-                            <img src="{{ playlist.thumbnail }}" alt="{{ playlist.name }}"
-                                 onerror="this.src='https://via.placeholder.com/200x112/333333/ffffff?text=Playlist'">
+                            <img src="{{ thumb_url(playlist, 200, 112, kind='playlist') }}" srcset="{{ thumb_srcset(playlist, 200, 112, kind='playlist') }}" alt="{{ playlist.name }}"
+                                 onerror="this.srcset='';this.src='{{ placeholder_url(200, 112, kind='playlist') }}'">
                             <div class="playlist-video-count">{{ playlist.videos|length }} videos</div>
                         </div>
                         <div class="search-info">
@@ -3566,6 +4250,31 @@ templates = {
             color: var(--primary-color);
         }
         
+        .jobs-table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+        
+        .jobs-table th, .jobs-table td {
+            text-align: left;
+            padding: 0.5rem;
+            border-bottom: 1px solid #373737;
+        }
+        
+        .jobs-table th {
+            color: #aaa;
+        }
+        
+        .jobs-table a {
+            color: var(--text-color);
+        }
+        
+        .jobs-table .btn {
+            padding: 0.25rem 0.75rem;
+            border: none;
+            cursor: pointer;
+        }
+        
         .settings-list {
             list-style: none;
         }
@@ -3691,6 +4400,49 @@ templates = {
                 <p class="action-description">Configura videos relacionados y otras opciones del sistema</p>
                 <a href="/admin/settings" class="btn">Configurar Sistema</a>
             </div>
+            
+            <div class="action-card">
+                <div class="action-icon">
+                    <i class="fas fa-clock"></i>
+                </div>
+                <h3 class="action-title">Metadatos de Videos</h3>
+                <p class="action-description">Lee duración, resolución y códecs de los videos nuevos o modificados</p>
+                <form action="/admin/videos/index-metadata" method="POST">
+                    <button type="submit" class="btn">Actualizar Metadatos</button>
+                </form>
+            </div>
+            
+            <div class="action-card">
+                <div class="action-icon">
+                    <i class="fas fa-images"></i>
+                </div>
+                <h3 class="action-title">Miniaturas</h3>
+                <p class="action-description">Genera de antemano las miniaturas de todos los tamaños del catálogo</p>
+                <form action="/admin/thumbnails/warm" method="POST">
+                    <button type="submit" class="btn">Generar Miniaturas</button>
+                </form>
+            </div>
+            
+            <div class="action-card">
+                <div class="action-icon">
+                    <i class="fas fa-stopwatch"></i>
+                </div>
+                <h3 class="action-title">Perfiles de Rendimiento</h3>
+                <p class="action-description">Consulta las peticiones perfiladas más lentas y descarga sus perfiles</p>
+                <a href="/admin/profiles" class="btn">Ver Perfiles</a>
+            </div>
+        </div>
+
+        <div class="export-import">
+            <h2>Trabajos en Segundo Plano</h2>
+            <table class="jobs-table">
+                <thead>
+                    <tr><th>Trabajo</th><th>Estado</th><th>Progreso</th><th>Creado</th><th></th></tr>
+                </thead>
+                <tbody id="jobs-body">
+                    <tr><td colspan="5">Cargando...</td></tr>
+                </tbody>
+            </table>
         </div>
 
         <div class="export-import">
@@ -3699,8 +4451,11 @@ templates = {
                 <a href="/admin/export" class="btn" download="vc7day_data.json">
                     <i class="fas fa-download"></i> Exportar Datos
                 </a>
+                <a href="/admin/export?format=ndjson&gzip=1" class="btn" download="vc7day_data.ndjson.gz">
+                    <i class="fas fa-file-archive"></i> Exportar NDJSON (gzip)
+                </a>
                 <form action="/admin/import" method="POST" enctype="multipart/form-data" style="display: flex; gap: 1rem; align-items: center; flex-wrap: wrap;">
-                    <input type="file" name="file" accept=".json" required class="file-input">
+                    <input type="file" name="file" accept=".json,.ndjson,.jsonl,.gz" required class="file-input">
                     <button type="submit" class="btn">
                         <i class="fas fa-upload"></i> Importar Datos
                     </button>
@@ -3725,17 +4480,65 @@ templates = {
             </ul>
         </div>
     </div>
+
+    <script>
+        const JOB_STATUS = {
+            queued: 'En cola', running: 'En curso', succeeded: 'Terminado',
+            failed: 'Error', cancelled: 'Cancelado'
+        };
+
+        function jobRow(job) {
+            const row = document.createElement('tr');
+            const link = document.createElement('a');
+            link.href = '/admin/jobs/' + job.id;
+            link.textContent = job.label;
+            row.insertCell().appendChild(link);
+            row.insertCell().textContent = JOB_STATUS[job.status] || job.status;
+            row.insertCell().textContent = job.status === 'running'
+                ? Math.round((job.progress || 0) * 100) + '% ' + (job.message || '')
+                : (job.error || job.message || '');
+            row.insertCell().textContent = new Date(job.created_at * 1000).toLocaleString();
+            const actions = row.insertCell();
+            if (job.status === 'queued' || job.status === 'running') {
+                const cancel = document.createElement('button');
+                cancel.className = 'btn';
+                cancel.textContent = 'Cancelar';
+                cancel.onclick = async () => {
+                    await fetch('/admin/jobs/' + job.id + '/cancel', {method: 'POST'});
+                    loadJobs();
+                };
+                actions.appendChild(cancel);
+            }
+            return row;
+        }
+
+        async function loadJobs() {
+            const response = await fetch('/admin/jobs?limit=10');
+            const jobs = await response.json();
+            const body = document.getElementById('jobs-body');
+            body.replaceChildren(...jobs.map(jobRow));
+            if (!jobs.length) {
+                body.innerHTML = '<tr><td colspan="5">No hay trabajos recientes</td></tr>';
+            }
+            // Solo se sigue consultando mientras queden trabajos sin terminar
+            if (jobs.some(job => job.status === 'queued' || job.status === 'running')) {
+                setTimeout(loadJobs, 2000);
+            }
+        }
+
+        loadJobs();
+    </script>
 </body>
 </html>
 ''',
 
-    'admin_settings.html': '''
+    'admin_import_report.html': '''
 <!DOCTYPE html>
 <html lang="es">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Configuración - VC7Day</title>
+    <title>Importación - VC7Day</title>
     <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
     <style>
         :root {
@@ -3809,14 +4612,630 @@ templates = {
             color: var(--text-color);
         }
         
-        .settings-card {
+        .report-card {
             background: var(--secondary-color);
             padding: 2rem;
             border-radius: 10px;
             margin-bottom: 2rem;
         }
         
-        .form-group {
+        .report-card h2 {
+            margin-bottom: 1rem;
+        }
+        
+        .report-summary {
+            display: flex;
+            gap: 2rem;
+            flex-wrap: wrap;
+            margin-bottom: 1.5rem;
+        }
+        
+        .report-number {
+            font-size: 2rem;
+            font-weight: bold;
+            color: var(--primary-color);
+        }
+        
+        .report-error {
+            background: #1a1a1a;
+            padding: 1rem;
+            border-radius: 5px;
+            border-left: 4px solid var(--primary-color);
+            margin-bottom: 2rem;
+        }
+        
+        table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+        
+        th, td {
+            text-align: left;
+            padding: 0.5rem;
+            border-bottom: 1px solid #373737;
+            vertical-align: top;
+        }
+        
+        th {
+            color: #aaa;
+        }
+        
+        .btn {
+            display: inline-block;
+            padding: 0.75rem 1.5rem;
+            background: var(--primary-color);
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+        }
+    </style>
+</head>
+<body>
+    <header class="admin-header">
+        <nav class="admin-nav">
+            <div class="admin-logo">VC7Day Admin</div>
+            <div class="admin-nav-links">
+                <a href="/admin">Dashboard</a>
+                <a href="/admin/categories">Categorías</a>
+                <a href="/admin/playlists">Playlists</a>
+                <a href="/admin/videos">Videos</a>
+                <a href="/admin/logout">Cerrar Sesión</a>
+                <a href="/">Ver Sitio</a>
+            </div>
+        </nav>
+    </header>
+
+    <div class="admin-container">
+        <h1 class="page-title">Resultado de la Importación</h1>
+
+        {% if error %}
+        <div class="report-error">
+            <i class="fas fa-exclamation-triangle"></i> {{ error }}
+        </div>
+        {% endif %}
+
+        {% if report %}
+        <div class="report-card">
+            <div class="report-summary">
+                <div><div class="report-number">{{ report.accepted.categories }}</div>Categorías</div>
+                <div><div class="report-number">{{ report.accepted.playlists }}</div>Playlists</div>
+                <div><div class="report-number">{{ report.accepted.videos }}</div>Videos</div>
+                <div><div class="report-number">{{ report.rejected_count }}</div>Rechazados</div>
+                <div><div class="report-number">{{ report.warning_count }}</div>Avisos</div>
+            </div>
+        </div>
+
+        {% if report.rejected %}
+        <div class="report-card">
+            <h2>Registros Rechazados</h2>
+            {% if report.rejected_count > report.rejected|length %}
+            <p>Se muestran los primeros {{ report.rejected|length }} de {{ report.rejected_count }}.</p>
+            {% endif %}
+            <table>
+                <tr><th>Sección</th><th>Posición</th><th>ID</th><th>Errores</th></tr>
+                {% for item in report.rejected %}
+                <tr>
+                    <td>{{ item.section or '-' }}</td>
+                    <td>{{ item.position }}</td>
+                    <td>{{ item.id if item.id is not none else '-' }}</td>
+                    <td>{{ item.errors|join('; ') }}</td>
+                </tr>
+                {% endfor %}
+            </table>
+        </div>
+        {% endif %}
+
+        {% if report.warnings %}
+        <div class="report-card">
+            <h2>Avisos</h2>
+            {% if report.warning_count > report.warnings|length %}
+            <p>Se muestran los primeros {{ report.warnings|length }} de {{ report.warning_count }}.</p>
+            {% endif %}
+            <table>
+                <tr><th>Sección</th><th>Posición</th><th>ID</th><th>Aviso</th></tr>
+                {% for item in report.warnings %}
+                <tr>
+                    <td>{{ item.section }}</td>
+                    <td>{{ item.position }}</td>
+                    <td>{{ item.id if item.id is not none else '-' }}</td>
+                    <td>{{ item.message }}</td>
+                </tr>
+                {% endfor %}
+            </table>
+        </div>
+        {% endif %}
+        {% endif %}
+
+        <a href="/admin" class="btn"><i class="fas fa-arrow-left"></i> Volver al Dashboard</a>
+    </div>
+</body>
+</html>
+''',
+
+    'admin_profiles.html': '''
+<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Perfiles - VC7Day</title>
+    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
+    <style>
+        :root {
+            --primary-color: #ff0000;
+            --secondary-color: #282828;
+            --background-color: #0f0f0f;
+            --text-color: #ffffff;
+        }
+        
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background-color: var(--background-color);
+            color: var(--text-color);
+        }
+        
+        .admin-header {
+            background: var(--secondary-color);
+            color: white;
+            padding: 1rem 0;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        
+        .admin-nav {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 0 20px;
+        }
+        
+        .admin-logo {
+            font-size: 1.5rem;
+            font-weight: bold;
+            color: var(--primary-color);
+        }
+        
+        .admin-nav-links {
+            display: flex;
+            gap: 1rem;
+            flex-wrap: wrap;
+        }
+        
+        .admin-nav-links a {
+            color: white;
+            text-decoration: none;
+            padding: 0.5rem 1rem;
+            border-radius: 5px;
+            transition: background 0.3s;
+            white-space: nowrap;
+        }
+        
+        .admin-nav-links a:hover {
+            background: #373737;
+        }
+        
+        .admin-container {
+            max-width: 1200px;
+            margin: 2rem auto;
+            padding: 0 20px;
+        }
+        
+        .page-title {
+            margin-bottom: 2rem;
+            color: var(--text-color);
+        }
+        
+        .profiles-card {
+            background: var(--secondary-color);
+            padding: 1.5rem;
+            border-radius: 10px;
+            margin-bottom: 2rem;
+            overflow-x: auto;
+        }
+        
+        .profiles-card a {
+            color: var(--text-color);
+        }
+        
+        .phases {
+            color: #aaa;
+            font-size: 0.85rem;
+        }
+        
+        table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+        
+        th, td {
+            text-align: left;
+            padding: 0.5rem;
+            border-bottom: 1px solid #373737;
+            vertical-align: top;
+        }
+        
+        th {
+            color: #aaa;
+        }
+        
+        .btn {
+            display: inline-block;
+            padding: 0.75rem 1.5rem;
+            background: var(--primary-color);
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+        }
+    </style>
+</head>
+<body>
+    <header class="admin-header">
+        <nav class="admin-nav">
+            <div class="admin-logo">VC7Day Admin</div>
+            <div class="admin-nav-links">
+                <a href="/admin">Dashboard</a>
+                <a href="/admin/categories">Categorías</a>
+                <a href="/admin/playlists">Playlists</a>
+                <a href="/admin/videos">Videos</a>
+                <a href="/admin/logout">Cerrar Sesión</a>
+                <a href="/">Ver Sitio</a>
+            </div>
+        </nav>
+    </header>
+
+    <div class="admin-container">
+        <h1 class="page-title">Perfiles de Peticiones</h1>
+
+        <div class="profiles-card">
+            {% if profiles %}
+            <p>Las peticiones más lentas entre los últimos perfiles guardados. Los archivos .collapsed se
+            abren con flamegraph.pl o speedscope; los .pstats con pstats o snakeviz.</p>
+            <table>
+                <tr><th>Duración</th><th>Petición</th><th>Estado</th><th>Fases (ms)</th><th>Fecha</th><th>Perfil</th></tr>
+                {% for profile in profiles %}
+                <tr>
+                    <td>{{ '%.1f'|format(profile.duration_ms) }} ms</td>
+                    <td>{{ profile.method }} {{ profile.path }}<div class="phases">{{ profile.endpoint or '-' }}</div></td>
+                    <td>{{ profile.status }}</td>
+                    <td class="phases">
+                        {% for phase, ms in profile.phases.items() %}{{ phase }}: {{ ms }}{% if not loop.last %}, {% endif %}{% endfor %}
+                    </td>
+                    <td>{{ profile.created_at|timestamp_ago }}</td>
+                    <td><a href="{{ url_for('download_profile', name=profile.name) }}"><i class="fas fa-download"></i> {{ profile.mode }}</a></td>
+                </tr>
+                {% endfor %}
+            </table>
+            {% else %}
+            <p>No hay perfiles guardados. Activa PROFILE_SAMPLE_RATE o envía la cabecera X-Profile: 1
+            con la sesión de administrador iniciada.</p>
+            {% endif %}
+        </div>
+
+        <a href="/admin" class="btn"><i class="fas fa-arrow-left"></i> Volver al Dashboard</a>
+    </div>
+</body>
+</html>
+''',
+
+    'admin_job.html': '''
+<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{{ job.label }} - VC7Day</title>
+    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
+    <style>
+        :root {
+            --primary-color: #ff0000;
+            --secondary-color: #282828;
+            --background-color: #0f0f0f;
+            --text-color: #ffffff;
+        }
+        
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background-color: var(--background-color);
+            color: var(--text-color);
+        }
+        
+        .admin-header {
+            background: var(--secondary-color);
+            color: white;
+            padding: 1rem 0;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        
+        .admin-nav {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 0 20px;
+        }
+        
+        .admin-logo {
+            font-size: 1.5rem;
+            font-weight: bold;
+            color: var(--primary-color);
+        }
+        
+        .admin-nav-links {
+            display: flex;
+            gap: 1rem;
+            flex-wrap: wrap;
+        }
+        
+        .admin-nav-links a {
+            color: white;
+            text-decoration: none;
+            padding: 0.5rem 1rem;
+            border-radius: 5px;
+            transition: background 0.3s;
+            white-space: nowrap;
+        }
+        
+        .admin-nav-links a:hover {
+            background: #373737;
+        }
+        
+        .admin-container {
+            max-width: 1200px;
+            margin: 2rem auto;
+            padding: 0 20px;
+        }
+        
+        .page-title {
+            margin-bottom: 2rem;
+            color: var(--text-color);
+        }
+        
+        .job-card {
+            background: var(--secondary-color);
+            padding: 1.5rem;
+            border-radius: 10px;
+            margin-bottom: 2rem;
+        }
+        
+        .job-status {
+            font-size: 1.2rem;
+            margin-bottom: 1rem;
+        }
+        
+        .job-progress {
+            height: 8px;
+            background: #373737;
+            border-radius: 4px;
+            overflow: hidden;
+            margin-bottom: 1rem;
+        }
+        
+        .job-progress-bar {
+            height: 100%;
+            background: var(--primary-color);
+            transition: width 0.3s;
+        }
+        
+        .job-result {
+            background: #0f0f0f;
+            padding: 1rem;
+            border-radius: 5px;
+            white-space: pre-wrap;
+        }
+        
+        .report-error {
+            background: #1a1a1a;
+            padding: 1rem;
+            border-radius: 5px;
+            border-left: 4px solid var(--primary-color);
+            margin-bottom: 2rem;
+        }
+        
+        table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+        
+        th, td {
+            text-align: left;
+            padding: 0.5rem;
+            border-bottom: 1px solid #373737;
+            vertical-align: top;
+        }
+        
+        th {
+            color: #aaa;
+        }
+        
+        .btn {
+            display: inline-block;
+            padding: 0.75rem 1.5rem;
+            background: var(--primary-color);
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+        }
+    </style>
+</head>
+<body>
+    <header class="admin-header">
+        <nav class="admin-nav">
+            <div class="admin-logo">VC7Day Admin</div>
+            <div class="admin-nav-links">
+                <a href="/admin">Dashboard</a>
+                <a href="/admin/categories">Categorías</a>
+                <a href="/admin/playlists">Playlists</a>
+                <a href="/admin/videos">Videos</a>
+                <a href="/admin/logout">Cerrar Sesión</a>
+                <a href="/">Ver Sitio</a>
+            </div>
+        </nav>
+    </header>
+
+    <div class="admin-container">
+        <h1 class="page-title">{{ job.label }}</h1>
+
+        <div class="job-card">
+            <div class="job-status" id="job-status"></div>
+            <div class="job-progress"><div class="job-progress-bar" id="job-progress"></div></div>
+            <p id="job-message"></p>
+            <div class="report-error" id="job-error" style="display: none;"></div>
+            <pre class="job-result" id="job-result" style="display: none;"></pre>
+            <button class="btn" id="job-cancel" style="display: none;" onclick="cancelJob()">
+                <i class="fas fa-stop"></i> Cancelar
+            </button>
+        </div>
+
+        <a href="/admin" class="btn"><i class="fas fa-arrow-left"></i> Volver al Dashboard</a>
+    </div>
+
+    <script>
+        const JOB_URL = '{{ url_for('job_status', job_id=job.id) }}';
+        const STATUS_LABELS = {
+            queued: 'En cola', running: 'En curso', succeeded: 'Terminado',
+            failed: 'Error', cancelled: 'Cancelado'
+        };
+
+        function showJob(job) {
+            document.getElementById('job-status').textContent = STATUS_LABELS[job.status] || job.status;
+            document.getElementById('job-progress').style.width = Math.round((job.progress || 0) * 100) + '%';
+            document.getElementById('job-message').textContent = job.message || '';
+            const error = document.getElementById('job-error');
+            error.textContent = job.error || '';
+            error.style.display = job.error ? 'block' : 'none';
+            const result = document.getElementById('job-result');
+            result.textContent = job.result ? JSON.stringify(job.result, null, 2) : '';
+            result.style.display = job.result ? 'block' : 'none';
+            const finished = ['succeeded', 'failed', 'cancelled'].includes(job.status);
+            document.getElementById('job-cancel').style.display = finished ? 'none' : 'inline-block';
+            return finished;
+        }
+
+        function follow() {
+            const events = new EventSource(JOB_URL + '/events');
+            events.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                // Las importaciones terminadas se recargan para mostrar su informe
+                if (showJob(job)) {
+                    events.close();
+                    if (job.result && job.result.accepted) location.reload();
+                }
+            };
+        }
+
+        async function cancelJob() {
+            const response = await fetch(JOB_URL + '/cancel', {method: 'POST'});
+            showJob(await response.json());
+        }
+
+        if (!showJob({{ job|tojson }})) follow();
+    </script>
+</body>
+</html>
+''',
+
+    'admin_settings.html': '''
+<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Configuración - VC7Day</title>
+    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
+    <style>
+        :root {
+            --primary-color: #ff0000;
+            --secondary-color: #282828;
+            --background-color: #0f0f0f;
+            --text-color: #ffffff;
+        }
+        
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background-color: var(--background-color);
+            color: var(--text-color);
+        }
+        
+        .admin-header {
+            background: var(--secondary-color);
+            color: white;
+            padding: 1rem 0;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        
+        .admin-nav {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 0 20px;
+        }
+        
+        .admin-logo {
+            font-size: 1.5rem;
+            font-weight: bold;
+            color: var(--primary-color);
+        }
+        
+        .admin-nav-links {
+            display: flex;
+            gap: 1rem;
+            flex-wrap: wrap;
+        }
+        
+        .admin-nav-links a {
+            color: white;
+            text-decoration: none;
+            padding: 0.5rem 1rem;
+            border-radius: 5px;
+            transition: background 0.3s;
+            white-space: nowrap;
+        }
+        
+        .admin-nav-links a:hover {
+            background: #373737;
+        }
+        
+        .admin-container {
+            max-width: 1200px;
+            margin: 2rem auto;
+            padding: 0 20px;
+        }
+        
+        .page-title {
+            margin-bottom: 2rem;
+            color: var(--text-color);
+        }
+        
+        .settings-card {
+            background: var(--secondary-color);
+            padding: 2rem;
+            border-radius: 10px;
+            margin-bottom: 2rem;
+        }
+        
+        .form-group {
             margin-bottom: 1.5rem;
         }
         
@@ -4220,7 +5639,7 @@ templates = {
                 
                 <div class="form-group">
                     <label for="video_url">URL del Video (.mp4):</label>
-                    <input type="url" id="video_url" name="video_url" value="{{ video.video_url }}" required>
+                    <input type="text" id="video_url" name="video_url" value="{{ video.video_url }}" required>
                 </div>
                 
                 <div class="form-group">
@@ -4444,6 +5863,38 @@ templates = {
             gap: 2rem;
         }
         
+        .list-toolbar {
+            display: flex;
+            gap: 0.5rem;
+            flex-wrap: wrap;
+            margin-bottom: 1rem;
+        }
+        
+        .list-toolbar input, .list-toolbar select {
+            width: auto;
+            flex: 1 1 150px;
+            padding: 0.5rem;
+            border: 1px solid #373737;
+            border-radius: 5px;
+            background: #0f0f0f;
+            color: var(--text-color);
+        }
+        
+        .list-summary {
+            color: #aaa;
+            font-size: 0.9rem;
+            margin-bottom: 1rem;
+        }
+        
+        .pagination {
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            gap: 1rem;
+            margin-top: 1.5rem;
+            color: #aaa;
+        }
+        
         .form-card, .list-card {
             background: var(--secondary-color);
             padding: 2rem;
@@ -4475,6 +5926,24 @@ templates = {
             min-height: 100px;
         }
         
+        .link-badge {
+            display: inline-block;
+            padding: 0 6px;
+            border-radius: 4px;
+            font-size: 0.75rem;
+            font-weight: bold;
+        }
+        
+        .link-ok { background: #1e7e34; }
+        .link-broken { background: var(--primary-color); }
+        .link-unknown { background: #555; }
+        
+        .upload-progress {
+            margin-top: 0.5rem;
+            font-size: 0.9rem;
+            color: #aaa;
+        }
+        
         .btn {
             display: inline-block;
             padding: 0.75rem 1.5rem;
@@ -4634,6 +6103,15 @@ templates = {
     </style>
 </head>
 <body>
+    {% macro link_badge(status) -%}
+    {% if not status %}
+    <span class="link-badge link-unknown" title="Sin comprobar">?</span>
+    {% elif status.ok %}
+    <span class="link-badge link-ok" title="Comprobado {{ status.checked_at|timestamp_ago }}">OK</span>
+    {% else %}
+    <span class="link-badge link-broken" title="{{ status.error or status.status_code }} · comprobado {{ status.checked_at|timestamp_ago }}">Roto{% if status.status_code %} ({{ status.status_code }}){% endif %}</span>
+    {% endif %}
+    {%- endmacro %}
     <header class="admin-header">
         <nav class="admin-nav">
             <div class="admin-logo">VC7Day Admin</div>
@@ -4671,6 +6149,12 @@ templates = {
                         <input type="url" id="video_url" name="video_url" required placeholder="https://ejemplo.com/video.mp4">
                     </div>
                     
+                    <div class="form-group">
+                        <label for="video_file">O sube el archivo (.mp4):</label>
+                        <input type="file" id="video_file" accept="video/mp4">
+                        <div id="upload-progress" class="upload-progress"></div>
+                    </div>
+                    
                     <div class="form-group">
                         <label for="thumbnail">URL del Thumbnail:</label>
                         <input type="url" id="thumbnail" name="thumbnail" required placeholder="https://ejemplo.com/thumb.jpg">
@@ -4703,11 +6187,50 @@ templates = {
                     
                     <button type="submit" class="btn">Agregar Video</button>
                 </form>
+
+                <h2 style="margin-top: 2rem;">Carga Masiva</h2>
+                <form action="/admin/videos/bulk" method="POST" enctype="multipart/form-data">
+                    <div class="form-group">
+                        <label for="bulk_file">Archivo CSV o NDJSON:</label>
+                        <input type="file" id="bulk_file" name="file" accept=".csv,.ndjson,.jsonl,.gz" required>
+                        <small style="color: #aaa;">Columnas: title, description, video_url, thumbnail, category y playlist (por id o nombre)</small>
+                    </div>
+                    <button type="submit" class="btn">Cargar Videos</button>
+                </form>
             </div>
 
             <!-- Lista de videos -->
             <div class="list-card">
                 <h2>Videos Existentes</h2>
+                <form action="/admin/videos/check-links" method="POST" style="margin-bottom: 1rem;">
+                    <button type="submit" class="btn btn-sm"><i class="fas fa-heartbeat"></i> Comprobar enlaces</button>
+                </form>
+                <form class="list-toolbar" method="GET" action="/admin/videos">
+                    <input type="search" name="q" value="{{ listing.filters.text }}" placeholder="Buscar por título o descripción">
+                    <select name="category">
+                        <option value="">Todas las categorías</option>
+                        {% for category in categories %}
+                        <option value="{{ category.id }}" {{ 'selected' if listing.filters.category_id == category.id }}>{{ category.name }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="playlist">
+                        <option value="">Todas las playlists</option>
+                        {% for playlist in playlists %}
+                        <option value="{{ playlist.id }}" {{ 'selected' if listing.filters.playlist_id == playlist.id }}>{{ playlist.name }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="sort">
+                        {% for key, label in [('created_at', 'fecha'), ('title', 'título'), ('views', 'vistas'), ('likes', 'likes')] %}
+                        <option value="{{ key }}" {{ 'selected' if listing.sort == key }}>Ordenar por {{ label }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="order">
+                        <option value="desc" {{ 'selected' if listing.order == 'desc' }}>Descendente</option>
+                        <option value="asc" {{ 'selected' if listing.order == 'asc' }}>Ascendente</option>
+                    </select>
+                    <button type="submit" class="btn btn-sm"><i class="fas fa-filter"></i> Aplicar</button>
+                </form>
+                <p class="list-summary">{{ listing.total }} videos · página {{ listing.page }} de {{ listing.pages }}</p>
                 {% if videos %}
                 <ul class="videos-list">
                     {% for video in videos %}
@@ -4733,8 +6256,8 @@ templates = {
                             <div class="video-url">
                                 <strong>Vistas:</strong> {{ video.views }} | 
                                 <strong>Likes:</strong> {{ video.likes }}<br>
-                                <strong>Video:</strong> {{ video.video_url[:50] }}...<br>
-                                <strong>Thumb:</strong> {{ video.thumbnail[:50] }}...
+                                <strong>Video:</strong> {{ video.video_url[:50] }}... {{ link_badge(link_health.get(video.video_url)) }}<br>
+                                <strong>Thumb:</strong> {{ video.thumbnail[:50] }}... {{ link_badge(link_health.get(video.thumbnail)) }}
                             </div>
                             <div class="video-actions">
                                 <a href="/video/{{ video.id }}" class="btn btn-sm" target="_blank">
@@ -4751,14 +6274,108 @@ templates = {
                     </li>
                     {% endfor %}
                 </ul>
+                {% if listing.pages > 1 %}
+                <nav class="pagination">
+                    {% if listing.page > 1 %}
+                    <a href="{{ listing_url(page=listing.page - 1) }}" class="btn btn-sm">&laquo; Anterior</a>
+                    {% endif %}
+                    <span>Página {{ listing.page }} de {{ listing.pages }}</span>
+                    {% if listing.page < listing.pages %}
+                    <a href="{{ listing_url(page=listing.page + 1) }}" class="btn btn-sm">Siguiente &raquo;</a>
+                    {% endif %}
+                </nav>
+                {% endif %}
                 {% else %}
                 <div class="empty-state">
-                    <p>No hay videos agregados aún.</p>
+                    <p>{{ 'No hay videos que coincidan con los filtros.' if listing.total == 0 and (listing.filters.text or listing.filters.category_id or listing.filters.playlist_id) else 'No hay videos agregados aún.' }}</p>
                 </div>
                 {% endif %}
             </div>
         </div>
     </div>
+
+    <script>
+        // Subida por partes del archivo de video (reanudable)
+        const addForm = document.querySelector('form[action="/admin/videos/add"]');
+        const videoFile = document.getElementById('video_file');
+        const videoUrl = document.getElementById('video_url');
+        const uploadProgress = document.getElementById('upload-progress');
+        
+        videoFile.addEventListener('change', function() {
+            videoUrl.required = !videoFile.files.length;
+        });
+        
+        async function sha256Hex(buffer) {
+            if (!window.crypto || !crypto.subtle) return null;
+            const hash = await crypto.subtle.digest('SHA-256', buffer);
+            return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+        }
+        
+        async function uploadChunk(upload, file, index) {
+            const offset = index * upload.chunk_size;
+            const buffer = await file.slice(offset, offset + upload.chunk_size).arrayBuffer();
+            const headers = {'Content-Type': 'application/octet-stream'};
+            const checksum = await sha256Hex(buffer);
+            if (checksum) headers['X-Chunk-Sha256'] = checksum;
+            
+            // Reintentos con espera creciente si se corta la conexión
+            for (let attempt = 0; ; attempt++) {
+                try {
+                    const response = await fetch(`/api/uploads/${upload.upload_id}?offset=${offset}`, {
+                        method: 'PUT', headers: headers, body: buffer
+                    });
+                    if (response.ok) return;
+                    if (response.status < 500) throw new Error((await response.json()).error);
+                } catch (error) {
+                    if (attempt >= 5 || !(error instanceof TypeError)) throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            }
+        }
+        
+        addForm.addEventListener('submit', async function(e) {
+            const file = videoFile.files[0];
+            if (!file) return;
+            e.preventDefault();
+            
+            const fields = Object.fromEntries(new FormData(addForm));
+            const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+            try {
+                // Reanudar una subida anterior del mismo archivo si sigue abierta
+                let upload = null;
+                const previousId = localStorage.getItem(resumeKey);
+                if (previousId) {
+                    const response = await fetch(`/api/uploads/${previousId}`);
+                    if (response.ok) upload = await response.json();
+                }
+                if (!upload) {
+                    const response = await fetch('/api/uploads', {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({...fields, filename: file.name, size: file.size})
+                    });
+                    upload = await response.json();
+                    if (!response.ok) throw new Error(upload.error);
+                    localStorage.setItem(resumeKey, upload.upload_id);
+                }
+                
+                let done = upload.chunks - upload.missing.length;
+                for (const index of upload.missing) {
+                    uploadProgress.textContent = `Subiendo... ${Math.round(100 * done / upload.chunks)}%`;
+                    await uploadChunk(upload, file, index);
+                    done++;
+                }
+                
+                uploadProgress.textContent = 'Finalizando...';
+                const response = await fetch(`/api/uploads/${upload.upload_id}/finalize`, {method: 'POST'});
+                if (!response.ok) throw new Error((await response.json()).error);
+                localStorage.removeItem(resumeKey);
+                window.location.reload();
+            } catch (error) {
+                uploadProgress.textContent = `Error en la subida: ${error.message}. Vuelve a enviar para reanudar.`;
+            }
+        });
+    </script>
 </body>
 </html>
 ''',
@@ -5108,6 +6725,38 @@ templates = {
             gap: 2rem;
         }
         
+        .list-toolbar {
+            display: flex;
+            gap: 0.5rem;
+            flex-wrap: wrap;
+            margin-bottom: 1rem;
+        }
+        
+        .list-toolbar input, .list-toolbar select {
+            width: auto;
+            flex: 1 1 150px;
+            padding: 0.5rem;
+            border: 1px solid #373737;
+            border-radius: 5px;
+            background: #0f0f0f;
+            color: var(--text-color);
+        }
+        
+        .list-summary {
+            color: #aaa;
+            font-size: 0.9rem;
+            margin-bottom: 1rem;
+        }
+        
+        .pagination {
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            gap: 1rem;
+            margin-top: 1.5rem;
+            color: #aaa;
+        }
+        
         .form-card, .list-card {
             background: var(--secondary-color);
             padding: 2rem;
@@ -5383,6 +7032,26 @@ templates = {
             <!-- Lista de playlists -->
             <div class="list-card">
                 <h2>Playlists Existentes</h2>
+                <form class="list-toolbar" method="GET" action="/admin/playlists">
+                    <input type="search" name="q" value="{{ listing.filters.text }}" placeholder="Buscar por nombre o descripción">
+                    <select name="category">
+                        <option value="">Todas las categorías</option>
+                        {% for category in categories %}
+                        <option value="{{ category.id }}" {{ 'selected' if listing.filters.category_id == category.id }}>{{ category.name }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="sort">
+                        {% for key, label in [('created_at', 'fecha'), ('name', 'nombre'), ('videos', 'número de videos')] %}
+                        <option value="{{ key }}" {{ 'selected' if listing.sort == key }}>Ordenar por {{ label }}</option>
+                        {% endfor %}
+                    </select>
+                    <select name="order">
+                        <option value="desc" {{ 'selected' if listing.order == 'desc' }}>Descendente</option>
+                        <option value="asc" {{ 'selected' if listing.order == 'asc' }}>Ascendente</option>
+                    </select>
+                    <button type="submit" class="btn btn-sm"><i class="fas fa-filter"></i> Aplicar</button>
+                </form>
+                <p class="list-summary">{{ listing.total }} playlists · página {{ listing.page }} de {{ listing.pages }}</p>
                 {% if playlists %}
                 <ul class="playlists-list">
                     {% for playlist in playlists %}
@@ -5418,9 +7087,20 @@ templates = {
                     </li>
                     {% endfor %}
                 </ul>
+                {% if listing.pages > 1 %}
+                <nav class="pagination">
+                    {% if listing.page > 1 %}
+                    <a href="{{ listing_url(page=listing.page - 1) }}" class="btn btn-sm">&laquo; Anterior</a>
+                    {% endif %}
+                    <span>Página {{ listing.page }} de {{ listing.pages }}</span>
+                    {% if listing.page < listing.pages %}
+                    <a href="{{ listing_url(page=listing.page + 1) }}" class="btn btn-sm">Siguiente &raquo;</a>
+                    {% endif %}
+                </nav>
+                {% endif %}
                 {% else %}
                 <div class="empty-state">
-                    <p>No hay playlists creadas aún.</p>
+                    <p>{{ 'No hay playlists que coincidan con los filtros.' if listing.total == 0 and (listing.filters.text or listing.filters.category_id) else 'No hay playlists creadas aún.' }}</p>
                 </div>
                 {% endif %}
             </div>
@@ -5863,13 +7543,24 @@ templates = {
 import flask
 original_render_template = flask.render_template
 
+# Plantillas embebidas ya compiladas: cada una se compila una sola vez por proceso
+compiled_templates = {}
+
+def compiled_template(template_name):
+    template = compiled_templates.get(template_name)
+    if template is None:
+        with request_phase('template-compile'):
+            template = compiled_templates[template_name] = app.jinja_env.from_string(templates[template_name])
+    return template
+
 def render_template(template_name, **context):
-    if template_name in templates:
-        return flask.render_template_string(templates[template_name], **context)
-    return original_render_template(template_name, **context)
+    template = compiled_template(template_name) if template_name in templates else template_name
+    with request_phase('render'):
+        return original_render_template(template, **context)
 
 # Asignar la función personalizada
-app.jinja_env.globals.update(render_template=render_template)
+app.jinja_env.globals.update(render_template=render_template, thumb_url=thumb_url, thumb_srcset=thumb_srcset,
+                             placeholder_url=placeholder_url, video_src=video_src)
 
 # Inicializar la aplicación
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -5877,5 +7568,51 @@ if not os.path.exists(app.config['UPLOAD_FOLDER']):
 
 init_data()
 
+# Calentamiento: /readyz no responde 200 hasta que el catálogo está cargado con
+# sus índices y todas las plantillas compiladas
+warmed_up = threading.Event()
+
+def warm_up():
+    try:
+        catalog = catalog_store.read()
+        # Órdenes por defecto de los listados de administración
+        for section in ('videos', 'playlists'):
+            catalog.query(section, 'created_at', descending=True, limit=1)
+        for template_name in templates:
+            compiled_template(template_name)
+    except Exception:
+        app.logger.exception('Falló el calentamiento; /readyz seguirá respondiendo 503')
+        return
+    warmed_up.set()
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    if not warmed_up.is_set():
+        return jsonify({'status': 'warming'}), 503
+    try:
+        catalog = catalog_store.read()
+    except (OSError, ValueError) as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 503
+    return jsonify({'status': 'ready', 'catalog': {section: len(getattr(catalog, section))
+                                                   for section in storage.SECTIONS}})
+
+def start_background():
+    """Hilos de segundo plano del proceso (comprobación de enlaces y cola de trabajos)"""
+    if app.config['LINK_CHECK_INTERVAL']:
+        link_checker.start(catalog_urls, interval=app.config['LINK_CHECK_INTERVAL'])
+    if app.config['JOB_WORKERS']:
+        job_queue.start()
+
+# Con gunicorn.conf.py la aplicación se carga en el proceso maestro: el calentamiento
+# se hace allí antes del fork y los hilos se arrancan en cada worker (los hilos no
+# sobreviven al fork)
+if not os.environ.get('VC7DAY_PRELOAD'):
+    threading.Thread(target=warm_up, name='vc7day-warm-up', daemon=True).start()
+    start_background()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""Modo de servicio ASGI para los endpoints que pasan el tiempo esperando E/S.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Con los workers síncronos de gunicorn, cada video que se está enviando
+ocupa un hilo durante toda la reproducción, aunque casi todo ese tiempo se
+espera a que el cliente lea. Aquí las conexiones las lleva un bucle de
+eventos y las vistas de Flask siguen siendo las mismas: cada petición se
+ejecuta en un grupo acotado de hilos (ASGI_THREADS) y, si la respuesta es
+un cuerpo en streaming (proxy de video, archivos locales), el bucle pide al
+grupo un bloque cada vez y no pide el siguiente hasta que el cliente ha
+recibido el anterior. Un hilo solo está ocupado mientras llega un bloque
+del origen o del disco, y cada conexión tiene en memoria como mucho un par
+de bloques, así que un proceso atiende miles de reproducciones a la vez.
+
+Algunas rutas se atienden directamente en el bucle: los eventos de
+progreso de los trabajos (/admin/jobs/<id>/events) dejan la conexión
+abierta y envían cada cambio, en lugar de que el navegador vuelva a
+conectar cada segundo.
+"""
+import asyncio
+import logging
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+
+import app
+from jobs import FINISHED
+
+# Bytes de la respuesta que se leen en el mismo hilo que ejecuta la vista: las
+# respuestas normales se envían enteras sin volver al grupo de hilos
+PREFETCH_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class RequestBody:
+    """wsgi.input que pide los mensajes http.request al bucle desde el hilo de la vista"""
+
+    def __init__(self, loop, receive):
+        self._loop = loop
+        self._receive = receive
+        self._buffer = bytearray()
+        self._more = True
+
+    def read(self, size=-1):
+        while self._more and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        return self._take(len(self._buffer) if size is None or size < 0 else size)
+
+    def readline(self, size=-1):
+        while (self._more and b'\n' not in self._buffer
+               and (size is None or size < 0 or len(self._buffer) < size)):
+            self._fill()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        return self._take(end)
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def _fill(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.request':
+            self._buffer += message.get('body', b'')
+            self._more = message.get('more_body', False)
+        else:
+            # El cliente se desconectó: el cuerpo queda corto y Werkzeug lo detecta
+            self._more = False
+
+    def _take(self, size):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class Connection:
+    """Una petición en curso: su environ WSGI y los mensajes ASGI de la respuesta"""
+
+    def __init__(self, adapter, scope, receive, send):
+        self.adapter = adapter
+        self.environ = wsgi_environ(scope, RequestBody(asyncio.get_running_loop(), receive))
+        self.disconnected = asyncio.Event()
+        self._receive = receive
+        self._send = send
+        self._watcher = None
+
+    async def run(self, function, *args):
+        """Ejecuta una función bloqueante en el grupo de hilos"""
+        return await asyncio.get_running_loop().run_in_executor(self.adapter.executor, function, *args)
+
+    async def start(self, status, headers):
+        await self._send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        # La vista ya leyó lo que necesitaba del cuerpo: a partir de aquí solo interesa la desconexión
+        self._watcher = asyncio.ensure_future(self._watch())
+
+    async def write(self, chunk, more=True):
+        await self._send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+    async def _watch(self):
+        while (await self._receive())['type'] != 'http.disconnect':
+            pass
+        self.disconnected.set()
+
+
+class AsgiAdapter:
+    """Aplicación ASGI que ejecuta una aplicación WSGI en un grupo de hilos
+
+    Con route() se registran corrutinas que atienden algunas rutas sin
+    pasar por la aplicación WSGI.
+    """
+
+    def __init__(self, wsgi_app, threads=64):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='vc7day-asgi')
+        self._routes = []
+
+    def route(self, pattern, methods=('GET',)):
+        """Registra handler(connection, **grupos de pattern) para las rutas que encajan"""
+        def register(handler):
+            self._routes.append((re.compile(pattern), methods, handler))
+            return handler
+        return register
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        connection = Connection(self, scope, receive, send)
+        for pattern, methods, handler in self._routes:
+            match = pattern.fullmatch(connection.environ['PATH_INFO'])
+            if match and scope['method'] in methods:
+                await handler(connection, **match.groupdict())
+                return
+        await self.wsgi(connection)
+
+    async def wsgi(self, connection):
+        """Atiende la petición con la aplicación WSGI y envía el cuerpo bloque a bloque"""
+        try:
+            status, headers, chunks, result = await connection.run(self._call_wsgi, connection.environ)
+        except Exception:
+            logger.exception('Error al ejecutar la aplicación WSGI')
+            await connection.start(500, [('Content-Type', 'text/plain; charset=utf-8')])
+            await connection.write(b'Error interno', more=False)
+            connection.close()
+            return
+
+        await connection.start(status, headers)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    await connection.write(chunk)
+            iterator = iter(result) if result is not None else None
+            while iterator is not None and not connection.disconnected.is_set():
+                chunk = await connection.run(next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await connection.write(chunk)
+            if not connection.disconnected.is_set():
+                await connection.write(b'', more=False)
+        finally:
+            # Libera la conexión con el origen o el archivo aunque el cliente se haya ido
+            if result is not None:
+                await connection.run(_close, result)
+            connection.close()
+
+    def _call_wsgi(self, environ):
+        """(status, cabeceras, primeros bloques, resto del cuerpo o None si ya se leyó entero)"""
+        response = []
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [int(status.split(' ', 1)[0]), headers]
+            return written.append
+
+        result = self.wsgi_app(environ, start_response)
+        chunks, size = written, sum(map(len, written))
+        try:
+            iterator = iter(result)
+            while size < PREFETCH_BYTES:
+                chunk = next(iterator, None)
+                if chunk is None:
+                    _close(result)
+                    return (*response, chunks, None)
+                chunks.append(chunk)
+                size += len(chunk)
+        except BaseException:
+            _close(result)
+            raise
+        return (*response, chunks, _Remaining(result, iterator))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+class _Remaining:
+    """Lo que queda de un cuerpo WSGI ya empezado, con el close() del original"""
+
+    def __init__(self, result, iterator):
+        self._result = result
+        self._iterator = iterator
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        _close(self._result)
+
+
+def _close(result):
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+
+
+def wsgi_environ(scope, body):
+    """environ WSGI (PEP 3333) de un scope HTTP de ASGI"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _wsgi_string(root_path),
+        'PATH_INFO': _wsgi_string(path),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'SERVER_SOFTWARE': 'vc7day-asgi',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _wsgi_string(text):
+    return text.encode('utf-8').decode('latin-1')
+
+
+application = AsgiAdapter(app.app, threads=app.app.config['ASGI_THREADS'])
+
+
+@application.route(r'/admin/jobs/(?P<job_id>[^/]+)/events')
+async def job_events(connection, job_id):
+    """Eventos de un trabajo mientras cambia, con la conexión abierta hasta que termina"""
+    job = await connection.run(_admin_job, dict(connection.environ), job_id)
+    if job is None:
+        # Sin sesión o sin trabajo: la vista de Flask responde con la redirección o el 404
+        await application.wsgi(connection)
+        return
+    await connection.start(200, [('Content-Type', 'text/event-stream; charset=utf-8'),
+                                 ('Cache-Control', 'no-cache'),
+                                 ('X-Accel-Buffering', 'no')])
+    interval = app.app.config['JOB_EVENTS_INTERVAL']
+    last = None
+    try:
+        while job is not None:
+            event = app.sse_event(job)
+            if event != last:
+                await connection.write(event.encode('utf-8'))
+                last = event
+            if job['status'] in FINISHED:
+                break
+            try:
+                await asyncio.wait_for(connection.disconnected.wait(), interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            job = await connection.run(app.labeled_job, job_id)
+        await connection.write(b'', more=False)
+    finally:
+        connection.close()
+
+
+def _admin_job(environ, job_id):
+    """El trabajo si la petición viene de una sesión de administrador"""
+    with app.app.request_context(environ):
+        if not session.get('logged_in'):
+            return None
+        return app.labeled_job(job_id)
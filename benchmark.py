@@ -0,0 +1,311 @@
+"""Catálogos sintéticos y micro-benchmarks de la aplicación.
+
+generate crea un data.json realista del tamaño pedido (categorías,
+playlists, títulos en español, listas de relacionados, vistas con una
+distribución de cola larga). run genera un catálogo por cada tamaño y mide
+la carga, los índices y el guardado del catálogo, get_related_videos con
+cada estrategia, y las páginas y APIs principales a través de
+app.test_client(); de las páginas se guarda también el tiempo de cada fase
+que informa la cabecera Server-Timing (compilación y render de la
+plantilla, relacionados...). Los resultados se escriben en JSON y se
+pueden comparar con los de otro commit con --compare.
+
+    python benchmark.py run --sizes 1000,10000 --output bench.json
+    python benchmark.py run --sizes 10000 --compare bench.json
+    python benchmark.py generate 100000 data.json
+"""
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+
+STRATEGIES = ('category', 'recent', 'popular')
+
+CATEGORY_NAMES = [
+    ('Música', '🎵'), ('Gaming', '🎮'), ('Educación', '📚'), ('Tecnología', '💻'), ('Deportes', '⚽'),
+    ('Películas', '🎬'), ('Noticias', '📰'), ('Cocina', '🍳'), ('Viajes', '✈'), ('Ciencia', '🔬'),
+    ('Humor', '😂'), ('Historia', '🏛'), ('Naturaleza', '🌿'), ('Motor', '🚗'), ('Salud', '💪'),
+    ('Arte', '🎨'), ('Idiomas', '🗣'), ('Finanzas', '💰'), ('Infantil', '🧸'), ('Religión', '⛪'),
+]
+
+WORDS = ('amor vida noche día ciudad mar montaña canción historia secreto camino fuego luz sombra '
+         'tiempo mundo corazón sueño viaje guerra paz familia escuela lección receta partido gol '
+         'concierto entrevista tutorial capítulo temporada final directo resumen análisis '
+         'completo nuevo mejor primera última gran pequeño oscuro dorado perdido eterno').split()
+CONNECTORS = ('de', 'del', 'en', 'con', 'para', 'y', 'sin', 'sobre')
+
+
+def generate_catalog(videos=1000, categories=None, playlists=None, seed=0):
+    """Catálogo sintético con la forma de data.json"""
+    rng = random.Random(seed)
+    categories = categories or min(max(videos // 500, 5), len(CATEGORY_NAMES))
+    playlists = playlists if playlists is not None else max(videos // 25, 1)
+    start = datetime(2024, 1, 1)
+    span = timedelta(days=730).total_seconds()
+
+    def title(words):
+        parts = []
+        for index in range(words):
+            if index and rng.random() < 0.3:
+                parts.append(rng.choice(CONNECTORS))
+            parts.append(rng.choice(WORDS))
+        return ' '.join(parts).capitalize()
+
+    def created_at():
+        return (start + timedelta(seconds=rng.random() * span)).isoformat()
+
+    data = {
+        'categories': [{'id': index + 1, 'name': name, 'icon': icon, 'created_at': created_at()}
+                       for index, (name, icon) in enumerate(CATEGORY_NAMES[:categories])],
+        'playlists': [],
+        'videos': [],
+        'settings': {'related_videos_count': 6, 'auto_related': True, 'default_related_strategy': 'category'},
+    }
+    for playlist_id in range(1, playlists + 1):
+        data['playlists'].append({
+            'id': playlist_id,
+            'name': title(rng.randint(2, 4)),
+            'description': title(rng.randint(5, 12)),
+            'category_id': rng.randint(1, categories),
+            'thumbnail': f'https://cdn.example.com/playlists/{playlist_id}.jpg',
+            'videos': [],
+            'created_at': created_at(),
+        })
+    for video_id in range(1, videos + 1):
+        playlist = rng.choice(data['playlists']) if data['playlists'] and rng.random() < 0.6 else None
+        if playlist:
+            playlist['videos'].append(video_id)
+        # Vistas de cola larga: unos pocos videos concentran casi todas
+        views = int(rng.paretovariate(1.2) * 50)
+        data['videos'].append({
+            'id': video_id,
+            'title': title(rng.randint(3, 9)),
+            'description': title(rng.randint(8, 30)) + '.',
+            'video_url': f'https://cdn.example.com/videos/{video_id}.mp4',
+            'thumbnail': f'https://cdn.example.com/thumbs/{video_id}.jpg',
+            'category_id': playlist['category_id'] if playlist else rng.randint(1, categories),
+            'playlist_id': playlist['id'] if playlist else None,
+            'related_videos': (rng.sample(range(1, videos + 1), min(rng.randint(1, 8), videos))
+                               if rng.random() < 0.3 else []),
+            'views': views,
+            'likes': int(views * rng.uniform(0, 0.1)),
+            'created_at': created_at(),
+        })
+    return data
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Milisegundos de cada ejecución de fn (después de calentar)"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def summarize(name, size, times, **extra):
+    ordered = sorted(times)
+    return {
+        'name': name,
+        'size': size,
+        'runs': len(times),
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+        **extra,
+    }
+
+
+def load_app(workdir):
+    """Importa app.py trabajando dentro de workdir, sin arrancar los hilos en segundo plano
+
+    Ni la cola de trabajos ni el comprobador de enlaces (que haría peticiones
+    a las URLs inventadas del catálogo) deben correr durante las medidas.
+    """
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Como con gunicorn.conf.py: al importarse, app.py no arranca ningún hilo
+    os.environ['VC7DAY_PRELOAD'] = '1'
+    import app
+    app.app.config.update(SERVER_TIMING=True, PROFILE_SAMPLE_RATE=0)
+    return app
+
+
+def use_catalog(app, path):
+    app.DATA_FILE = path
+    app.catalog_store = app.storage.CatalogStore(path, timer=app.request_phase, generations=app.generations,
+                                                 stat_interval=app.app.config['CATALOG_STAT_INTERVAL'])
+    return app.catalog_store.read()
+
+
+def bench_storage(app, path, size, repeat):
+    storage = app.storage
+    data = storage.load_catalog(path)
+    copy_path = f'{path}.copy'
+    yield summarize('storage.load', size, measure(lambda: storage.load_catalog(path), repeat))
+    yield summarize('storage.index_build', size, measure(lambda: storage.Catalog(data), repeat))
+    yield summarize('storage.save', size, measure(lambda: storage.save_catalog(copy_path, data), repeat))
+    os.remove(copy_path)
+
+
+def bench_related(app, catalog, size, repeat, samples=50):
+    rng = random.Random(1)
+    sample = rng.sample(catalog.data['videos'], min(samples, len(catalog.data['videos'])))
+    for strategy in STRATEGIES:
+        settings = {**catalog.settings, 'auto_related': True, 'default_related_strategy': strategy}
+
+        def run():
+            for video in sample:
+                app.get_related_videos(video, catalog, settings)
+
+        times = [t / len(sample) for t in measure(run, repeat)]
+        yield summarize(f'related.{strategy}', size, times)
+
+
+def bench_pages(app, catalog, size, repeat):
+    """Páginas y APIs a través del test client, con las fases de Server-Timing"""
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    rng = random.Random(2)
+    video_id = rng.choice(list(catalog.videos))
+    playlist_id = next(iter(catalog.playlists), None)
+    word = rng.choice(WORDS)
+    pages = {
+        'page.index': '/',
+        'page.category': '/category/1',
+        'page.watch': f'/video/{video_id}',
+        'page.search': f'/search?q={word}',
+        'api.videos_search': f'/api/videos/search?q={word[:3]}',
+        'api.playlists_search': f'/api/playlists/search?q={word[:3]}',
+        'page.admin_dashboard': '/admin',
+        'page.admin_videos': '/admin/videos',
+        'page.admin_playlists': '/admin/playlists',
+        'page.admin_categories': '/admin/categories',
+    }
+    if playlist_id is not None:
+        pages['page.playlist'] = f'/playlist/{playlist_id}'
+    for name, url in sorted(pages.items()):
+        phases = {}
+
+        def run():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise click.ClickException(f'{url} respondió {response.status_code}')
+            for item in response.headers.get('Server-Timing', '').split(','):
+                phase, _, duration = item.strip().partition(';dur=')
+                if duration and phase != 'total':
+                    phases.setdefault(phase, []).append(float(duration))
+
+        times = measure(run, repeat)
+        yield summarize(name, size, times, url=url,
+                        phases_ms={phase: round(statistics.median(values), 3)
+                                   for phase, values in sorted(phases.items())})
+
+
+def run_benchmarks(sizes, repeat, seed=0):
+    workdir = tempfile.mkdtemp(prefix='vc7day-bench-')
+    try:
+        app = load_app(workdir)
+        results = []
+        for size in sizes:
+            path = os.path.join(workdir, f'catalog-{size}.json')
+            app.storage.save_catalog(path, generate_catalog(size, seed=seed))
+            catalog = use_catalog(app, path)
+            for group in (bench_storage(app, path, size, repeat), bench_related(app, catalog, size, repeat),
+                          bench_pages(app, catalog, size, repeat)):
+                for result in group:
+                    results.append(result)
+                    click.echo(f"{result['name']:<28} {size:>8} {result['median_ms']:>10.2f} ms", err=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'meta': environment(repeat, seed), 'results': results}
+
+
+def environment(repeat, seed):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'seed': seed,
+    }
+
+
+def compare(previous, current, threshold):
+    """Líneas con los cambios de mediana respecto a otra ejecución"""
+    before = {(r['name'], r['size']): r['median_ms'] for r in previous['results']}
+    for result in current['results']:
+        old = before.get((result['name'], result['size']))
+        if not old:
+            continue
+        change = result['median_ms'] / old - 1
+        mark = 'PEOR' if change > threshold else 'MEJOR' if change < -threshold else ''
+        yield (f"{result['name']:<28} {result['size']:>8} {old:>10.2f} -> {result['median_ms']:>10.2f} ms "
+               f"{change:+7.1%} {mark}")
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.argument('videos', type=int)
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--seed', default=0, show_default=True)
+def generate(videos, output, seed):
+    """Escribe un catálogo sintético con VIDEOS videos en OUTPUT"""
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(generate_catalog(videos, seed=seed), f, ensure_ascii=False)
+    click.echo(f'{videos} videos escritos en {output}')
+
+
+@cli.command()
+@click.option('--sizes', default='1000,10000', show_default=True, help='Tamaños de catálogo separados por comas')
+@click.option('--repeat', default=5, show_default=True, help='Ejecuciones medidas por benchmark')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Archivo JSON con los resultados')
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False),
+              help='Resultados de otra ejecución con los que comparar')
+@click.option('--threshold', default=0.1, show_default=True, help='Cambio relativo que se marca al comparar')
+def run(sizes, repeat, seed, output, compare_path, threshold):
+    """Genera catálogos de cada tamaño y mide las operaciones principales"""
+    sizes = [int(size) for size in sizes.split(',') if size.strip()]
+    output = os.path.abspath(output) if output else None
+    compare_path = os.path.abspath(compare_path) if compare_path else None
+    report = run_benchmarks(sizes, repeat, seed)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+    if compare_path:
+        with open(compare_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        click.echo(f"Comparado con {previous['meta'].get('commit') or compare_path}:", err=True)
+        for line in compare(previous, report, threshold):
+            click.echo(line, err=True)
+
+
+if __name__ == '__main__':
+    cli()
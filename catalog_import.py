@@ -0,0 +1,498 @@
+"""Importación validada de catálogos (JSON o NDJSON, opcionalmente gzip).
+
+El archivo subido se recorre dos veces como flujo, sin cargarlo entero:
+
+1. Se valida cada registro por separado y se guardan solo los ids válidos
+   y las referencias obligatorias (categoría de cada playlist, categoría y
+   playlist de cada video).
+2. Con esos conjuntos de ids se comprueba la integridad referencial de
+   cada registro y los aceptados se escriben por lotes con CatalogWriter.
+
+Los registros con errores se rechazan uno a uno y se devuelven en el
+informe; las referencias de listas (related_videos, videos de una playlist)
+que apuntan a registros inexistentes se quitan y se anotan como aviso. Si
+el archivo no es un catálogo o no se puede leer, no se toca nada.
+
+ingest_videos() añade en bloque videos nuevos desde CSV o NDJSON: asigna
+los ids de una vez y escribe el catálogo una sola vez, en lugar de un
+guardado completo de data.json por cada video.
+
+Las dos funciones reciben lock, que devuelve el bloqueo del catálogo
+(CatalogStore.locked): la lectura del archivo subido, que puede ser muy
+grande, se hace sin él, y solo se toma para leer el catálogo actual y
+publicar el nuevo, así que las visitas y la administración no esperan a
+toda la importación.
+"""
+import csv
+import gzip
+import io
+import json
+from contextlib import nullcontext
+from datetime import datetime
+
+import storage
+
+# Límite de registros detallados en el informe; el resto solo se cuenta
+MAX_REPORTED = 500
+
+SETTINGS_TYPES = {
+    'related_videos_count': int,
+    'auto_related': bool,
+    'default_related_strategy': str,
+}
+RELATED_STRATEGIES = ('category', 'recent', 'popular')
+
+
+class CatalogImportError(Exception):
+    """El archivo no se puede importar y el catálogo queda como estaba"""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+class ImportReport:
+    def __init__(self):
+        self.accepted = {section: 0 for section in storage.SECTIONS}
+        self.rejected = []
+        self.warnings = []
+        self.rejected_count = 0
+        self.warning_count = 0
+
+    def reject(self, section, position, record, errors):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED:
+            self.rejected.append({'section': section, 'position': position,
+                                  'id': _record_id(record), 'errors': errors})
+
+    def warn(self, section, position, record, message):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_REPORTED:
+            self.warnings.append({'section': section, 'position': position,
+                                  'id': _record_id(record), 'message': message})
+
+    def to_dict(self):
+        return {
+            'accepted': self.accepted,
+            'rejected_count': self.rejected_count,
+            'warning_count': self.warning_count,
+            'rejected': self.rejected,
+            'warnings': self.warnings,
+        }
+
+
+def import_catalog(source, data_path, ndjson=False, batch_size=500, progress=None, lock=None):
+    """Sustituye el catálogo de data_path por los registros válidos de source
+
+    source es un archivo binario que se pueda rebobinar (la subida de
+    Werkzeug lo es). progress(fracción, mensaje), si se indica, se llama
+    durante la importación; si lanza una excepción, la importación se
+    interrumpe sin tocar el catálogo. Devuelve un ImportReport.
+    """
+    progress = progress or _no_progress
+    lock = lock or nullcontext
+    progress(0, 'Validando registros')
+    ids = _collect_ids(source, ndjson)
+    if not ids['found']:
+        raise CatalogImportError('El archivo no contiene ninguna sección del catálogo')
+
+    categories = ids['categories']
+    playlists = {playlist_id for playlist_id, category_id in ids['playlists'].items()
+                 if category_id in categories}
+    videos = {video_id for video_id, (category_id, playlist_id) in ids['videos'].items()
+              if category_id in categories and (playlist_id is None or playlist_id in playlists)}
+
+    report = ImportReport()
+    # Como en la primera pasada, el primer registro válido de cada id es el que cuenta
+    seen = {section: set() for section in storage.SECTIONS}
+    settings = None
+    progress(0.5, 'Escribiendo catálogo')
+    with storage.CatalogWriter(data_path, batch_size) as writer:
+        for count, (section, position, record, error) in enumerate(_records(source, ndjson), 1):
+            progress(0.5 + 0.5 * count / max(ids['total'], 1))
+            if error:
+                report.reject(section, position, None, [error])
+                continue
+            if section == 'settings':
+                errors = validate_settings(record)
+                if errors:
+                    report.reject(section, position, None, errors)
+                else:
+                    settings = record
+                continue
+            if section not in seen:
+                report.warn(section, position, record, 'Sección desconocida, se ignora')
+                continue
+
+            errors = VALIDATORS[section](record)
+            if not errors:
+                if record['id'] in seen[section]:
+                    errors = [f"Id duplicado: {record['id']}"]
+                else:
+                    seen[section].add(record['id'])
+                    errors = _check_references(section, record, categories, playlists)
+            if errors:
+                report.reject(section, position, record, errors)
+                continue
+
+            if section == 'playlists':
+                _drop_missing(report, section, position, record, 'videos', videos)
+            elif section == 'videos':
+                _drop_missing(report, section, position, record, 'related_videos',
+                              videos - {record['id']})
+            writer.add(section, record)
+            report.accepted[section] += 1
+
+        if not any(report.accepted.values()) and report.rejected_count:
+            raise CatalogImportError('Se rechazaron todos los registros; el catálogo no se modificó',
+                                     report)
+        with lock():
+            if settings is None:
+                # El archivo no trae ajustes: se conservan los actuales
+                settings = storage.read_value(data_path, 'settings', {})
+            writer.set_value('settings', settings)
+            writer.commit()
+    return report
+
+
+def ingest_videos(source, data_path, fmt='csv', strict=False, batch_size=500, progress=None, lock=None):
+    """Añade al catálogo los videos de un CSV o NDJSON en una sola escritura
+
+    Columnas: title, description, video_url, thumbnail, category y playlist
+    (category y playlist por id o por nombre; playlist puede ir vacía). Las
+    filas no válidas se rechazan y el resto se guarda, salvo con strict,
+    que no guarda nada si hay algún rechazo. progress y lock funcionan como
+    en import_catalog(). Devuelve un ImportReport.
+    """
+    progress = progress or _no_progress
+    lock = lock or nullcontext
+    progress(0, 'Leyendo filas')
+    categories, playlists, next_id = _catalog_refs(data_path)
+    report = ImportReport()
+    parsed = []
+
+    for count, (position, row, error) in enumerate(_ingest_rows(source, fmt), 1):
+        progress(None, f'{count} filas leídas')
+        if error:
+            report.reject('videos', position, None, [error])
+            continue
+        errors = []
+        category_id = _resolve(row.get('category', row.get('category_id')), categories)
+        if category_id is None:
+            errors.append(f"Categoría no encontrada: {row.get('category', row.get('category_id'))}")
+        playlist_value = row.get('playlist', row.get('playlist_id'))
+        playlist_id = None
+        if playlist_value not in (None, ''):
+            playlist_id = _resolve(playlist_value, playlists)
+            if playlist_id is None:
+                errors.append(f'Playlist no encontrada: {playlist_value}')
+
+        video = {
+            # Provisional: el id definitivo se asigna con el catálogo bloqueado
+            'id': next_id + len(parsed),
+            'title': _text(row.get('title')),
+            'description': _text(row.get('description')),
+            'video_url': _text(row.get('video_url')),
+            'thumbnail': _text(row.get('thumbnail')),
+            'category_id': category_id,
+            'playlist_id': playlist_id,
+            'views': 0,
+            'likes': 0,
+            'related_videos': [],
+            'created_at': datetime.now().isoformat(),
+        }
+        errors += [e for e in validate_video(video) if not e.startswith('category_id')]
+        if errors:
+            report.reject('videos', position, None, errors)
+            continue
+        parsed.append((position, video))
+
+    if strict and report.rejected_count:
+        raise CatalogImportError(f'{report.rejected_count} filas no válidas; no se añadió ningún video',
+                                 report)
+    if not parsed:
+        return report
+
+    progress(0.5, 'Escribiendo catálogo')
+    with lock(), storage.CatalogWriter(data_path, batch_size) as writer:
+        # Mientras se leían las filas el catálogo pudo cambiar: ids y referencias se comprueban de nuevo
+        categories, playlists, next_id = _catalog_refs(data_path)
+        category_ids, playlist_ids = set(categories.values()), set(playlists.values())
+        new_videos = []
+        playlist_additions = {}
+        for position, video in parsed:
+            if video['category_id'] not in category_ids:
+                report.reject('videos', position, None, [f"Categoría no encontrada: {video['category_id']}"])
+                continue
+            if video['playlist_id'] is not None and video['playlist_id'] not in playlist_ids:
+                report.reject('videos', position, None, [f"Playlist no encontrada: {video['playlist_id']}"])
+                continue
+            video['id'] = next_id + len(new_videos)
+            new_videos.append(video)
+            if video['playlist_id'] is not None:
+                playlist_additions.setdefault(video['playlist_id'], []).append(video['id'])
+        if strict and report.rejected_count:
+            raise CatalogImportError(f'{report.rejected_count} filas no válidas; no se añadió ningún video',
+                                     report)
+        if not new_videos:
+            return report
+
+        with open(data_path, 'r', encoding='utf-8') as f:
+            for event in storage.JsonStreamReader(f).events():
+                kind, section = event[0], event[1]
+                if kind == 'value':
+                    writer.set_value(section, event[2])
+                elif kind == 'item':
+                    record = event[2]
+                    if section == 'playlists' and record.get('id') in playlist_additions:
+                        record['videos'] = record.get('videos', []) + playlist_additions[record['id']]
+                    writer.add(section, record)
+        for video in new_videos:
+            writer.add('videos', video)
+        writer.commit()
+    report.accepted['videos'] = len(new_videos)
+    return report
+
+
+def open_upload(stream):
+    """Envuelve la subida si viene comprimida con gzip"""
+    if stream.read(2) == b'\x1f\x8b':
+        stream.seek(0)
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    stream.seek(0)
+    return stream
+
+
+def validate_category(record):
+    errors = _common_errors(record, 'name')
+    errors += _optional_types(record, {'icon': str, 'created_at': str})
+    return errors
+
+
+def validate_playlist(record):
+    errors = _common_errors(record, 'name')
+    errors += _required_id(record, 'category_id')
+    errors += _id_list(record, 'videos')
+    errors += _optional_types(record, {'description': str, 'thumbnail': str, 'created_at': str})
+    return errors
+
+
+def validate_video(record):
+    errors = _common_errors(record, 'title')
+    if not isinstance(record.get('video_url'), str) or not record['video_url'].strip():
+        errors.append('Falta video_url')
+    errors += _required_id(record, 'category_id')
+    if record.get('playlist_id') is not None:
+        errors += _required_id(record, 'playlist_id')
+    errors += _id_list(record, 'related_videos')
+    for field in ('views', 'likes'):
+        value = record.get(field, 0)
+        if not _is_int(value) or value < 0:
+            errors.append(f'{field} debe ser un entero no negativo')
+    errors += _optional_types(record, {'description': str, 'thumbnail': str,
+                                       'created_at': str, 'media': dict})
+    return errors
+
+
+def validate_settings(record):
+    if not isinstance(record, dict):
+        return ['settings debe ser un objeto']
+    errors = []
+    for field, expected in SETTINGS_TYPES.items():
+        if field in record and not (type(record[field]) is expected):
+            errors.append(f'{field} debe ser de tipo {expected.__name__}')
+    if record.get('default_related_strategy', 'category') not in RELATED_STRATEGIES:
+        errors.append('default_related_strategy no válida')
+    return errors
+
+
+VALIDATORS = {
+    'categories': validate_category,
+    'playlists': validate_playlist,
+    'videos': validate_video,
+}
+
+
+def _collect_ids(source, ndjson):
+    """Primera pasada: ids de los registros válidos y sus referencias obligatorias"""
+    ids = {'found': False, 'total': 0, 'categories': set(), 'playlists': {}, 'videos': {}}
+    for section, _, record, error in _records(source, ndjson):
+        ids['total'] += 1
+        if section in VALIDATORS:
+            ids['found'] = True
+        if error or section not in VALIDATORS or VALIDATORS[section](record):
+            continue
+        record_id = record['id']
+        if section == 'categories':
+            ids['categories'].add(record_id)
+        elif section == 'playlists':
+            ids['playlists'].setdefault(record_id, record['category_id'])
+        else:
+            ids['videos'].setdefault(record_id, (record['category_id'], record.get('playlist_id')))
+    return ids
+
+
+def _records(source, ndjson):
+    """Genera (sección, posición, registro, error) leyendo la subida como flujo"""
+    source.seek(0)
+    text = io.TextIOWrapper(open_upload(source), encoding='utf-8', errors='strict')
+    try:
+        if ndjson:
+            yield from _ndjson_records(text)
+        else:
+            yield from _json_records(text)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CatalogImportError(f'El archivo no es un JSON válido: {e}')
+    except (OSError, EOFError) as e:
+        raise CatalogImportError(f'No se pudo leer el archivo: {e}')
+    finally:
+        text.detach()
+
+
+def _json_records(text):
+    positions = {}
+    for event in storage.JsonStreamReader(text).events():
+        kind, section = event[0], event[1]
+        if kind == 'end':
+            continue
+        position = positions[section] = positions.get(section, -1) + 1
+        error = None
+        if kind == 'value' and section in VALIDATORS:
+            error = f'{section} debe ser una lista'
+        elif section in VALIDATORS and not isinstance(event[2], dict):
+            error = 'El registro debe ser un objeto'
+        yield section, position, event[2], error
+
+
+def _ndjson_records(text):
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            yield None, line_number, None, f'Línea {line_number}: JSON no válido'
+            continue
+        if not isinstance(entry, dict) or 'section' not in entry or 'record' not in entry:
+            yield None, line_number, None, f'Línea {line_number}: se esperaba {{"section": ..., "record": ...}}'
+            continue
+        record = entry['record']
+        error = None
+        if entry['section'] in VALIDATORS and not isinstance(record, dict):
+            error = 'El registro debe ser un objeto'
+        yield entry['section'], line_number, record, error
+
+
+def _catalog_refs(data_path):
+    """Búsqueda por id o nombre de categorías y playlists, y el siguiente id de video libre"""
+    names = {'categories': {}, 'playlists': {}}
+    ids = {'categories': {}, 'playlists': {}}
+    max_video_id = 0
+    for section, record in storage.iter_catalog(data_path):
+        if section in names:
+            names[section][str(record.get('name', '')).casefold()] = record['id']
+            ids[section][str(record['id'])] = record['id']
+        elif section == 'videos':
+            max_video_id = max(max_video_id, record['id'])
+    # Si un nombre coincide con un id, gana el id
+    return ({**names['categories'], **ids['categories']},
+            {**names['playlists'], **ids['playlists']}, max_video_id + 1)
+
+
+def _resolve(value, lookup):
+    """Id de una categoría o playlist dada por id o por nombre (sin distinguir mayúsculas)"""
+    value = _text(value)
+    return lookup.get(value, lookup.get(value.casefold()))
+
+
+def _ingest_rows(source, fmt):
+    """Genera (posición, fila, error) de un CSV con cabecera o de un NDJSON de objetos"""
+    source.seek(0)
+    text = io.TextIOWrapper(open_upload(source), encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            for line_number, row in enumerate(csv.DictReader(text), 2):
+                yield line_number, row, None
+        else:
+            for line_number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, None, f'Línea {line_number}: JSON no válido'
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, f'Línea {line_number}: se esperaba un objeto'
+                    continue
+                yield line_number, row, None
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise CatalogImportError(f'El archivo no se puede leer: {e}')
+    except (OSError, EOFError) as e:
+        raise CatalogImportError(f'No se pudo leer el archivo: {e}')
+    finally:
+        text.detach()
+
+
+def _no_progress(fraction=None, message=None):
+    pass
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _check_references(section, record, categories, playlists):
+    errors = []
+    if section in ('playlists', 'videos') and record['category_id'] not in categories:
+        errors.append(f"La categoría {record['category_id']} no existe")
+    if section == 'videos' and record.get('playlist_id') is not None \
+            and record['playlist_id'] not in playlists:
+        errors.append(f"La playlist {record['playlist_id']} no existe")
+    return errors
+
+
+def _drop_missing(report, section, position, record, field, valid_ids):
+    values = record.get(field, [])
+    kept = [value for value in values if value in valid_ids]
+    if len(kept) != len(values):
+        missing = [value for value in values if value not in valid_ids]
+        report.warn(section, position, record,
+                    f"Se quitaron de {field} ids inexistentes: {', '.join(map(str, missing))}")
+    record[field] = kept
+
+
+def _common_errors(record, name_field):
+    errors = []
+    if not _is_int(record.get('id')) or record['id'] <= 0:
+        errors.append('id debe ser un entero positivo')
+    if not isinstance(record.get(name_field), str) or not record[name_field].strip():
+        errors.append(f'Falta {name_field}')
+    return errors
+
+
+def _required_id(record, field):
+    if not _is_int(record.get(field)):
+        return [f'{field} debe ser un entero']
+    return []
+
+
+def _id_list(record, field):
+    values = record.get(field, [])
+    if not isinstance(values, list) or not all(_is_int(value) for value in values):
+        return [f'{field} debe ser una lista de enteros']
+    return []
+
+
+def _optional_types(record, types):
+    return [f'{field} debe ser de tipo {expected.__name__}'
+            for field, expected in types.items()
+            if record.get(field) is not None and not isinstance(record[field], expected)]
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _record_id(record):
+    return record.get('id') if isinstance(record, dict) else None
@@ -0,0 +1,49 @@
+"""Configuración de gunicorn para producción.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+La aplicación se carga una sola vez en el proceso maestro (preload_app):
+allí se lee el catálogo, se construyen sus índices y se compilan las
+plantillas antes de crear los workers, que los heredan por copy-on-write.
+gc.freeze() saca esos objetos del recolector de basura para que sus pasadas
+no toquen (y copien) las páginas compartidas. Cada worker arranca después
+sus propios hilos de segundo plano, y cuando otro worker cambia el catálogo
+aplica solo las entradas nuevas del diario de cambios.
+"""
+import gc
+import multiprocessing
+import os
+
+# app.py no arranca hilos al importarse: se hace en post_fork
+os.environ['VC7DAY_PRELOAD'] = '1'
+
+bind = os.environ.get('VC7DAY_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('VC7DAY_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('VC7DAY_THREADS', 4))
+preload_app = True
+# Las exportaciones y subidas grandes pueden tardar
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    import app
+    metrics_dir = app.app.config['METRICS_DIR']
+    # Los contadores empiezan de cero con cada arranque del maestro
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+    app.warm_up()
+    if not app.warmed_up.is_set():
+        server.log.warning('El calentamiento falló; los workers arrancan sin catálogo precargado')
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    # VC7DAY_BACKGROUND=0 deja los workers sin cola de trabajos ni comprobador de enlaces (pruebas de carga)
+    if os.environ.get('VC7DAY_BACKGROUND', '1') != '0':
+        app.start_background()
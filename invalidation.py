@@ -0,0 +1,65 @@
+"""Contadores de generación compartidos entre procesos.
+
+Cada nombre ('catalog', ...) tiene un entero de 64 bits en un archivo
+mapeado en memoria que comparten todos los workers. Quien cambia algo
+compartido suma uno a su contador; los demás comparan en cada petición el
+valor con el último que vieron, lo que es leer ocho bytes de memoria, sin
+llamadas al sistema, y solo cuando difiere miran qué cambió.
+
+Sumar uno se hace con el archivo bloqueado con lockf (a diferencia de
+flock, excluye también a los workers que heredaron el descriptor del
+maestro), así que dos procesos no pierden incrementos. Una lectura que
+coincida con una escritura puede ver un valor que no es ni el anterior ni
+el nuevo, pero nunca el anterior si hubo un cambio: como mucho provoca una
+comprobación de más.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+# Nombres con contador, en orden: la posición en el archivo es el índice
+NAMES = ('catalog',)
+
+_SLOT = struct.Struct('<Q')
+
+
+class Generations:
+    def __init__(self, path, names=NAMES):
+        self.path = os.path.abspath(path)
+        self._offsets = {name: index * _SLOT.size for index, name in enumerate(names)}
+        size = len(names) * _SLOT.size
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        with self._file_lock():
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._file.truncate(size)
+        # MAP_SHARED: los procesos hijos tras un fork siguen viendo el mismo archivo
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Valor actual del contador (solo lee memoria)"""
+        return _SLOT.unpack_from(self._map, self._offsets[name])[0]
+
+    def bump(self, name):
+        """Suma uno al contador y devuelve el valor nuevo"""
+        offset = self._offsets[name]
+        with self._lock, self._file_lock():
+            value = _SLOT.unpack_from(self._map, offset)[0] + 1
+            _SLOT.pack_into(self._map, offset, value)
+        return value
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @contextmanager
+    def _file_lock(self):
+        fcntl.lockf(self._file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._file, fcntl.LOCK_UN)
@@ -0,0 +1,304 @@
+"""Cola de trabajos en segundo plano para las operaciones largas de administración.
+
+Los trabajos se guardan en una tabla SQLite, así que sobreviven a un
+reinicio y cualquier worker de gunicorn puede ejecutarlos: cada hilo del
+pool reclama el siguiente trabajo pendiente con una actualización atómica.
+Un trabajo informa de su progreso, comprueba si se pidió cancelarlo y, si
+falla con un error transitorio, se vuelve a poner en cola con una espera
+que crece exponencialmente hasta agotar los intentos.
+
+Las funciones de cada tipo de trabajo se registran con register() y
+reciben un JobContext además de los parámetros con que se encoló.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+'''
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobError(Exception):
+    """Fallo definitivo: el trabajo no se reintenta
+
+    result se guarda igualmente (p. ej. el informe de una importación rechazada).
+    """
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo en curso"""
+
+
+class JobContext:
+    """Lo que recibe la función de un trabajo para informar de su progreso"""
+
+    def __init__(self, queue, job_id, attempt):
+        self.queue = queue
+        self.job_id = job_id
+        self.attempt = attempt
+        self._last_update = 0
+
+    def progress(self, fraction=None, message=None):
+        """Guarda el progreso (0-1) y lanza JobCancelled si se pidió cancelar
+
+        Las actualizaciones se espacian para no escribir en SQLite en cada
+        registro procesado.
+        """
+        now = time.monotonic()
+        if now - self._last_update < self.queue.progress_interval and fraction not in (0, 1):
+            return
+        self._last_update = now
+        with self.queue._connect() as db:
+            row = db.execute(
+                'UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message), '
+                'heartbeat = ? WHERE id = ? RETURNING cancel_requested',
+                (fraction, message, time.time(), self.job_id)).fetchone()
+        if row and row['cancel_requested']:
+            raise JobCancelled(self.job_id)
+
+    def check_cancelled(self):
+        self.progress()
+
+
+class JobQueue:
+    def __init__(self, db_path, workers=2, max_attempts=3, retry_delay=5, max_retry_delay=600,
+                 poll_interval=1, stale_after=300, keep_finished=7 * 24 * 3600):
+        self.db_path = os.path.abspath(db_path)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.keep_finished = keep_finished
+        self.progress_interval = 0.5
+        self._handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        with self._connect() as db:
+            # WAL deja leer el estado mientras otro hilo o proceso escribe
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def register(self, kind, handler=None, max_attempts=None):
+        """Registra la función de un tipo de trabajo; se puede usar como decorador"""
+        def decorator(handler):
+            self._handlers[kind] = (handler, max_attempts or self.max_attempts)
+            return handler
+        return decorator(handler) if handler else decorator
+
+    def enqueue(self, kind, params=None, unique=False, delay=0):
+        """Encola un trabajo y devuelve su id
+
+        Con unique, si ya hay uno igual (mismo tipo y parámetros) esperando
+        a ejecutarse se devuelve ese en lugar de encolar otro. La consulta y
+        la inserción van en la misma transacción con el bloqueo de escritura
+        de SQLite, así que dos workers que encolan a la vez no crean dos.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f'Tipo de trabajo desconocido: {kind}')
+        params_json = json.dumps(params or {}, sort_keys=True)
+        now = time.time()
+        with self._connect() as db:
+            if unique:
+                db.execute('BEGIN IMMEDIATE')
+                row = db.execute('SELECT id FROM jobs WHERE kind = ? AND params = ? AND status = ?',
+                                 (kind, params_json, QUEUED)).fetchone()
+                if row:
+                    return row['id']
+            job_id = uuid.uuid4().hex
+            db.execute('INSERT INTO jobs (id, kind, params, status, max_attempts, run_after, created_at) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, kind, params_json, QUEUED, self._handlers[kind][1], now + delay, now))
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def recent(self, limit=20):
+        with self._connect() as db:
+            rows = db.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancela un trabajo pendiente, o pide al que está en curso que se detenga"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET status = ?, finished_at = ?, message = ? WHERE id = ? AND status = ?',
+                       (CANCELLED, now, 'Cancelado', job_id, QUEUED))
+            db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?',
+                       (job_id, RUNNING))
+        return self.get(job_id)
+
+    def run_next(self, worker_name='manual'):
+        """Ejecuta el siguiente trabajo pendiente, si hay; devuelve si ejecutó alguno"""
+        job = self._claim(worker_name)
+        if job is None:
+            return False
+        self._run(job)
+        return True
+
+    def start(self):
+        """Arranca los hilos del pool en este proceso"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._recover_stale()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f'{socket.gethostname()}:{os.getpid()}:{index}',),
+                                      name=f'vc7day-job-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self, worker_name):
+        while not self._stopping.is_set():
+            try:
+                if self.run_next(worker_name):
+                    continue
+                self._recover_stale()
+                self._remove_old()
+            except Exception:
+                logger.exception('Error en la cola de trabajos')
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim(self, worker_name):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                'UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, started_at = ?, '
+                'attempts = attempts + 1, cancel_requested = 0 '
+                'WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ? '
+                'ORDER BY run_after, created_at LIMIT 1) RETURNING *',
+                (RUNNING, worker_name, now, now, QUEUED, now)).fetchone()
+        return _job_dict(row) if row else None
+
+    def _run(self, job):
+        handler = self._handlers.get(job['kind'], (None,))[0]
+        context = JobContext(self, job['id'], job['attempts'])
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job['id'], done), daemon=True).start()
+        try:
+            if handler is None:
+                raise JobError(f"Tipo de trabajo desconocido: {job['kind']}")
+            result = handler(context, **job['params'])
+        except JobCancelled:
+            self._finish(job['id'], CANCELLED, message='Cancelado')
+        except JobError as e:
+            self._finish(job['id'], FAILED, error=str(e), result=e.result)
+        except Exception as e:
+            logger.exception('Falló el trabajo %s (%s)', job['id'], job['kind'])
+            if job['attempts'] < job['max_attempts']:
+                self._retry(job, e)
+            else:
+                self._finish(job['id'], FAILED, error=f'{type(e).__name__}: {e}')
+        else:
+            self._finish(job['id'], SUCCEEDED, result=result, progress=1)
+        finally:
+            done.set()
+
+    def _heartbeat(self, job_id, done):
+        """Marca el trabajo como vivo aunque su función no informe de progreso"""
+        while not done.wait(self.stale_after / 3):
+            with self._connect() as db:
+                db.execute('UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ?',
+                           (time.time(), job_id, RUNNING))
+
+    def _retry(self, job, error):
+        # Espera exponencial con algo de aleatoriedad para no reintentar todos a la vez
+        delay = min(self.retry_delay * 2 ** (job['attempts'] - 1), self.max_retry_delay)
+        delay *= random.uniform(0.8, 1.2)
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET status = ?, run_after = ?, error = ?, message = ?, worker = NULL '
+                       'WHERE id = ?',
+                       (QUEUED, time.time() + delay, f'{type(error).__name__}: {error}',
+                        f"Reintento {job['attempts'] + 1} de {job['max_attempts']} en {delay:.0f} s", job['id']))
+
+    def _finish(self, job_id, status, result=None, error=None, message=None, progress=None):
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET status = ?, result = ?, error = ?, message = COALESCE(?, message), '
+                       'progress = COALESCE(?, progress), finished_at = ?, worker = NULL WHERE id = ?',
+                       (status, json.dumps(result) if result is not None else None, error, message,
+                        progress, time.time(), job_id))
+
+    def _recover_stale(self):
+        """Vuelve a poner en cola los trabajos de un worker que dejó de dar señales"""
+        limit = time.time() - self.stale_after
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET status = ?, worker = NULL, message = ? '
+                       'WHERE status = ? AND heartbeat < ? AND attempts < max_attempts',
+                       (QUEUED, 'Reanudado tras interrumpirse', RUNNING, limit))
+            db.execute('UPDATE jobs SET status = ?, worker = NULL, error = ?, finished_at = ? '
+                       'WHERE status = ? AND heartbeat < ?',
+                       (FAILED, 'El trabajo se interrumpió demasiadas veces', time.time(), RUNNING, limit))
+
+    def _remove_old(self):
+        limit = time.time() - self.keep_finished
+        with self._connect() as db:
+            db.execute(f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished_at < ?",
+                       (*FINISHED, limit))
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+def _job_dict(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
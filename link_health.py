@@ -0,0 +1,169 @@
+"""Comprobación periódica de los enlaces de video y miniatura del catálogo.
+
+Cada URL se valida con HEAD (o, si el servidor no lo admite, con un GET
+de un solo byte) desde un pool de hilos con un límite de conexiones por
+host. Los resultados se guardan en una tabla SQLite con la hora de la
+última comprobación, y cada pasada solo revisa las URLs nuevas o las que
+llevan más tiempo sin comprobarse. Las páginas de administración leen la
+tabla sin hacer ninguna petición de red.
+"""
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from upstream import create_session
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS link_status (
+    url TEXT PRIMARY KEY,
+    ok INTEGER NOT NULL,
+    status_code INTEGER,
+    error TEXT,
+    elapsed_ms INTEGER,
+    checked_at REAL NOT NULL
+)
+'''
+
+
+class LinkHealthChecker:
+    def __init__(self, db_path, local_resolver, session=None, max_workers=16,
+                 max_per_host=4, timeout=(5, 10), max_age=6 * 3600):
+        """local_resolver(url) devuelve la ruta en disco de los archivos locales o None"""
+        self.db_path = os.path.abspath(db_path)
+        self.local_resolver = local_resolver
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_age = max_age
+        self.session = session or create_session(pool_maxsize=max_per_host)
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self._thread = None
+        with self._connect() as db:
+            db.execute(SCHEMA)
+
+    def statuses(self, urls=None):
+        """{url: fila} con el último resultado de cada URL, sin red"""
+        with self._connect() as db:
+            if urls is None:
+                rows = db.execute('SELECT * FROM link_status').fetchall()
+            else:
+                urls = list(set(urls))
+                rows = []
+                # SQLite limita el número de parámetros por consulta
+                for start in range(0, len(urls), 500):
+                    batch = urls[start:start + 500]
+                    rows.extend(db.execute(
+                        f"SELECT * FROM link_status WHERE url IN ({','.join('?' * len(batch))})", batch))
+        return {row['url']: dict(row) for row in rows}
+
+    def stale(self, urls, limit=None):
+        """URLs sin comprobar o comprobadas hace más de max_age, las más antiguas primero"""
+        known = self.statuses(urls)
+        limit_time = time.time() - self.max_age
+        pending = [url for url in set(urls)
+                   if url not in known or known[url]['checked_at'] < limit_time]
+        pending.sort(key=lambda url: known[url]['checked_at'] if url in known else 0)
+        return pending[:limit] if limit else pending
+
+    def check_urls(self, urls):
+        """Comprueba las URLs en paralelo y guarda los resultados"""
+        if not urls:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.check_one, urls))
+        with self._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO link_status VALUES (?, ?, ?, ?, ?, ?)', results)
+        return len(results)
+
+    def check_one(self, url):
+        """(url, ok, status_code, error, elapsed_ms, checked_at) de una URL"""
+        started = time.monotonic()
+        status_code, error = None, None
+        path = self.local_resolver(url)
+        if path is not None or not url.startswith(('http://', 'https://')):
+            ok = path is not None
+            if not ok:
+                error = 'Archivo no encontrado'
+        else:
+            with self._slot(url):
+                try:
+                    status_code = self._request(url)
+                    ok = status_code in (200, 206)
+                except OSError as e:
+                    ok, error = False, str(e)[:500]
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        return url, int(ok), status_code, error, elapsed_ms, time.time()
+
+    def run_pass(self, urls, limit=None):
+        """Revisa las URLs pendientes si ningún otro proceso está haciendo una pasada
+
+        Con varios workers de gunicorn, el lock de archivo evita que todos
+        comprueben las mismas URLs a la vez.
+        """
+        with self.pass_lock(wait=False) as acquired:
+            if not acquired:
+                return 0
+            return self.check_urls(self.stale(urls, limit))
+
+    @contextmanager
+    def pass_lock(self, wait=True):
+        """Bloqueo entre procesos de las pasadas; entrega False si wait es False y otro lo tiene"""
+        with open(f'{self.db_path}.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+
+    def start(self, urls_provider, interval=300, batch=200):
+        """Hilo en segundo plano que hace una pasada cada interval segundos"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.run_pass(urls_provider(), limit=batch)
+                except Exception:
+                    logger.exception('Error en la comprobación de enlaces')
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=loop, name='vc7day-link-health', daemon=True)
+        self._thread.start()
+
+    def _request(self, url):
+        with self.session.head(url, timeout=self.timeout, allow_redirects=True) as response:
+            if response.status_code not in (403, 405, 501):
+                return response.status_code
+        # Algunos servidores no aceptan HEAD: se pide un solo byte
+        with self.session.get(url, headers={'Range': 'bytes=0-0'}, timeout=self.timeout,
+                              stream=True, allow_redirects=True) as response:
+            return response.status_code
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
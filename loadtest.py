@@ -0,0 +1,310 @@
+"""Prueba de carga de extremo a extremo con una mezcla de tráfico realista.
+
+Genera un catálogo sintético (ver benchmark.py) en un directorio temporal
+y lanza varios hilos que repiten una mezcla de peticiones: portada,
+categorías, playlists, ver videos (que suma una vista), likes, búsquedas,
+autocompletado y, de vez en cuando, la edición de una playlist desde la
+administración. Se puede ejecutar dentro del proceso con app.test_client()
+o contra un gunicorn local con N workers.
+
+Al terminar informa de peticiones por segundo, latencias p50/p95/p99 y
+tasa de errores por tipo de petición, y compara las vistas y likes que
+quedaron en data.json con los que se sumaron con éxito: si faltan, dos
+escrituras concurrentes se pisaron (actualizaciones perdidas).
+
+    python loadtest.py --videos 10000 --duration 30 --concurrency 16
+    python loadtest.py --mode gunicorn --workers 4 --duration 60 --output carga.json
+"""
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import click
+import requests
+
+from benchmark import WORDS, generate_catalog, load_app, use_catalog
+
+# Peso de cada tipo de petición en la mezcla
+MIX = {
+    'home': 10,
+    'category': 14,
+    'playlist': 6,
+    'watch': 35,
+    'like': 8,
+    'search': 8,
+    'autocomplete': 18,
+    'admin_edit': 1,
+}
+
+ADMIN_PASSWORD = 'obi123'
+
+
+class InProcessClient:
+    """Peticiones a través de app.test_client(), un cliente por hilo"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, url, data=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.app.test_client()
+            with client.session_transaction() as session:
+                session['logged_in'] = True
+        response = client.open(url, method=method, data=data)
+        return response.status_code, response.get_json(silent=True) if response.is_json else None
+
+
+class HttpClient:
+    """Peticiones HTTP a un servidor, una sesión con login por hilo"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, url, data=None):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.post(self.base_url + '/admin/login', data={'password': ADMIN_PASSWORD}, timeout=self.timeout)
+        response = session.request(method, self.base_url + url, data=data, timeout=self.timeout,
+                                   allow_redirects=False)
+        is_json = response.headers.get('Content-Type', '').startswith('application/json')
+        return response.status_code, response.json() if is_json else None
+
+
+class TrafficMix:
+    """Elige la siguiente petición y anota los incrementos que se confirmaron"""
+
+    def __init__(self, catalog, seed=0):
+        self.videos = [v['id'] for v in catalog['videos']]
+        self.categories = [c['id'] for c in catalog['categories']]
+        self.playlists = {p['id']: p for p in catalog['playlists']}
+        self.kinds = list(MIX)
+        self.weights = [MIX[kind] for kind in self.kinds]
+        self.seed = seed
+        self.views = Counter()
+        self.likes = Counter()
+        self._lock = threading.Lock()
+
+    def next_request(self, rng):
+        """(tipo, método, url, datos del formulario, id del video que se incrementa)"""
+        kind = rng.choices(self.kinds, self.weights)[0]
+        # Los videos populares reciben casi todo el tráfico
+        video_id = self.videos[min(int(rng.paretovariate(1.1)) - 1, len(self.videos) - 1)]
+        if kind == 'home':
+            return kind, 'GET', '/', None, None
+        if kind == 'category':
+            return kind, 'GET', f'/category/{rng.choice(self.categories)}', None, None
+        if kind == 'playlist' and self.playlists:
+            return kind, 'GET', f'/playlist/{rng.choice(list(self.playlists))}', None, None
+        if kind == 'watch':
+            return kind, 'GET', f'/video/{video_id}', None, video_id
+        if kind == 'like':
+            return kind, 'POST', f'/api/video/{video_id}/like', None, video_id
+        if kind == 'search':
+            return kind, 'GET', f'/search?q={rng.choice(WORDS)}', None, None
+        if kind == 'admin_edit' and self.playlists:
+            playlist = self.playlists[rng.choice(list(self.playlists))]
+            form = {
+                'name': f"{playlist['name'].split(' #')[0]} #{rng.randint(1, 9999)}",
+                'description': playlist['description'],
+                'category_id': playlist['category_id'],
+                'thumbnail': playlist['thumbnail'],
+                'videos': ','.join(map(str, playlist['videos'])),
+            }
+            return kind, 'POST', f"/admin/playlists/edit/{playlist['id']}", form, None
+        return 'autocomplete', 'GET', f'/api/videos/search?q={rng.choice(WORDS)[:3]}', None, None
+
+    def confirmed(self, kind, video_id):
+        with self._lock:
+            if kind == 'watch':
+                self.views[video_id] += 1
+            elif kind == 'like':
+                self.likes[video_id] += 1
+
+
+def run_load(client, mix, duration, concurrency, max_requests=None):
+    """Lanza los hilos y devuelve [(tipo, segundos, estado)] de todas las peticiones"""
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    issued = iter(range(max_requests)) if max_requests else None
+    issued_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(mix.seed * 1000 + index)
+        local = []
+        while time.monotonic() < deadline:
+            if issued is not None:
+                with issued_lock:
+                    if next(issued, None) is None:
+                        break
+            kind, method, url, data, video_id = mix.next_request(rng)
+            started = time.perf_counter()
+            try:
+                status, _ = client.request(method, url, data)
+            except (requests.RequestException, OSError):
+                status = None
+            local.append((kind, time.perf_counter() - started, status))
+            if status == 200 and video_id is not None:
+                mix.confirmed(kind, video_id)
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f'vc7day-load-{index}')
+               for index in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - started
+
+
+def summarize(samples, elapsed):
+    """Estadísticas globales y por tipo de petición"""
+    by_kind = {}
+    for kind, seconds, status in samples:
+        by_kind.setdefault(kind, []).append((seconds, status))
+    report = {'total': _stats([s[1:] for s in samples], elapsed)}
+    for kind, values in sorted(by_kind.items()):
+        report[kind] = _stats(values, elapsed)
+    return report
+
+
+def _stats(values, elapsed):
+    latencies = sorted(seconds * 1000 for seconds, _ in values)
+    # Las redirecciones son la respuesta normal de los formularios de administración
+    errors = sum(1 for _, status in values if status is None or status >= 400)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': round(errors / len(values), 4) if values else 0,
+        'rps': round(len(values) / elapsed, 1) if elapsed else 0,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+    }
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 2)
+
+
+def lost_updates(before, after, mix):
+    """Vistas y likes confirmados que no llegaron a data.json"""
+    initial = {v['id']: v for v in before['videos']}
+    final = {v['id']: v for v in after['videos']}
+    result = {}
+    for field, expected in (('views', mix.views), ('likes', mix.likes)):
+        lost = extra = 0
+        for video_id, count in expected.items():
+            delta = final.get(video_id, {}).get(field, 0) - initial[video_id].get(field, 0)
+            lost += max(count - delta, 0)
+            extra += max(delta - count, 0)
+        result[field] = {'confirmed': sum(expected.values()), 'lost': lost, 'unconfirmed_extra': extra}
+    return result
+
+
+def start_gunicorn(workdir, workers, threads, port):
+    # Con la misma configuración que en producción (preload, calentamiento antes del fork)
+    root = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-m', 'gunicorn', '--config', os.path.join(root, 'gunicorn.conf.py'),
+               '--workers', str(workers), '--threads', str(threads), '--bind', f'127.0.0.1:{port}',
+               '--chdir', workdir, '--pythonpath', root, 'app:app']
+    # Sin hilos en segundo plano: el comprobador de enlaces pediría las URLs inventadas del catálogo
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               env={**os.environ, 'VC7DAY_BACKGROUND': '0'})
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f'gunicorn terminó al arrancar:\n{process.stderr.read().decode()}')
+        try:
+            requests.get(base_url + '/api/videos/search', timeout=2)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException('gunicorn no respondió a tiempo')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@click.command()
+@click.option('--mode', type=click.Choice(['inprocess', 'gunicorn']), default='inprocess', show_default=True)
+@click.option('--videos', default=10000, show_default=True, help='Videos del catálogo sintético')
+@click.option('--duration', default=30.0, show_default=True, help='Segundos de carga')
+@click.option('--requests', 'max_requests', type=int, help='Parar tras este número de peticiones')
+@click.option('--concurrency', default=16, show_default=True, help='Clientes simultáneos')
+@click.option('--workers', default=4, show_default=True, help='Workers de gunicorn')
+@click.option('--threads', default=1, show_default=True, help='Hilos por worker de gunicorn')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Archivo JSON con los resultados')
+def main(mode, videos, duration, max_requests, concurrency, workers, threads, seed, output):
+    """Mide el rendimiento de la aplicación con tráfico simultáneo"""
+    output = os.path.abspath(output) if output else None
+    workdir = tempfile.mkdtemp(prefix='vc7day-load-')
+    data_path = os.path.join(workdir, 'data.json')
+    catalog = generate_catalog(videos, seed=seed)
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    mix = TrafficMix(catalog, seed)
+    server = None
+    try:
+        if mode == 'gunicorn':
+            server, base_url = start_gunicorn(workdir, workers, threads, _free_port())
+            client = HttpClient(base_url)
+        else:
+            app = load_app(workdir)
+            use_catalog(app, data_path)
+            client = InProcessClient(app)
+        click.echo(f'{mode}: {videos} videos, {concurrency} clientes, {duration:g} s', err=True)
+        samples, elapsed = run_load(client, mix, duration, concurrency, max_requests)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+    with open(data_path, encoding='utf-8') as f:
+        final = json.load(f)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'mode': mode,
+        'videos': videos,
+        'concurrency': concurrency,
+        'workers': workers if mode == 'gunicorn' else 1,
+        'elapsed_s': round(elapsed, 2),
+        'results': summarize(samples, elapsed),
+        'lost_updates': lost_updates(catalog, final, mix),
+    }
+    for kind, stats in report['results'].items():
+        click.echo(f"{kind:<14} {stats['requests']:>7} req {stats['rps']:>8.1f} req/s  "
+                   f"p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms  "
+                   f"errores {stats['error_rate']:.2%}", err=True)
+    for field, counts in report['lost_updates'].items():
+        click.echo(f"{field}: {counts['confirmed']} confirmadas, {counts['lost']} perdidas", err=True)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
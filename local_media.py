@@ -0,0 +1,109 @@
+"""Envío de archivos locales (UPLOAD_FOLDER) con soporte de rangos HTTP.
+
+Cuando el servidor WSGI ofrece wsgi.file_wrapper (gunicorn), el archivo se
+entrega posicionado en el inicio del rango y con Content-Length ajustado,
+de modo que el servidor lo envía con os.sendfile sin pasar los datos por
+Python. Si no, se sirve desde un mapeo en memoria (mmap) del archivo.
+
+flask.send_file no sirve aquí: para las peticiones con Range envuelve el
+archivo en un iterador propio y el servidor ya no puede usar sendfile.
+"""
+import mimetypes
+import mmap
+import os
+from email.utils import formatdate
+
+from streaming import RangeNotSatisfiable, parse_range
+
+
+class MappedFileBody:
+    """Iterable WSGI que lee un rango del archivo a través de mmap"""
+
+    def __init__(self, f, start, length, chunk_size):
+        self._file = f
+        self._start = start
+        self._length = length
+        self._chunk_size = chunk_size
+
+    def __iter__(self):
+        end = self._start + self._length
+        try:
+            mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Archivos que no se pueden mapear: lectura normal
+            self._file.seek(self._start)
+            remaining = self._length
+            while remaining > 0:
+                chunk = self._file.read(min(self._chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            return
+
+        with mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL, 0, len(mapped))
+            for offset in range(self._start, end, self._chunk_size):
+                yield mapped[offset:min(offset + self._chunk_size, end)]
+
+    def close(self):
+        self._file.close()
+
+
+def file_etag(stat):
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def open_local_media(path, environ, chunk_size=256 * 1024):
+    """Prepara la respuesta para un archivo local: (status, cabeceras, cuerpo)"""
+    f = open(path, 'rb')
+    stat = os.fstat(f.fileno())
+    size = stat.st_size
+    etag = file_etag(stat)
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    headers = {
+        'Content-Type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+    }
+
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+        f.close()
+        return 304, headers, []
+
+    byte_range = None
+    if_range = environ.get('HTTP_IF_RANGE')
+    if not if_range or if_range in (etag, last_modified):
+        try:
+            byte_range = parse_range(environ.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            f.close()
+            headers['Content-Range'] = f'bytes */{size}'
+            return 416, headers, []
+
+    if byte_range is None:
+        status, start, length = 200, 0, size
+    else:
+        status, start, length = 206, byte_range[0], byte_range[1] - byte_range[0] + 1
+        headers['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+    headers['Content-Length'] = str(length)
+
+    if environ.get('REQUEST_METHOD') == 'HEAD' or length == 0:
+        f.close()
+        return status, headers, []
+
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and (byte_range is None or _limits_to_content_length(environ)):
+        # gunicorn envía desde la posición actual hasta Content-Length con os.sendfile
+        f.seek(start)
+        return status, headers, file_wrapper(f, chunk_size)
+    return status, headers, MappedFileBody(f, start, length, chunk_size)
+
+
+def _limits_to_content_length(environ):
+    """Si el servidor corta el file_wrapper en Content-Length (necesario para los rangos)"""
+    return environ.get('SERVER_SOFTWARE', '').startswith(('gunicorn', 'waitress'))
@@ -0,0 +1,161 @@
+"""Índice de metadatos de los videos (duración, resolución y códecs).
+
+De cada video solo se leen las cabeceras de las cajas y la caja moov: por
+HTTP con unas pocas peticiones Range, o directamente del disco para los
+archivos de UPLOAD_FOLDER. El catálogo se recorre con un número acotado de
+hilos y solo se vuelven a leer los videos cuya URL cambió desde la última
+vez.
+
+Un archivo que no es un MP4 válido deja su error guardado hasta que cambie
+la URL. Los fallos pasajeros (red, tiempo agotado, errores 5xx del
+servidor) se guardan con retry_after y el video se vuelve a leer a partir
+de esa hora, con esperas cada vez más largas; si el video ya tenía
+metadatos de esa misma URL, se conservan.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import mp4
+from upstream import create_session
+
+# Las lecturas pequeñas se agrupan en páginas alineadas para ahorrar peticiones
+PAGE_SIZE = 64 * 1024
+
+# Espera antes de reintentar un video tras un fallo pasajero; se duplica en cada fallo
+RETRY_DELAY = 15 * 60
+MAX_RETRY_DELAY = 24 * 3600
+
+
+class MetadataUnavailable(Exception):
+    """El servidor no pudo responder ahora (sobrecarga, error interno): se reintenta más tarde"""
+
+
+class HttpRangeReader:
+    """read_at() sobre HTTP con peticiones Range y una caché de páginas"""
+
+    def __init__(self, session, url, timeout=10):
+        self.session = session
+        self.url = url
+        self.timeout = timeout
+        self.size = None
+        self._pages = {}
+
+    def read_at(self, offset, n):
+        if self.size is None:
+            self._fetch(0, PAGE_SIZE)
+        end = min(offset + n, self.size)
+        if end <= offset:
+            return b''
+        if n > PAGE_SIZE:
+            # Lecturas grandes (la caja moov) van en una sola petición
+            return self._fetch(offset, end - offset)
+
+        first_page, last_page = offset // PAGE_SIZE, (end - 1) // PAGE_SIZE
+        for page in range(first_page, last_page + 1):
+            if page not in self._pages:
+                self._fetch(page * PAGE_SIZE, PAGE_SIZE)
+        data = b''.join(self._pages[page] for page in range(first_page, last_page + 1))
+        start = offset - first_page * PAGE_SIZE
+        return data[start:start + end - offset]
+
+    def _fetch(self, offset, length):
+        headers = {'Range': f'bytes={offset}-{offset + length - 1}'}
+        with self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 200:
+                raise mp4.MP4Error('El servidor no admite peticiones por rangos')
+            if response.status_code in (408, 429) or response.status_code >= 500:
+                raise MetadataUnavailable(f'El servidor respondió {response.status_code}')
+            if response.status_code != 206:
+                raise mp4.MP4Error(f'El servidor respondió {response.status_code}')
+            match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != offset:
+                raise mp4.MP4Error('Content-Range no válido')
+            self.size = int(match.group(3))
+            content = response.raw.read(length, decode_content=True)
+        if length == PAGE_SIZE and offset % PAGE_SIZE == 0:
+            self._pages[offset // PAGE_SIZE] = content
+        return content
+
+
+class MetadataIndexer:
+    def __init__(self, local_resolver, session=None, max_workers=4, timeout=10):
+        """local_resolver(video_url) devuelve la ruta en disco de los videos locales o None"""
+        self.local_resolver = local_resolver
+        self.session = session or create_session(pool_maxsize=max_workers)
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def read(self, video_url):
+        """Metadatos de un video, leyendo del disco o por rangos HTTP"""
+        path = self.local_resolver(video_url)
+        if path is not None:
+            with open(path, 'rb') as f:
+                return mp4.read_metadata(mp4.file_reader(f), os.fstat(f.fileno()).st_size)
+        if not video_url.startswith(('http://', 'https://')):
+            raise mp4.MP4Error(f'URL de video no soportada: {video_url}')
+        reader = HttpRangeReader(self.session, video_url, self.timeout)
+        reader.read_at(0, 8)
+        return mp4.read_metadata(reader.read_at, reader.size)
+
+    def index(self, videos, force=False):
+        """Lee en paralelo los videos pendientes: {id: metadatos}
+
+        Un video está pendiente si nunca se indexó, si su URL cambió desde
+        la última vez o si le toca reintentar tras un fallo pasajero. Los
+        archivos no válidos guardan su error, para no volver a leer en cada
+        pasada un video roto que no ha cambiado.
+        """
+        now = datetime.now()
+        pending = [(v['id'], v['video_url'], v.get('media') or {}) for v in videos
+                   if v.get('video_url') and (force or needs_indexing(v, now))]
+        if not pending:
+            return {}
+
+        def read_one(item):
+            video_id, video_url, previous = item
+            media = {'url': video_url, 'indexed_at': datetime.now().isoformat()}
+            try:
+                media.update(self.read(video_url))
+            except mp4.MP4Error as e:
+                media['error'] = str(e)
+            except (MetadataUnavailable, OSError) as e:
+                same_url = previous.get('url') == video_url
+                if same_url and 'error' not in previous:
+                    # Ya tiene metadatos de esta URL: mejor los anteriores que un error pasajero
+                    return video_id, None
+                attempts = previous.get('attempts', 0) + 1 if same_url else 1
+                delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                media.update(error=str(e), attempts=attempts,
+                             retry_after=(datetime.now() + timedelta(seconds=delay)).isoformat())
+            return video_id, media
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return {video_id: media for video_id, media in executor.map(read_one, pending)
+                    if media is not None}
+
+
+def needs_indexing(video, now=None):
+    media = video.get('media') or {}
+    if media.get('url') != video.get('video_url'):
+        return True
+    return 'retry_after' in media and datetime.fromisoformat(media['retry_after']) <= (now or datetime.now())
+
+
+def next_retry(videos):
+    """Hora del próximo reintento tras un fallo pasajero (datetime), o None si no hay"""
+    retries = [datetime.fromisoformat(v['media']['retry_after']) for v in videos
+               if 'retry_after' in (v.get('media') or {}) and v['media'].get('url') == v.get('video_url')]
+    return min(retries, default=None)
+
+
+def apply_metadata(catalog, results):
+    """Guarda los resultados en los videos cuya URL no cambió mientras se leían"""
+    updated = 0
+    for video_id, media in results.items():
+        video = catalog.videos.get(video_id)
+        if video is not None and media['url'] == video.get('video_url'):
+            catalog.update_video(video_id, media=media)
+            updated += 1
+    return updated
@@ -0,0 +1,231 @@
+"""Métricas de la aplicación en el formato de texto de Prometheus.
+
+Cada hilo de cada proceso (cada worker de gunicorn) guarda sus valores en
+su propio archivo mapeado en memoria dentro de un directorio compartido
+(<pid>-<n>.db): solo el hilo dueño escribe en él, así que no hay bloqueos
+ni entre procesos ni entre hilos y sumar uno a un contador es escribir
+ocho bytes en memoria. Cuando un hilo termina, su archivo queda libre para
+el siguiente hilo nuevo del proceso, así que hay tantos archivos como
+hilos llegaron a funcionar a la vez. /metrics lee todos los archivos del
+directorio y suma los valores. Los archivos de los workers que ya
+terminaron se siguen sumando, para que los contadores no retrocedan
+cuando gunicorn recicla un worker.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+
+# Límites superiores (en segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+INITIAL_SIZE = 64 * 1024
+
+# Cabecera del archivo: bytes usados (uint32) y relleno hasta 8 bytes
+_HEADER = struct.Struct('<I4x')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+class MmapValues:
+    """Valores numéricos con nombre en un archivo mapeado en memoria
+
+    Cada entrada es la longitud de la clave, la clave en UTF-8 (rellena
+    hasta múltiplo de 8) y un double. Las entradas nuevas se escriben antes
+    de actualizar la cabecera, así que un lector nunca ve una a medias.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._positions = {}
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, _, position in _entries(self._map, self._used):
+            self._positions[key] = position
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = _VALUE.unpack_from(self._map, position)[0]
+        _VALUE.pack_into(self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = _KEY_LENGTH.size + len(encoded)
+        padded += -padded % 8
+        size = padded + _VALUE.size
+        if self._used + size > len(self._map):
+            self._grow(self._used + size)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        position = self._used + padded
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+
+class Metrics:
+    def __init__(self, directory, buckets=DEFAULT_BUCKETS, prefix='vc7day_'):
+        self.directory = os.path.abspath(directory)
+        self.buckets = tuple(float(b) for b in buckets)
+        self.prefix = prefix
+        self._families = {}
+        self._local = threading.local()
+        # Solo al dar o recuperar el archivo de un hilo, no en cada suma
+        self._lock = threading.Lock()
+        self._free = []
+        self._files = 0
+        self._pid = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def counter(self, name, help_text):
+        self._families[self.prefix + name] = ('counter', help_text)
+
+    def histogram(self, name, help_text):
+        self._families[self.prefix + name] = ('histogram', help_text)
+
+    def inc(self, name, amount=1, **labels):
+        self._add(self.prefix + name, labels, amount)
+
+    def observe(self, name, value, **labels):
+        """Añade una observación: solo se escriben su bucket y la suma
+
+        Los buckets se guardan sin acumular y se acumulan al exportar.
+        """
+        name = self.prefix + name
+        le = next((b for b in self.buckets if value <= b), float('inf'))
+        self._add(name + '_bucket', {**labels, 'le': _format_value(le)}, 1)
+        self._add(name + '_sum', labels, value)
+
+    def collect(self):
+        """{(nombre, etiquetas): valor} sumando los archivos de todos los procesos"""
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, '*.db')):
+            with open(path, 'rb') as f:
+                content = f.read()
+            if len(content) < _HEADER.size:
+                continue
+            used = _HEADER.unpack_from(content, 0)[0]
+            for key, value, _ in _entries(content, used):
+                name, labels = json.loads(key)
+                sample = (name, tuple(tuple(label) for label in labels))
+                totals[sample] = totals.get(sample, 0) + value
+        return totals
+
+    def render(self):
+        """Texto de exposición de Prometheus con todas las familias registradas"""
+        totals = self.collect()
+        lines = []
+        for family, (kind, help_text) in sorted(self._families.items()):
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                lines.extend(self._render_histogram(family, totals))
+            else:
+                for (name, labels), value in sorted(totals.items()):
+                    if name == family:
+                        lines.append(_sample(name, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, family, totals):
+        series = {}
+        for (name, labels), value in totals.items():
+            if name == family + '_bucket':
+                labels = dict(labels)
+                le = float(labels.pop('le'))
+                series.setdefault(tuple(sorted(labels.items())), {})[le] = value
+        for labels in sorted(series):
+            counts = series[labels]
+            cumulative = 0
+            for le in self.buckets + (float('inf'),):
+                cumulative += counts.get(le, 0)
+                yield _sample(family + '_bucket', labels + (('le', _format_value(le)),), cumulative)
+            yield _sample(family + '_sum', labels, totals.get((family + '_sum', labels), 0))
+            yield _sample(family + '_count', labels, cumulative)
+
+    def _add(self, name, labels, amount):
+        key = json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+        local = self._local
+        # Tras un fork el hilo que sigue en el proceso hijo necesita un archivo propio
+        if getattr(local, 'pid', None) != os.getpid():
+            local.values = self._thread_values()
+            local.pid = os.getpid()
+        local.values.add(key, amount)
+
+    def _thread_values(self):
+        """Archivo del hilo actual: uno libre del proceso o uno nuevo"""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._free, self._files, self._pid = [], 0, pid
+            if self._free:
+                values = self._free.pop()
+            else:
+                values = MmapValues(os.path.join(self.directory, f'{pid}-{self._files}.db'))
+                self._files += 1
+        # Cuando el hilo termine se borra su threading.local y el archivo vuelve a quedar libre
+        owner = self._local.owner = _ThreadOwner()
+        weakref.finalize(owner, self._release, pid, values)
+        return values
+
+    def _release(self, pid, values):
+        with self._lock:
+            if self._pid == pid:
+                self._free.append(values)
+
+
+class _ThreadOwner:
+    """Objeto guardado en el threading.local de cada hilo para saber cuándo termina"""
+
+
+def _entries(buffer, used):
+    """(clave, valor, posición del valor) de cada entrada escrita"""
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length]).decode('utf-8')
+        padded = _KEY_LENGTH.size + length
+        padded += -padded % 8
+        value_position = position + padded
+        yield key, _VALUE.unpack_from(buffer, value_position)[0], value_position
+        position = value_position + _VALUE.size
+
+
+def _sample(name, labels, value):
+    if not labels:
+        return f'{name} {_format_value(value)}'
+    rendered = ','.join(f'{key}="{_escape(label_value)}"' for key, label_value in labels)
+    return f'{name}{{{rendered}}} {_format_value(value)}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return f'{value:.1f}'
+    return repr(float(value))
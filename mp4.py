@@ -0,0 +1,277 @@
+"""Lectura de la estructura de archivos MP4 y reescritura "faststart".
+
+Un MP4 está formado por cajas (box/atom): 4 bytes de tamaño, 4 de tipo y
+el contenido. La caja moov contiene los índices que el navegador necesita
+antes de reproducir; si está al final del archivo, el navegador tiene que
+pedir el final (o todo el archivo) antes de empezar. faststart() mueve moov
+al principio y corrige los offsets de los chunks (stco/co64) que apuntan a
+los datos de mdat, copiando el resto del archivo por bloques.
+
+Las funciones de lectura reciben read_at(offset, n) -> bytes, de modo que
+sirven igual para un archivo local que para lecturas por rangos HTTP.
+"""
+import os
+import struct
+
+COPY_SIZE = 1024 * 1024
+
+# moov no contiene datos de video, solo índices: un límite evita cargar basura
+MAX_MOOV_SIZE = 256 * 1024 * 1024
+
+# Cajas contenedoras que hay que recorrer hasta llegar a stco/co64
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class MP4Error(Exception):
+    """El archivo no es un MP4 válido o no se puede reescribir"""
+
+
+def file_reader(f):
+    """read_at() para un archivo local abierto en modo binario"""
+    def read_at(offset, n):
+        return os.pread(f.fileno(), n, offset)
+    return read_at
+
+
+def read_box_header(read_at, offset, file_size):
+    """Devuelve (tipo, tamaño total, tamaño de la cabecera) de la caja en offset"""
+    header = read_at(offset, 16)
+    if len(header) < 8:
+        raise MP4Error(f'Cabecera de caja incompleta en {offset}')
+    size, box_type = struct.unpack('>I4s', header[:8])
+    header_size = 8
+    if size == 1:
+        if len(header) < 16:
+            raise MP4Error(f'Cabecera de caja incompleta en {offset}')
+        size = struct.unpack('>Q', header[8:16])[0]
+        header_size = 16
+    elif size == 0:
+        # La caja llega hasta el final del archivo
+        size = file_size - offset
+    if size < header_size or offset + size > file_size:
+        raise MP4Error(f'Tamaño de caja no válido en {offset}: {size}')
+    return box_type, size, header_size
+
+
+def top_level_boxes(read_at, file_size):
+    """Lista de (tipo, offset, tamaño) de las cajas de primer nivel, leyendo solo cabeceras"""
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        box_type, size, _ = read_box_header(read_at, offset, file_size)
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+
+def needs_faststart(boxes):
+    """True si moov está detrás de mdat"""
+    types = [box[0] for box in boxes]
+    if b'moov' not in types or b'mdat' not in types:
+        return False
+    return types.index(b'moov') > types.index(b'mdat')
+
+
+def parse_boxes(data, offset=0, end=None):
+    """Árbol de cajas de un bloque en memoria: lista de [tipo, hijos o contenido]"""
+    end = len(data) if end is None else end
+    boxes = []
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error(f'Caja {box_type!r} corrupta')
+        start = offset + header_size
+        if box_type in CONTAINERS:
+            boxes.append([box_type, parse_boxes(data, start, offset + size)])
+        else:
+            boxes.append([box_type, data[start:offset + size]])
+        offset += size
+    return boxes
+
+
+def find_boxes(boxes, path):
+    """Cajas que siguen la ruta de tipos dada, p. ej. (b'trak', b'mdia', b'mdhd')"""
+    found = []
+    for box in boxes:
+        box_type, content = box[0], box[1]
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            found.append(content)
+        elif isinstance(content, list):
+            found.extend(find_boxes(content, path[1:]))
+    return found
+
+
+def read_metadata(read_at, file_size):
+    """Duración, resolución y códecs leyendo solo las cabeceras y la caja moov"""
+    boxes = top_level_boxes(read_at, file_size)
+    moov_box = next((box for box in boxes if box[0] == b'moov'), None)
+    if moov_box is None:
+        raise MP4Error('El archivo no tiene caja moov')
+    _, moov_offset, moov_size = moov_box
+    if moov_size > MAX_MOOV_SIZE:
+        raise MP4Error('La caja moov es demasiado grande')
+    _, _, header_size = read_box_header(read_at, moov_offset, file_size)
+    moov = parse_boxes(read_at(moov_offset + header_size, moov_size - header_size))
+
+    metadata = {'duration': None, 'width': None, 'height': None,
+                'video_codec': None, 'audio_codec': None}
+
+    for mvhd in find_boxes(moov, (b'mvhd',)):
+        if mvhd[0] == 1:
+            timescale, duration = struct.unpack_from('>IQ', mvhd, 20)
+        else:
+            timescale, duration = struct.unpack_from('>II', mvhd, 12)
+        if timescale:
+            metadata['duration'] = round(duration / timescale, 3)
+
+    for trak in find_boxes(moov, (b'trak',)):
+        handler = next(iter(find_boxes(trak, (b'mdia', b'hdlr'))), b'')[8:12]
+        stsd = next(iter(find_boxes(trak, (b'mdia', b'minf', b'stbl', b'stsd'))), b'')
+        # Primera entrada de stsd: tamaño (4) + tipo (4) = el código del códec
+        codec = stsd[12:16].decode('latin-1').strip() if len(stsd) >= 16 else None
+
+        if handler == b'vide' and metadata['video_codec'] is None:
+            metadata['video_codec'] = codec
+            tkhd = next(iter(find_boxes(trak, (b'tkhd',))), b'')
+            if len(tkhd) >= 8:
+                # Ancho y alto en punto fijo 16.16 al final de tkhd
+                width, height = struct.unpack_from('>II', tkhd, len(tkhd) - 8)
+                metadata['width'], metadata['height'] = width >> 16, height >> 16
+            if not metadata['width'] and len(stsd) >= 44:
+                metadata['width'], metadata['height'] = struct.unpack_from('>HH', stsd, 40)
+        elif handler == b'soun' and metadata['audio_codec'] is None:
+            metadata['audio_codec'] = codec
+
+    return metadata
+
+
+def serialize_boxes(boxes):
+    parts = []
+    for box in boxes:
+        box_type, content = box[0], box[1]
+        payload = serialize_boxes(content) if isinstance(content, list) else content
+        parts.append(_box_header(box_type, len(payload)) + payload)
+    return b''.join(parts)
+
+
+def faststart(src_path, dst_path):
+    """Escribe en dst_path una copia de src_path con moov al principio
+
+    Devuelve False (sin escribir nada) si el archivo ya tenía moov delante.
+    """
+    with open(src_path, 'rb') as src:
+        file_size = os.fstat(src.fileno()).st_size
+        read_at = file_reader(src)
+        boxes = top_level_boxes(read_at, file_size)
+        if not needs_faststart(boxes):
+            return False
+
+        _, moov_offset, moov_size = next(box for box in boxes if box[0] == b'moov')
+        if moov_size > MAX_MOOV_SIZE:
+            raise MP4Error('La caja moov es demasiado grande')
+        _, _, header_size = read_box_header(read_at, moov_offset, file_size)
+        moov = [b'moov', parse_boxes(read_at(moov_offset + header_size, moov_size - header_size))]
+        if any(box_type == b'moof' for box_type, _, _ in boxes):
+            raise MP4Error('Los MP4 fragmentados no necesitan faststart')
+
+        # moov va justo después de ftyp (o al principio si no hay ftyp)
+        rest = [box for box in boxes if box[0] != b'moov']
+        insert_at = 1 if rest and rest[0][0] == b'ftyp' else 0
+
+        # Al cambiar stco por co64 moov crece, así que se recalcula hasta que cuadre
+        new_moov = serialize_boxes([moov])
+        while True:
+            shifts = _layout(rest, insert_at, len(new_moov))
+            if not _patch_chunk_offsets(moov[1], shifts):
+                break
+            new_moov = serialize_boxes([moov])
+        new_moov = serialize_boxes([moov])
+
+        tmp_path = f'{dst_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as dst:
+                for position, (box_type, offset, size) in enumerate(rest):
+                    if position == insert_at:
+                        dst.write(new_moov)
+                    _copy_range(src, dst, offset, size)
+                if insert_at == len(rest):
+                    dst.write(new_moov)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return True
+
+
+def _layout(rest, insert_at, moov_size):
+    """(inicio original, fin original, desplazamiento) de cada caja en el archivo nuevo"""
+    shifts = []
+    position = 0
+    for index, (box_type, offset, size) in enumerate(rest):
+        if index == insert_at:
+            position += moov_size
+        shifts.append((offset, offset + size, position - offset))
+        position += size
+    return shifts
+
+
+def _patch_chunk_offsets(moov_children, shifts):
+    """Corrige stco/co64 con los desplazamientos nuevos
+
+    Devuelve True si hubo que convertir algún stco en co64 (y por tanto
+    moov cambió de tamaño y hay que volver a calcular).
+    """
+    grew = False
+    for stbl in find_boxes(moov_children, (b'trak', b'mdia', b'minf', b'stbl')):
+        for box in stbl:
+            if box[0] not in (b'stco', b'co64'):
+                continue
+            if len(box) == 2:
+                # Se guarda el contenido original para poder recalcular
+                box.append((box[0], box[1]))
+            original_type, original_payload = box[2]
+
+            count = struct.unpack_from('>I', original_payload, 4)[0]
+            width = 'I' if original_type == b'stco' else 'Q'
+            offsets = [_shift(offset, shifts)
+                       for offset in struct.unpack_from(f'>{count}{width}', original_payload, 8)]
+
+            if box[0] == b'stco' and offsets and max(offsets) > 0xFFFFFFFF:
+                box[0] = b'co64'
+                grew = True
+            width = 'I' if box[0] == b'stco' else 'Q'
+            box[1] = original_payload[:8] + struct.pack(f'>{count}{width}', *offsets)
+    return grew
+
+
+def _shift(offset, shifts):
+    for start, end, delta in shifts:
+        if start <= offset < end:
+            return offset + delta
+    raise MP4Error(f'Offset de chunk fuera de las cajas del archivo: {offset}')
+
+
+def _box_header(box_type, payload_size):
+    if payload_size + 8 <= 0xFFFFFFFF:
+        return struct.pack('>I4s', payload_size + 8, box_type)
+    return struct.pack('>I4sQ', 1, box_type, payload_size + 16)
+
+
+def _copy_range(src, dst, offset, size):
+    src.seek(offset)
+    remaining = size
+    while remaining > 0:
+        chunk = src.read(min(COPY_SIZE, remaining))
+        if not chunk:
+            raise MP4Error('El archivo terminó antes de lo esperado')
+        dst.write(chunk)
+        remaining -= len(chunk)
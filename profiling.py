@@ -0,0 +1,134 @@
+"""Perfiles de peticiones concretas, para encontrar dónde se va el tiempo.
+
+Una petición se perfila con cProfile (archivo .pstats, para pstats o
+snakeviz) o con un muestreador que cada pocos milisegundos anota la pila
+del hilo de la petición (archivo .collapsed, una línea por pila con su
+número de muestras, el formato de entrada de flamegraph.pl y speedscope).
+Cada perfil se guarda junto a un .json con la ruta, el endpoint y la
+duración; el directorio solo conserva los más recientes.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+MODES = ('sampling', 'cprofile')
+
+# Extensión del archivo de perfil según el modo
+EXTENSIONS = {'sampling': '.collapsed', 'cprofile': '.pstats'}
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo desde otro hilo, sin instrumentar el código"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        """Empieza a muestrear el hilo que llama"""
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='vc7day-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+class CProfiler:
+    """cProfile con la misma interfaz que StackSampler"""
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def dump(self, path):
+        self._profile.dump_stats(path)
+
+
+class ProfileStore:
+    def __init__(self, directory, keep=200):
+        self.directory = os.path.abspath(directory)
+        self.keep = keep
+        os.makedirs(self.directory, exist_ok=True)
+
+    def profiler(self, mode):
+        if mode not in MODES:
+            raise ValueError(f'Modo de perfilado desconocido: {mode}')
+        return StackSampler() if mode == 'sampling' else CProfiler()
+
+    def save(self, profiler, mode, info):
+        """Guarda el perfil y sus datos (ruta, endpoint, duración...); devuelve su nombre"""
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}{EXTENSIONS[mode]}"
+        profiler.dump(os.path.join(self.directory, name))
+        info = {**info, 'name': name, 'mode': mode, 'created_at': time.time()}
+        with open(os.path.join(self.directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False)
+        self._rotate()
+        return name
+
+    def list(self):
+        """Datos de los perfiles guardados, los más lentos primero"""
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path, encoding='utf-8') as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        profiles.sort(key=lambda info: info.get('duration_ms', 0), reverse=True)
+        return profiles
+
+    def path(self, name):
+        """Ruta de un perfil guardado, o None si el nombre no es válido"""
+        if os.path.basename(name) != name or not name.endswith(tuple(EXTENSIONS.values())):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def _rotate(self):
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith('.json')),
+                         key=lambda e: e.stat().st_mtime)
+        for entry in entries[:max(len(entries) - self.keep, 0)]:
+            for path in (entry.path, entry.path[:-len('.json')]):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def collapse(frame):
+    """Pila de un frame en formato 'exterior;...;interior', con archivo y línea de cada función"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                     .replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
@@ -0,0 +1,69 @@
+"""Registro de peticiones lentas en un archivo JSON lines.
+
+La petición solo deja el registro en una cola en memoria; un hilo aparte
+lo convierte a JSON y lo escribe en el archivo, así que escribir el
+registro no alarga precisamente las peticiones que ya van lentas. Tras un
+fork, el proceso hijo arranca su propio hilo escritor.
+
+Todos los workers escriben en el mismo archivo, abierto en modo append: cada
+línea se escribe de una vez al final, sin mezclarse con las de otro proceso. El archivo no rota solo: si cada
+proceso lo rotase por tamaño (RotatingFileHandler), varios lo renombrarían
+a la vez y se perderían registros. Se rota desde fuera, con logrotate sin
+copytruncate; WatchedFileHandler ve que el archivo se movió y abre uno
+nuevo en la siguiente escritura.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Una línea JSON por registro con los datos de la petición"""
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'), **getattr(record, 'request_info', {})}
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SlowRequestLog:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._logger = logging.getLogger(f'{__name__}.{id(self)}')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def log(self, info):
+        """Encola los datos de una petición lenta (dict serializable a JSON)"""
+        if self._pid != os.getpid():
+            self._start()
+        self._logger.info('slow request', extra={'request_info': info})
+
+    def stop(self):
+        """Escribe lo pendiente y para el hilo escritor"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            handler = logging.handlers.WatchedFileHandler(self.path, encoding='utf-8')
+            handler.setFormatter(JsonLinesFormatter())
+            records = queue.SimpleQueue()
+            # El listener heredado de otro proceso no tiene hilo: se sustituye sin pararlo
+            for old in list(self._logger.handlers):
+                self._logger.removeHandler(old)
+            self._logger.addHandler(logging.handlers.QueueHandler(records))
+            self._listener = logging.handlers.QueueListener(records, handler)
+            self._listener.start()
+            self._pid = os.getpid()
@@ -0,0 +1,882 @@
+"""Capa de almacenamiento del catálogo (data.json).
+
+El catálogo es un objeto JSON con una lista por tipo de entidad
+(categories, playlists, videos) y los ajustes (settings). Además de
+cargarlo y guardarlo entero, aquí se puede recorrer el archivo entidad por
+entidad sin tenerlo completo en memoria, lo que usan la exportación y la
+importación de catálogos grandes.
+
+Las escrituras son atómicas: se escribe un archivo temporal y se renombra
+encima del anterior, así que un lector nunca ve un archivo a medio
+escribir y quien lo tenga abierto sigue leyendo la versión anterior.
+
+CatalogStore mantiene en memoria la última versión del catálogo junto con
+índices por id e índices inversos (qué playlists contienen un video, qué
+videos lo tienen como relacionado, qué videos y playlists usa cada
+categoría). Los cambios se hacen dentro de write(), que bloquea el archivo
+entre procesos, actualiza los índices con cada cambio y guarda al salir.
+
+Un Catalog publicado no se modifica nunca: write() trabaja sobre una copia
+(Catalog.copy) que comparte los registros y los conjuntos de los índices
+con la versión anterior, y los cambios sustituyen esos objetos en lugar de
+modificarlos. La copia se publica solo después de guardar, así que las
+peticiones que están leyendo la versión anterior no ven cambios a medias,
+ni siquiera si la escritura falla.
+
+Cada write() anota además en data.json.journal los registros que cambió.
+Cuando otro proceso ve que data.json cambió, aplica esas entradas sobre una
+copia de su versión en memoria en lugar de volver a leer el archivo entero;
+solo recarga todo si le falta alguna entrada (por ejemplo, tras una
+importación).
+
+Con un contador de generación compartido (invalidation.Generations), cada
+lectura compara ese contador en memoria en lugar de hacer un os.stat() del
+archivo: quien escribe con write() o locked() lo incrementa, y solo
+entonces los demás procesos miran el archivo. Para no perderse los cambios
+hechos por fuera de la aplicación, el archivo se sigue comprobando cada
+stat_interval segundos.
+"""
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+
+READ_SIZE = 64 * 1024
+
+# Orden de las secciones al escribir un catálogo
+SECTIONS = ('categories', 'playlists', 'videos')
+
+# Columnas por las que se pueden ordenar los listados de administración
+SORT_KEYS = {
+    'videos': {
+        'created_at': lambda v: v.get('created_at') or '',
+        'title': lambda v: (v.get('title') or '').casefold(),
+        'views': lambda v: v.get('views', 0),
+        'likes': lambda v: v.get('likes', 0),
+    },
+    'playlists': {
+        'created_at': lambda p: p.get('created_at') or '',
+        'name': lambda p: (p.get('name') or '').casefold(),
+        'videos': lambda p: len(p.get('videos', [])),
+    },
+}
+TEXT_FIELDS = {'videos': ('title', 'description'), 'playlists': ('name', 'description')}
+
+# Búsquedas de texto recientes que se guardan por cada versión del catálogo
+TEXT_CACHE_SIZE = 32
+
+# Tamaño a partir del cual el diario de cambios se vacía (los lectores muy
+# atrasados recargan el catálogo completo)
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+
+
+def load_catalog(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_catalog(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class CatalogError(Exception):
+    """El cambio pedido dejaría el catálogo con referencias rotas"""
+
+
+class Catalog:
+    """El catálogo en memoria con índices por id e índices inversos
+
+    Las búsquedas y las eliminaciones en cascada cuestan lo que el número
+    de referencias afectadas, no lo que el tamaño del catálogo. Fuera de
+    CatalogStore.write() se debe tratar como de solo lectura.
+    """
+
+    def __init__(self, data, timer=None):
+        self.data = data
+        self._timer = timer or _no_timer
+        for section in SECTIONS:
+            data.setdefault(section, [])
+        data.setdefault('settings', {})
+        self.categories = {c['id']: c for c in data['categories']}
+        self.playlists = {p['id']: p for p in data['playlists']}
+        self.videos = {v['id']: v for v in data['videos']}
+        # Índices inversos: id referenciado -> ids de quien lo referencia
+        self._category_videos = {}
+        self._category_playlists = {}
+        self._playlist_videos = {}
+        self._video_playlists = {}
+        self._video_referrers = {}
+        # Órdenes y búsquedas de texto, calculados al pedirlos y descartados al cambiar
+        self._orders = {}
+        self._text_matches = {}
+        self._cache_lock = threading.Lock()
+        # Ids cambiados por sección durante un CatalogStore.write()
+        self._changes = None
+        # En una copia, (índice, clave) de los conjuntos que ya son propios; None si lo son todos
+        self._copied = None
+        for playlist in data['playlists']:
+            self._link_playlist(playlist)
+        for video in data['videos']:
+            self._link_video(video)
+
+    @property
+    def settings(self):
+        return self.data['settings']
+
+    def copy(self):
+        """Copia para modificar sin afectar a quien esté leyendo esta versión
+
+        Cuesta lo que copiar las listas y los diccionarios por id (sin los
+        registros): los conjuntos de los índices se copian al modificarlos.
+        """
+        catalog = object.__new__(Catalog)
+        catalog.data = {**self.data, **{section: list(self.data[section]) for section in SECTIONS},
+                        'settings': dict(self.settings)}
+        catalog._timer = self._timer
+        catalog.categories = dict(self.categories)
+        catalog.playlists = dict(self.playlists)
+        catalog.videos = dict(self.videos)
+        catalog._category_videos = dict(self._category_videos)
+        catalog._category_playlists = dict(self._category_playlists)
+        catalog._playlist_videos = dict(self._playlist_videos)
+        catalog._video_playlists = dict(self._video_playlists)
+        catalog._video_referrers = dict(self._video_referrers)
+        with self._cache_lock:
+            catalog._orders = dict(self._orders)
+            catalog._text_matches = dict(self._text_matches)
+        catalog._cache_lock = threading.Lock()
+        catalog._changes = None
+        catalog._copied = set()
+        return catalog
+
+    # Consultas
+
+    def videos_in_category(self, category_id):
+        return self._records(self.videos, self._category_videos.get(category_id))
+
+    def playlists_in_category(self, category_id):
+        return self._records(self.playlists, self._category_playlists.get(category_id))
+
+    def videos_with_playlist(self, playlist_id):
+        """Videos cuyo playlist_id es esta playlist"""
+        return self._records(self.videos, self._playlist_videos.get(playlist_id))
+
+    def playlists_containing(self, video_id):
+        """Playlists que incluyen el video en su lista de videos"""
+        return self._records(self.playlists, self._video_playlists.get(video_id))
+
+    def videos_referencing(self, video_id):
+        """Videos que tienen este video entre sus relacionados"""
+        return self._records(self.videos, self._video_referrers.get(video_id))
+
+    def playlist_videos(self, playlist):
+        """Videos de una playlist en su orden, omitiendo los que ya no existen"""
+        return [self.videos[video_id] for video_id in playlist.get('videos', [])
+                if video_id in self.videos]
+
+    def next_id(self, section):
+        records = getattr(self, section)
+        return max(records, default=0) + 1
+
+    def query(self, section, sort, descending=False, category_id=None, playlist_id=None,
+              text='', offset=0, limit=50):
+        """(total, página) de videos o playlists filtrados y ordenados
+
+        Sin filtros la página sale directamente del orden precalculado; con
+        filtros se ordenan solo los ids que los cumplen, obtenidos de los
+        índices inversos.
+        """
+        order, rank = self._order(section, sort)
+        ids = None
+        if category_id is not None:
+            index = self._category_videos if section == 'videos' else self._category_playlists
+            ids = index.get(category_id, set())
+        if playlist_id is not None and section == 'videos':
+            ids = _intersect(ids, self._playlist_videos.get(playlist_id, set()))
+        if text:
+            ids = _intersect(ids, self._matching(section, text))
+
+        if ids is None:
+            total = len(order)
+            if descending:
+                start = total - offset
+                page = order[max(start - limit, 0):max(start, 0)][::-1]
+            else:
+                page = order[offset:offset + limit]
+        else:
+            total = len(ids)
+            page = sorted(ids, key=rank.__getitem__, reverse=descending)[offset:offset + limit]
+        records = getattr(self, section)
+        return total, [records[record_id] for record_id in page]
+
+    def increment(self, video_id, field):
+        """Suma uno a views o likes"""
+        video = self.videos.get(video_id)
+        if video is None:
+            return None
+        video = self._replace('videos', video_id, {**video, field: video.get(field, 0) + 1})
+        self._orders.pop(('videos', field), None)
+        self._changed('videos', video_id)
+        return video
+
+    # Cambios (solo dentro de CatalogStore.write())
+
+    def add_category(self, category):
+        self.data['categories'].append(category)
+        self.categories[category['id']] = category
+        self._changed('categories', category['id'])
+        return category
+
+    def delete_category(self, category_id):
+        category = self.categories.get(category_id)
+        if category is None:
+            return None
+        if self._category_videos.get(category_id):
+            raise CatalogError('No se puede eliminar la categoría porque tiene videos asociados')
+        if self._category_playlists.get(category_id):
+            raise CatalogError('No se puede eliminar la categoría porque tiene playlists asociadas')
+        self.data['categories'].remove(category)
+        del self.categories[category_id]
+        self._changed('categories', category_id)
+        return category
+
+    def add_playlist(self, playlist):
+        self.data['playlists'].append(playlist)
+        self.playlists[playlist['id']] = playlist
+        self._link_playlist(playlist)
+        self._changed('playlists', playlist['id'])
+        return playlist
+
+    def update_playlist(self, playlist_id, **fields):
+        playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            return None
+        self._unlink_playlist(playlist)
+        playlist = self._replace('playlists', playlist_id, {**playlist, **fields})
+        self._link_playlist(playlist)
+        self._changed('playlists', playlist_id)
+        return playlist
+
+    def delete_playlist(self, playlist_id):
+        """Elimina la playlist y quita la referencia de los videos que apuntaban a ella"""
+        playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            return None
+        for video in self.videos_with_playlist(playlist_id):
+            self.update_video(video['id'], playlist_id=None)
+        self._unlink_playlist(playlist)
+        self.data['playlists'].remove(playlist)
+        del self.playlists[playlist_id]
+        self._changed('playlists', playlist_id)
+        return playlist
+
+    def add_video(self, video):
+        self.data['videos'].append(video)
+        self.videos[video['id']] = video
+        self._link_video(video)
+        self._changed('videos', video['id'])
+        return video
+
+    def update_video(self, video_id, **fields):
+        video = self.videos.get(video_id)
+        if video is None:
+            return None
+        self._unlink_video(video)
+        video = self._replace('videos', video_id, {**video, **fields})
+        self._link_video(video)
+        self._changed('videos', video_id)
+        return video
+
+    def delete_video(self, video_id):
+        """Elimina el video y su id de las playlists y de los relacionados de otros videos"""
+        video = self.videos.get(video_id)
+        if video is None:
+            return None
+        for playlist in self.playlists_containing(video_id):
+            self.update_playlist(playlist['id'],
+                                 videos=[v for v in playlist['videos'] if v != video_id])
+        for referrer in self.videos_referencing(video_id):
+            self.update_video(referrer['id'],
+                              related_videos=[v for v in referrer['related_videos'] if v != video_id])
+        self._unlink_video(video)
+        self.data['videos'].remove(video)
+        del self.videos[video_id]
+        self._changed('videos', video_id)
+        return video
+
+    def apply_changes(self, changes, settings):
+        """Aplica una entrada del diario: {sección: {id: registro, o None si se borró}}
+
+        Como los demás cambios, solo sobre una copia (ver CatalogStore._catch_up).
+        """
+        self.data['settings'] = settings
+        for section, records in changes.items():
+            by_id = getattr(self, section)
+            link, unlink = self._linkers(section)
+            for record_id, record in records.items():
+                record_id = int(record_id)
+                current = by_id.get(record_id)
+                if current is not None:
+                    unlink(current)
+                    if record is None:
+                        self.data[section].remove(current)
+                        del by_id[record_id]
+                        continue
+                    # El registro anterior puede seguir en uso por quien lee la versión anterior
+                    current = self._replace(section, record_id, record)
+                elif record is not None:
+                    current = by_id[record_id] = record
+                    self.data[section].append(record)
+                else:
+                    continue
+                link(current)
+            self._invalidate(section)
+
+    def _replace(self, section, record_id, record):
+        """Pone record en lugar del registro actual con ese id, sin modificar el anterior"""
+        by_id = getattr(self, section)
+        records = self.data[section]
+        records[records.index(by_id[record_id])] = record
+        by_id[record_id] = record
+        return record
+
+    def _changed(self, section, record_id):
+        if self._changes is not None:
+            self._changes.setdefault(section, set()).add(record_id)
+
+    def _linkers(self, section):
+        if section == 'videos':
+            return self._link_video, self._unlink_video
+        if section == 'playlists':
+            return self._link_playlist, self._unlink_playlist
+        return _no_link, _no_link
+
+    def _link_playlist(self, playlist):
+        self._invalidate('playlists')
+        self._index_add(self._category_playlists, playlist.get('category_id'), playlist['id'])
+        for video_id in playlist.get('videos', []):
+            self._index_add(self._video_playlists, video_id, playlist['id'])
+
+    def _unlink_playlist(self, playlist):
+        self._invalidate('playlists')
+        self._index_remove(self._category_playlists, playlist.get('category_id'), playlist['id'])
+        for video_id in playlist.get('videos', []):
+            self._index_remove(self._video_playlists, video_id, playlist['id'])
+
+    def _link_video(self, video):
+        self._invalidate('videos')
+        self._index_add(self._category_videos, video.get('category_id'), video['id'])
+        self._index_add(self._playlist_videos, video.get('playlist_id'), video['id'])
+        for related_id in video.get('related_videos', []):
+            self._index_add(self._video_referrers, related_id, video['id'])
+
+    def _unlink_video(self, video):
+        self._invalidate('videos')
+        self._index_remove(self._category_videos, video.get('category_id'), video['id'])
+        self._index_remove(self._playlist_videos, video.get('playlist_id'), video['id'])
+        for related_id in video.get('related_videos', []):
+            self._index_remove(self._video_referrers, related_id, video['id'])
+
+    def _order(self, section, sort):
+        """Ids ordenados de menor a mayor por sort y la posición de cada id"""
+        cached = self._orders.get((section, sort))
+        if cached is None:
+            key = SORT_KEYS[section][sort]
+            records = getattr(self, section)
+            with self._timer('index-build'):
+                order = sorted(records, key=lambda record_id: (key(records[record_id]), record_id))
+                cached = self._orders[(section, sort)] = (order, {record_id: position
+                                                                  for position, record_id in enumerate(order)})
+        return cached
+
+    def _matching(self, section, text):
+        text = text.casefold()
+        matches = self._text_matches.get((section, text))
+        if matches is None:
+            fields = TEXT_FIELDS[section]
+            matches = {record['id'] for record in self.data[section]
+                       if any(text in (record.get(field) or '').casefold() for field in fields)}
+            # Varias peticiones pueden estar llenando la caché de la misma versión
+            with self._cache_lock:
+                if len(self._text_matches) >= TEXT_CACHE_SIZE:
+                    self._text_matches.pop(next(iter(self._text_matches), None), None)
+                self._text_matches[(section, text)] = matches
+        return matches
+
+    def _invalidate(self, section):
+        if self._orders:
+            for key in [key for key in self._orders if key[0] == section]:
+                del self._orders[key]
+        if self._text_matches:
+            for key in [key for key in self._text_matches if key[0] == section]:
+                del self._text_matches[key]
+
+    def _index_add(self, index, key, record_id):
+        if key is not None:
+            self._own(index, key).add(record_id)
+
+    def _index_remove(self, index, key, record_id):
+        if key in index:
+            ids = self._own(index, key)
+            ids.discard(record_id)
+            if not ids:
+                del index[key]
+
+    def _own(self, index, key):
+        """El conjunto index[key] listo para modificar: en una copia, la primera vez se copia"""
+        ids = index.get(key)
+        if ids is None:
+            ids = index[key] = set()
+        elif self._copied is not None and (id(index), key) not in self._copied:
+            ids = index[key] = set(ids)
+        if self._copied is not None:
+            self._copied.add((id(index), key))
+        return ids
+
+    @staticmethod
+    def _records(by_id, ids):
+        return [by_id[record_id] for record_id in sorted(ids or ()) if record_id in by_id]
+
+
+def _no_link(record):
+    pass
+
+
+def _intersect(ids, other):
+    return other if ids is None else ids & other
+
+
+class CatalogStore:
+    """Caché del catálogo en memoria, recargada solo cuando data.json cambia"""
+
+    def __init__(self, path, timer=None, generations=None, stat_interval=1.0):
+        """timer(fase) devuelve un context manager que mide la carga, los índices y el guardado
+
+        Sin generations se hace un os.stat() de data.json en cada lectura.
+        """
+        self.path = path
+        self.journal_path = f'{path}.journal'
+        self._timer = timer or _no_timer
+        self._generations = generations
+        self.stat_interval = stat_interval
+        self._lock = threading.RLock()
+        self._catalog = None
+        self._stamp = None
+        self._generation = None
+        self._next_stat = 0
+
+    def read(self):
+        """El Catalog actual (compartido: no se debe modificar)"""
+        catalog = self._catalog
+        if catalog is not None:
+            if self._generations is None:
+                if self._file_stamp() == self._stamp:
+                    return catalog
+            elif (self._generations.get('catalog') == self._generation
+                  and time.monotonic() < self._next_stat):
+                return catalog
+        with self._lock:
+            # La generación se lee antes que el archivo: un cambio posterior se verá en la próxima lectura
+            generation = self._generations.get('catalog') if self._generations else None
+            if self._catalog is None:
+                self._reload()
+            elif self._file_stamp() != self._stamp and not self._catch_up():
+                self._reload()
+            self._generation = generation
+            self._next_stat = time.monotonic() + self.stat_interval
+            return self._catalog
+
+    def cached(self):
+        """El Catalog en memoria tal como esté, sin comprobar el archivo (o None)"""
+        return self._catalog
+
+    @contextmanager
+    def locked(self):
+        """Bloqueo exclusivo del catálogo, entre hilos y entre procesos"""
+        with self._lock, open(f'{self.path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                # Quien tiene el bloqueo puede haber cambiado data.json: los demás procesos lo comprobarán
+                if self._generations is not None:
+                    self._generations.bump('catalog')
+
+    @contextmanager
+    def write(self):
+        """Transacción: devuelve una copia del Catalog para modificarla y la guarda al salir
+
+        La copia sustituye a la versión actual solo cuando se guardó; si hay
+        una excepción no se guarda nada y las lecturas siguen con la versión
+        anterior, que nunca tuvo cambios a medias.
+        """
+        with self.locked():
+            # Antes de escribir se comprueba siempre el archivo, aunque no haya pasado stat_interval
+            self._next_stat = 0
+            catalog = self.read().copy()
+            before = self._stamp
+            catalog._changes = {}
+            try:
+                yield catalog
+                with self._timer('storage-save'):
+                    save_catalog(self.path, catalog.data)
+            finally:
+                changes, catalog._changes = catalog._changes, None
+            # Primero el catálogo: una lectura que vea el sello anterior pasa por el bloqueo
+            self._catalog = catalog
+            self._stamp = self._file_stamp()
+            self._append_journal(before, catalog, changes)
+
+    def _reload(self):
+        stamp = self._file_stamp()
+        with self._timer('storage-load'):
+            try:
+                data = load_catalog(self.path)
+            except FileNotFoundError:
+                data = {}
+        with self._timer('index-build'):
+            self._catalog = Catalog(data, self._timer)
+        self._stamp = stamp
+
+    def _append_journal(self, before, catalog, changes):
+        entry = {
+            'before': before,
+            'after': self._stamp,
+            'settings': catalog.settings,
+            'changes': {section: {record_id: getattr(catalog, section).get(record_id) for record_id in ids}
+                        for section, ids in changes.items()},
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            if os.path.getsize(self.journal_path) > JOURNAL_MAX_BYTES:
+                # Se empieza un diario nuevo; quien necesite entradas anteriores recargará todo
+                tmp_path = f'{self.journal_path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(line)
+                os.replace(tmp_path, self.journal_path)
+                return
+        except FileNotFoundError:
+            pass
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def _catch_up(self):
+        """Aplica las entradas del diario que faltan; False si hay que recargar todo"""
+        # Desde el final hacia atrás hasta la entrada que parte de la versión en memoria
+        stamp = list(self._stamp) if self._stamp else None
+        pending = []
+        try:
+            for line in _lines_backwards(self.journal_path):
+                entry = json.loads(line)
+                pending.append(entry)
+                if entry['before'] == stamp:
+                    break
+            else:
+                return False
+        except (FileNotFoundError, ValueError):
+            return False
+        pending.reverse()
+        for previous, entry in zip(pending, pending[1:]):
+            if entry['before'] != previous['after']:
+                return False
+        # Si data.json cambió después de la última entrada, no hay con qué ponerse al día
+        current = self._file_stamp()
+        if current is None or list(current) != pending[-1]['after']:
+            return False
+        try:
+            with self._timer('storage-load'):
+                catalog = self._catalog.copy()
+                for entry in pending:
+                    catalog.apply_changes(entry['changes'], entry['settings'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self._catalog = catalog
+        self._stamp = current
+        return True
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _no_timer(phase):
+    return nullcontext()
+
+
+def _lines_backwards(path, read_size=READ_SIZE):
+    """Líneas completas de un archivo desde la última, leyendo por bloques desde el final
+
+    Un último fragmento sin salto de línea (una escritura a medias) se omite.
+    """
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        carry = b''
+        skip_tail = True
+        while position > 0:
+            size = min(read_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + carry).split(b'\n')
+            # La primera parte puede seguir en el bloque anterior
+            carry = lines.pop(0)
+            if skip_tail and lines:
+                lines.pop()
+                skip_tail = False
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if carry and not skip_tail:
+            yield carry
+
+
+class JsonStreamReader:
+    """Lee un objeto JSON de primer nivel valor a valor
+
+    Los valores que son listas no se cargan enteros: se devuelven elemento
+    a elemento. Solo hace falta memoria para el elemento más grande.
+    """
+
+    def __init__(self, f, read_size=READ_SIZE):
+        self._file = f
+        self._read_size = read_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def events(self):
+        """Genera ('value', clave, valor), ('item', clave, elemento) y ('end', clave)
+
+        ('item', ...) se genera por cada elemento de una lista y ('end', ...)
+        cuando la lista termina; el resto de valores llegan como ('value', ...).
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise ValueError('Se esperaba una clave de texto')
+            self._expect(':')
+            if self._peek() == '[':
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield 'item', key, self._decode()
+                        if self._next_separator(']') == ']':
+                            break
+                yield 'end', key
+            else:
+                yield 'value', key, self._decode()
+            if self._next_separator('}') == '}':
+                return
+
+    def _decode(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # Un número cortado por el búfer (p. ej. "45" de "4500.0") podría
+            # seguir en la próxima lectura
+            if not self._eof and (end == len(self._buffer) or (
+                    isinstance(value, (int, float)) and self._buffer[end] in '.eE+-0123456789')):
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _next_separator(self, closing):
+        char = self._peek()
+        self._pos += 1
+        if char not in (',', closing):
+            raise ValueError(f"Se esperaba ',' o '{closing}' y llegó {char!r}")
+        return char
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f'Se esperaba {char!r}')
+        self._pos += 1
+
+    def _peek(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ValueError('El JSON termina antes de tiempo')
+        return self._buffer[self._pos]
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer) or self._eof:
+                return
+            self._fill()
+
+    def _fill(self):
+        # Se descarta lo ya leído para que el búfer no crezca con el archivo
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        chunk = self._file.read(self._read_size)
+        if not chunk:
+            self._eof = True
+        self._buffer += chunk
+
+
+def iter_catalog(path):
+    """Recorre data.json entidad por entidad: genera (sección, registro)
+
+    Los ajustes llegan como un único registro ('settings', {...}).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for event in JsonStreamReader(f).events():
+            if event[0] != 'end':
+                yield event[1], event[2]
+
+
+def read_value(path, key, default=None):
+    """Valor de una clave de primer nivel que no sea una lista (p. ej. settings)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for event in JsonStreamReader(f).events():
+            if event[0] == 'value' and event[1] == key:
+                return event[2]
+    return default
+
+
+class CatalogWriter:
+    """Escribe un catálogo nuevo por lotes y lo publica entero con commit()
+
+    Los registros se acumulan en memoria y cada batch_size se vuelcan a un
+    archivo temporal por sección. commit() une las secciones en un data.json
+    nuevo y lo renombra encima del actual; si algo falla antes, el catálogo
+    actual no se toca.
+    """
+
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.counts = {}
+        self._folder = tempfile.mkdtemp(prefix='.catalog-', dir=os.path.dirname(os.path.abspath(path)))
+        self._pending = {}
+        self._pending_count = 0
+        self._values = {}
+        self._spools = {}
+
+    def add(self, section, record):
+        self._pending.setdefault(section, []).append(_dumps(record))
+        self.counts[section] = self.counts.get(section, 0) + 1
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def set_value(self, key, value):
+        self._values[key] = value
+
+    def flush(self):
+        for section, lines in self._pending.items():
+            with open(self._spool_path(section), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        self._pending = {}
+        self._pending_count = 0
+
+    def commit(self):
+        self.flush()
+        sections = list(SECTIONS) + sorted(set(self.counts) - set(SECTIONS))
+        tmp_path = os.path.join(self._folder, 'data.json')
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write('{')
+            for position, section in enumerate(sections):
+                out.write(f'{"," if position else ""}\n{_dumps(section)}: [')
+                if self.counts.get(section):
+                    with open(self._spool_path(section), 'r', encoding='utf-8') as spool:
+                        for index, line in enumerate(spool):
+                            out.write(f'{"," if index else ""}\n{line.rstrip()}')
+                out.write(']')
+            for key, value in self._values.items():
+                out.write(f',\n{_dumps(key)}: {_dumps(value)}')
+            out.write('\n}\n')
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.path)
+        self.abort()
+
+    def abort(self):
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Sin commit() los lotes escritos se descartan
+        self.abort()
+
+    def _spool_path(self, section):
+        # El nombre de la sección no se usa como nombre de archivo
+        index = self._spools.setdefault(section, len(self._spools))
+        return os.path.join(self._folder, f'{index}.ndjson')
+
+
+def export_json(path):
+    """Genera el catálogo como un único documento JSON, en trozos"""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield '{'
+        first_key = True
+        first_item = True
+        for event in JsonStreamReader(f).events():
+            kind, key = event[0], event[1]
+            if kind == 'value':
+                yield f'{"" if first_key else ","}\n{_dumps(key)}: {_dumps(event[2])}'
+                first_key = False
+            elif kind == 'item':
+                if first_item:
+                    yield f'{"" if first_key else ","}\n{_dumps(key)}: [\n'
+                    first_key = False
+                else:
+                    yield ',\n'
+                first_item = False
+                yield _dumps(event[2])
+            else:
+                # Fin de una lista; si estaba vacía aún no se escribió su clave
+                if first_item:
+                    yield f'{"" if first_key else ","}\n{_dumps(key)}: ['
+                    first_key = False
+                yield ']'
+                first_item = True
+        yield '\n}\n'
+
+
+def export_ndjson(path):
+    """Genera el catálogo como NDJSON: una línea {"section": ..., "record": ...} por entidad"""
+    for section, record in iter_catalog(path):
+        yield _dumps({'section': section, 'record': record}) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime al vuelo los trozos de texto en formato gzip"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
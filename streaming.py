@@ -0,0 +1,554 @@
+"""Proxy de video hacia los servidores de origen con soporte de rangos HTTP.
+
+Sin caché, los rangos que pide el navegador (Range / If-Range) se reenvían
+tal cual al origen y el cuerpo se copia bloque a bloque, sin cargar el
+archivo en memoria. Con un BlockCache, el archivo se divide en bloques
+alineados de tamaño fijo que se guardan en disco, y cada rango se arma a
+partir de esos bloques: el origen solo recibe las lecturas en frío. Cada
+host de origen tiene un límite de conexiones simultáneas.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import mp4
+from upstream import create_session
+
+# Cabeceras de la respuesta del origen que se reenvían al cliente
+RELAYED_HEADERS = (
+    'Content-Type', 'Content-Length', 'Content-Range', 'Content-Encoding',
+    'Accept-Ranges', 'ETag', 'Last-Modified', 'Cache-Control',
+)
+
+
+class UpstreamError(Exception):
+    """El servidor de origen no respondió o respondió con un error"""
+
+
+class UpstreamBusy(UpstreamError):
+    """Se alcanzó el límite de conexiones hacia el servidor de origen"""
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido queda fuera del archivo"""
+
+
+def parse_range(header, size):
+    """Convierte una cabecera Range en (inicio, fin) inclusivos
+
+    Devuelve None si no hay cabecera o si no se puede atender como un único
+    rango (en ese caso se responde el archivo completo, como permite HTTP).
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header)
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class UpstreamBody:
+    """Iterable WSGI que copia el cuerpo del origen y libera la conexión al cerrarse"""
+
+    def __init__(self, response, chunk_size, release):
+        self._response = response
+        self._chunk_size = chunk_size
+        self._release = release
+
+    def __iter__(self):
+        try:
+            # Sin decodificar: el Content-Encoding del origen se reenvía tal cual
+            for chunk in self._response.raw.stream(self._chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self._release is not None:
+            self._response.close()
+            self._release()
+            self._release = None
+
+
+class _Pending:
+    """Descarga de un bloque en curso a la que esperan otras peticiones"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+# Segundos entre recuentos del disco de la caché de bloques (escrita por todos los workers)
+BLOCK_SCAN_INTERVAL = 1.0
+
+
+class BlockCache:
+    """Bloques alineados de los archivos de origen guardados en disco con expulsión LRU
+
+    El directorio lo comparten todos los workers: un bloque que descargó
+    otro se usa en lugar de volver a pedirlo, cada uso actualiza la fecha de
+    modificación del archivo (el orden LRU que ven todos) y, tras guardar un
+    bloque, el tamaño total se vuelve a contar en disco cuando la cuenta
+    propia pasa del máximo o han pasado BLOCK_SCAN_INTERVAL segundos, así
+    que el máximo vale para el conjunto de procesos.
+    """
+
+    def __init__(self, cache_dir, block_size=1024 * 1024, max_bytes=2 * 1024 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # ruta -> tamaño, del menos al más usado
+        self._total_bytes = 0
+        self._next_scan = 0
+        self._pending = {}
+        with self._lock:
+            self._evict()
+
+    def get(self, key, index, fetch):
+        """Ruta del bloque en disco, llamando a fetch() para descargarlo si falta
+
+        Si varias peticiones piden a la vez el mismo bloque, solo la primera
+        lo descarga y las demás esperan su resultado.
+        """
+        path = self._block_path(key, index)
+        with self._lock:
+            size = self._lru.pop(path, None)
+            try:
+                os.utime(path)
+                if size is None:
+                    # Lo descargó otro worker
+                    size = os.stat(path).st_size
+                    self._total_bytes += size
+                self._lru[path] = size
+                return path
+            except FileNotFoundError:
+                if size is not None:
+                    # Otro worker lo expulsó
+                    self._total_bytes -= size
+
+            pending = self._pending.get(path)
+            owner = pending is None
+            if owner:
+                pending = self._pending[path] = _Pending()
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return path
+
+        try:
+            content = fetch()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._lru[path] = len(content)
+                self._total_bytes += len(content)
+                self._evict()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[path]
+            pending.done.set()
+        return path
+
+    def drop(self, key):
+        """Borra todos los bloques de un archivo (por ejemplo, si cambió en el origen)"""
+        folder = os.path.join(self.cache_dir, key)
+        with self._lock:
+            try:
+                paths = [e.path for e in os.scandir(folder) if e.name.endswith('.blk')]
+            except FileNotFoundError:
+                paths = []
+            for path in paths:
+                size = self._lru.pop(path, None)
+                if size is not None:
+                    self._total_bytes -= size
+                _remove(path)
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes and time.monotonic() < self._next_scan:
+            return
+        self._scan()
+        while self._total_bytes > self.max_bytes and self._lru:
+            path, size = self._lru.popitem(last=False)
+            self._total_bytes -= size
+            _remove(path)
+
+    def _block_path(self, key, index):
+        return os.path.join(self.cache_dir, key, f'{index}.blk')
+
+    def _scan(self):
+        """Rehace el orden LRU y el total a partir de los bloques en disco de todos los workers"""
+        entries = []
+        for folder in os.scandir(self.cache_dir):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith('.blk'):
+                        try:
+                            entries.append((entry.stat().st_mtime_ns, entry.path, entry.stat().st_size))
+                        except FileNotFoundError:
+                            pass
+        entries.sort()
+        self._lru = OrderedDict((path, size) for _, path, size in entries)
+        self._total_bytes = sum(self._lru.values())
+        self._next_scan = time.monotonic() + BLOCK_SCAN_INTERVAL
+
+
+class _FileInfo:
+    """Tamaño y validadores de un archivo de origen"""
+
+    def __init__(self, size, headers):
+        self.size = size
+        self.content_type = headers.get('Content-Type', 'application/octet-stream')
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.checked_at = time.monotonic()
+
+    def same_version(self, headers):
+        if self.etag and headers.get('ETag'):
+            return self.etag == headers['ETag']
+        if self.last_modified and headers.get('Last-Modified'):
+            return self.last_modified == headers['Last-Modified']
+        return True
+
+    def matches(self, validator):
+        return validator in (self.etag, self.last_modified)
+
+
+class CachedBody:
+    """Iterable WSGI que arma un rango a partir de los bloques en caché"""
+
+    def __init__(self, proxy, url, info, start, end):
+        self._proxy = proxy
+        self._url = url
+        self._info = info
+        self._start = start
+        self._end = end
+
+    def __iter__(self):
+        proxy = self._proxy
+        block_size = proxy.block_cache.block_size
+        chunk_size = proxy.chunk_size
+        position = self._start
+        while position <= self._end:
+            index = position // block_size
+            path = proxy._cached_block(self._url, self._info, index)
+            remaining = min(self._end + 1, (index + 1) * block_size) - position
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                # Expulsado entre la consulta y la lectura: se vuelve a pedir
+                f = open(proxy._cached_block(self._url, self._info, index), 'rb')
+            with f:
+                f.seek(position - index * block_size)
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        raise UpstreamError(f'Bloque incompleto en la caché: {path}')
+                    remaining -= len(chunk)
+                    position += len(chunk)
+                    yield chunk
+
+    def close(self):
+        pass
+
+
+class StreamProxy:
+    def __init__(self, session=None, chunk_size=64 * 1024, max_connections_per_host=8,
+                 timeout=(5, 30), acquire_timeout=10, block_cache=None, revalidate_after=60):
+        self.block_cache = block_cache
+        self.revalidate_after = revalidate_after
+        self._files = {}
+        self._files_lock = threading.Lock()
+        self.chunk_size = chunk_size
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.session = session or create_session(pool_maxsize=max_connections_per_host)
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+
+    def open(self, url, range_header=None, if_range=None, method='GET'):
+        """Abre la petición al origen y devuelve (status, cabeceras, cuerpo)
+
+        Sin caché, el cuerpo es un iterable que mantiene ocupada una conexión
+        del host hasta que se consume o se cierra.
+        """
+        if self.block_cache is not None:
+            info = self.file_info(url)
+            if info is not None:
+                return self._open_cached(url, info, range_header, if_range, method)
+        return self._open_upstream(url, range_header, if_range, method)
+
+    def _open_cached(self, url, info, range_header, if_range, method):
+        headers = {
+            'Content-Type': info.content_type,
+            'Accept-Ranges': 'bytes',
+        }
+        if info.etag:
+            headers['ETag'] = info.etag
+        if info.last_modified:
+            headers['Last-Modified'] = info.last_modified
+
+        byte_range = None
+        if not if_range or info.matches(if_range):
+            try:
+                byte_range = parse_range(range_header, info.size)
+            except RangeNotSatisfiable:
+                headers['Content-Range'] = f'bytes */{info.size}'
+                return 416, headers, []
+
+        if byte_range is None:
+            status, (start, end) = 200, (0, info.size - 1)
+        else:
+            status, (start, end) = 206, byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+        headers['Content-Length'] = str(end - start + 1)
+
+        if method == 'HEAD' or info.size == 0:
+            return status, headers, []
+        return status, headers, CachedBody(self, url, info, start, end)
+
+    def file_info(self, url):
+        """Tamaño y validadores del archivo, o None si el origen no admite rangos"""
+        with self._files_lock:
+            info = self._files.get(url)
+        if info is None or time.monotonic() - info.checked_at >= self.revalidate_after:
+            # Una petición de un solo byte devuelve el tamaño total y los validadores
+            status, headers, body = self._open_upstream(url, 'bytes=0-0')
+            body.close()
+            size = None
+            if status == 206:
+                match = re.fullmatch(r'bytes \d+-\d+/(\d+)', headers.get('Content-Range', ''))
+                if match:
+                    size = int(match.group(1))
+
+            changed = info is not None and (info.size != size or not info.same_version(headers))
+            if changed and self.block_cache is not None:
+                self.block_cache.drop(_url_key(url))
+            info = _FileInfo(size, headers)
+            with self._files_lock:
+                self._files[url] = info
+        return info if info.size is not None else None
+
+    def _cached_block(self, url, info, index):
+        block_size = self.block_cache.block_size
+        start = index * block_size
+        end = min(start + block_size, info.size) - 1
+
+        def fetch():
+            status, headers, body = self._open_upstream(url, f'bytes={start}-{end}')
+            try:
+                if status != 206 or not headers.get('Content-Range', '').startswith(f'bytes {start}-{end}/'):
+                    raise UpstreamError(f'El origen no devolvió el rango {start}-{end}')
+                if not info.same_version(headers):
+                    # El archivo cambió: se descarta lo guardado y se vuelve a comprobar
+                    with self._files_lock:
+                        self._files.pop(url, None)
+                    self.block_cache.drop(_url_key(url))
+                    raise UpstreamError('El archivo cambió en el origen')
+                content = b''.join(body)
+            finally:
+                body.close()
+            if len(content) != end - start + 1:
+                raise UpstreamError(f'Bloque incompleto desde el origen: {len(content)} bytes')
+            return content
+
+        return self.block_cache.get(_url_key(url), index, fetch)
+
+    def _open_upstream(self, url, range_header=None, if_range=None, method='GET'):
+        headers = {}
+        if range_header:
+            headers['Range'] = range_header
+            if if_range:
+                headers['If-Range'] = if_range
+
+        slot = self._slot(url)
+        if not slot.acquire(timeout=self.acquire_timeout):
+            raise UpstreamBusy(f'Demasiadas conexiones abiertas hacia {urlsplit(url).netloc}')
+
+        try:
+            response = self.session.request(method, url, headers=headers, stream=True,
+                                            timeout=self.timeout, allow_redirects=True)
+        except OSError as e:
+            slot.release()
+            raise UpstreamError(f'No se pudo conectar con el origen: {e}')
+
+        if response.status_code not in (200, 206, 304, 416):
+            response.close()
+            slot.release()
+            raise UpstreamError(f'El origen respondió {response.status_code}')
+
+        relayed = {name: response.headers[name] for name in RELAYED_HEADERS if name in response.headers}
+        return response.status_code, relayed, UpstreamBody(response, self.chunk_size, slot.release)
+
+    def _slot(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._slots_lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return slot
+
+
+# Segundos hasta volver a mirar un video que otro proceso está descargando
+FASTSTART_BUSY_RETRY = 30
+
+
+class FaststartCache:
+    """Copias locales, con moov al principio, de los videos de origen que lo tienen al final
+
+    La comprobación (unas pocas lecturas por rangos de las cabeceras de las
+    cajas) y la descarga con reescritura se hacen en segundo plano; mientras
+    tanto el video se sigue sirviendo a través del proxy.
+
+    Los workers comparten cache_dir: antes de descargar se toma sin esperar
+    el flock de <clave>.mp4.lock, así que cada video se descarga una sola
+    vez; los demás procesos vuelven a mirar pasados FASTSTART_BUSY_RETRY
+    segundos y entonces encuentran la copia. Si el origen falla, no se
+    reintenta hasta pasados retry_after segundos.
+    """
+
+    # Estado de cada video en _states: (estado, ruta de la copia o momento del reintento)
+    CHECKING = 'checking'
+    NOT_NEEDED = 'not-needed'
+    READY = 'ready'
+    RETRY = 'retry'
+
+    def __init__(self, cache_dir, proxy, max_bytes=20 * 1024 * 1024 * 1024, retry_after=600):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.proxy = proxy
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, url, schedule):
+        """Ruta de la copia local si existe; si el archivo no se ha comprobado, pide comprobarlo
+
+        schedule(fn, *args) ejecuta la comprobación en segundo plano.
+        """
+        info = self.proxy.file_info(url)
+        if info is None:
+            return None
+        key = _url_key(f'{url}|{info.size}|{info.etag}|{info.last_modified}')
+        path = os.path.join(self.cache_dir, f'{key}.mp4')
+        with self._lock:
+            state, value = self._states.get(key, (None, None))
+            if state in (self.CHECKING, self.NOT_NEEDED):
+                return None
+            if state == self.RETRY and time.monotonic() < value:
+                return None
+            # Listo aquí o en otro worker; si otro worker la expulsó, se comprueba de nuevo
+            if os.path.exists(path):
+                self._states[key] = (self.READY, path)
+                return path
+            # Marcada como en curso para no programarla dos veces
+            self._states[key] = (self.CHECKING, None)
+        schedule(self._check, url, info, key)
+        return None
+
+    def _check(self, url, info, key):
+        def read_at(offset, n):
+            end = min(offset + n, info.size) - 1
+            if end < offset:
+                return b''
+            status, headers, body = self.proxy._open_upstream(url, f'bytes={offset}-{end}')
+            try:
+                if status != 206:
+                    raise UpstreamError(f'El origen no devolvió el rango {offset}-{end}')
+                return b''.join(body)
+            finally:
+                body.close()
+
+        path = os.path.join(self.cache_dir, f'{key}.mp4')
+        download_path = f'{path}.{os.getpid()}.download'
+        try:
+            if not mp4.needs_faststart(mp4.top_level_boxes(read_at, info.size)):
+                self._set_state(key, self.NOT_NEEDED)
+                return
+            with open(f'{path}.lock', 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self._set_state(key, self.RETRY, time.monotonic() + FASTSTART_BUSY_RETRY)
+                    return
+                if not os.path.exists(path):
+                    status, headers, body = self.proxy._open_upstream(url)
+                    try:
+                        with open(download_path, 'wb') as f:
+                            for chunk in body:
+                                f.write(chunk)
+                    finally:
+                        body.close()
+                    mp4.faststart(download_path, path)
+            self._set_state(key, self.READY, path)
+            self._evict()
+        except mp4.MP4Error:
+            # No se puede reescribir (no es MP4, está fragmentado...): se sirve siempre desde el origen
+            self._set_state(key, self.NOT_NEEDED)
+        except (UpstreamError, OSError):
+            # Se queda sin copia por ahora: el video se sigue sirviendo desde el origen
+            self._set_state(key, self.RETRY, time.monotonic() + self.retry_after)
+        finally:
+            _remove(download_path)
+
+    def _set_state(self, key, state, value=None):
+        with self._lock:
+            self._states[key] = (state, value)
+
+    def _evict(self):
+        """Borra las copias más antiguas si se supera el tamaño máximo"""
+        entries = sorted((e for e in os.scandir(self.cache_dir) if e.name.endswith('.mp4')),
+                         key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            _remove(entry.path)
+            _remove(f'{entry.path}.lock')
+            with self._lock:
+                self._states = {k: v for k, v in self._states.items() if v != (self.READY, entry.path)}
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
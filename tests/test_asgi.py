@@ -0,0 +1,134 @@
+"""Adaptador ASGI: cuerpos en streaming más allá de lo que se lee de antemano y desconexiones"""
+import asyncio
+import itertools
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def asgi(tmp_path_factory):
+    # Importar asgi importa app.py, que crea sus carpetas en el directorio actual
+    cwd = os.getcwd()
+    os.environ['VC7DAY_PRELOAD'] = '1'
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        import asgi
+    finally:
+        os.chdir(cwd)
+        del os.environ['VC7DAY_PRELOAD']
+    return asgi
+
+
+class Body:
+    """Cuerpo WSGI que anota cuántos bloques se pidieron y si se cerró"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.served = 0
+        self.closed = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.served += 1
+            yield chunk
+
+    def close(self):
+        self.closed += 1
+
+
+def scope(method='GET', path='/video', headers=()):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+            'headers': list(headers), 'http_version': '1.1', 'scheme': 'http'}
+
+
+def call(adapter, scope, messages, on_send=None):
+    """Ejecuta la aplicación; receive devuelve messages y luego espera a que on_send añada más"""
+    sent = []
+
+    async def run():
+        incoming = asyncio.Queue()
+        for message in messages:
+            incoming.put_nowait(message)
+
+        async def send(message):
+            sent.append(message)
+            if on_send is not None:
+                on_send(message, incoming)
+
+        await asyncio.wait_for(adapter(scope, incoming.get, send), 10)
+
+    try:
+        asyncio.run(run())
+    finally:
+        adapter.executor.shutdown(wait=True)
+    return sent
+
+
+def test_streams_body_past_prefetch_in_order(asgi):
+    chunks = [bytes([n]) * 16 * 1024 for n in range(20)]
+    assert sum(map(len, chunks)) > asgi.PREFETCH_BYTES
+    body = Body(chunks)
+
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'video/mp4')])
+        return body
+
+    sent = call(asgi.AsgiAdapter(wsgi_app, threads=2), scope(), [{'type': 'http.request', 'body': b''}])
+
+    assert sent[0]['type'] == 'http.response.start'
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'video/mp4') in [(k.lower(), v) for k, v in sent[0]['headers']]
+    bodies = sent[1:]
+    assert all(m['type'] == 'http.response.body' for m in bodies)
+    assert b''.join(m['body'] for m in bodies) == b''.join(chunks)
+    assert [m['more_body'] for m in bodies] == [True] * (len(bodies) - 1) + [False]
+    assert body.closed == 1
+
+
+def test_disconnect_stops_stream_and_closes_body(asgi):
+    # Un cuerpo sin fin, como el proxy de un video largo
+    body = Body(itertools.repeat(b'x' * 16 * 1024))
+
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'video/mp4')])
+        return body
+
+    def disconnect_after_prefetch(message, incoming):
+        # El cliente se va tras recibir unos cuantos bloques más de los leídos de antemano
+        if message['type'] == 'http.response.body' and body.served == 10:
+            incoming.put_nowait({'type': 'http.disconnect'})
+
+    sent = call(asgi.AsgiAdapter(wsgi_app, threads=2), scope(),
+                [{'type': 'http.request', 'body': b''}], disconnect_after_prefetch)
+
+    assert body.closed == 1
+    assert body.served < 20
+    assert all(m['more_body'] for m in sent[1:])
+
+
+def test_request_body_in_several_messages(asgi):
+    def wsgi_app(environ, start_response):
+        data = environ['wsgi.input'].read()
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [str(len(data)).encode(), b' ', data[:3], data[-3:]]
+
+    messages = [{'type': 'http.request', 'body': b'abc' * 1000, 'more_body': True},
+                {'type': 'http.request', 'body': b'', 'more_body': True},
+                {'type': 'http.request', 'body': b'xyz', 'more_body': False}]
+    sent = call(asgi.AsgiAdapter(wsgi_app, threads=2),
+                scope('POST', '/upload', [(b'content-length', b'3003')]), messages)
+
+    assert sent[0]['status'] == 200
+    assert b''.join(m['body'] for m in sent[1:]) == b'3003 abcxyz'
+    assert sent[-1]['more_body'] is False
+
+
+def test_wsgi_error_returns_500(asgi):
+    def wsgi_app(environ, start_response):
+        raise RuntimeError('fallo')
+
+    sent = call(asgi.AsgiAdapter(wsgi_app, threads=2), scope(), [{'type': 'http.request', 'body': b''}])
+
+    assert sent[0]['status'] == 500
+    assert sent[-1]['more_body'] is False
@@ -0,0 +1,169 @@
+"""Importación de catálogos registro a registro e ingesta de videos en bloque"""
+import gzip
+import io
+import json
+from contextlib import nullcontext
+
+import pytest
+
+from catalog_import import CatalogImportError, import_catalog, ingest_videos, open_upload
+
+SETTINGS = {'related_videos_count': 20, 'auto_related': True, 'default_related_strategy': 'category'}
+
+
+def category(id, **fields):
+    return {'id': id, 'name': f'Categoría {id}', **fields}
+
+
+def playlist(id, category_id, **fields):
+    return {'id': id, 'name': f'Playlist {id}', 'category_id': category_id, 'videos': [], **fields}
+
+
+def video(id, category_id, playlist_id=None, **fields):
+    return {'id': id, 'title': f'Video {id}', 'video_url': f'https://example.com/{id}.mp4',
+            'category_id': category_id, 'playlist_id': playlist_id, 'related_videos': [], **fields}
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps({'categories': [category(1)], 'playlists': [], 'settings': SETTINGS,
+                                'videos': [video(1, 1)]}), encoding='utf-8')
+    return str(path)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def upload(catalog, compress=False):
+    data = json.dumps(catalog).encode('utf-8')
+    return io.BytesIO(gzip.compress(data) if compress else data)
+
+
+def test_invalid_records_are_rejected_one_by_one(data_path):
+    report = import_catalog(upload({
+        'categories': [category(1), category(2), {'id': 'x', 'name': ''}, category(2)],
+        'playlists': [playlist(10, 1, videos=[100, 999]), playlist(11, 3)],
+        'videos': [video(100, 1, 10, related_videos=[101, 500]), video(101, 2),
+                   video(102, 3), video(103, 1, 11), video(104, 1, views=-1), 'no es un objeto'],
+    }), data_path).to_dict()
+
+    assert report['accepted'] == {'categories': 2, 'playlists': 1, 'videos': 2}
+    rejected = {(r['section'], r['position']): r for r in report['rejected']}
+    assert set(rejected) == {('categories', 2), ('categories', 3), ('playlists', 1),
+                             ('videos', 2), ('videos', 3), ('videos', 4), ('videos', 5)}
+    assert rejected[('categories', 3)]['errors'] == ['Id duplicado: 2']
+    assert rejected[('playlists', 1)]['errors'] == ['La categoría 3 no existe']
+    # Un video cuya playlist se rechazó también se rechaza
+    assert rejected[('videos', 3)]['errors'] == ['La playlist 11 no existe']
+    assert report['rejected_count'] == 7
+    # Las listas que apuntan a registros inexistentes se limpian con un aviso
+    assert report['warning_count'] == 2
+
+    catalog = load(data_path)
+    assert [c['id'] for c in catalog['categories']] == [1, 2]
+    assert catalog['playlists'][0]['videos'] == [100]
+    assert [(v['id'], v['related_videos']) for v in catalog['videos']] == [(100, [101]), (101, [])]
+    # El archivo no traía ajustes: se conservan los actuales
+    assert catalog['settings'] == SETTINGS
+
+
+def test_catalog_is_untouched_when_nothing_is_valid(data_path):
+    before = load(data_path)
+    with pytest.raises(CatalogImportError) as raised:
+        import_catalog(upload({'videos': [video(5, 99)]}), data_path)
+    assert raised.value.report.rejected_count == 1
+    with pytest.raises(CatalogImportError):
+        import_catalog(io.BytesIO(b'{"videos": [1, 2'), data_path)
+    with pytest.raises(CatalogImportError):
+        import_catalog(upload({'other': []}), data_path)
+    assert load(data_path) == before
+
+
+def test_gzip_and_ndjson_uploads(data_path):
+    report = import_catalog(upload({'categories': [category(7)], 'videos': [video(70, 7)],
+                                    'settings': {**SETTINGS, 'related_videos_count': 5}},
+                                   compress=True), data_path)
+    assert report.accepted == {'categories': 1, 'playlists': 0, 'videos': 1}
+    assert load(data_path)['settings']['related_videos_count'] == 5
+
+    lines = [{'section': 'categories', 'record': category(8)}, 'no es una entrada',
+             {'section': 'videos', 'record': video(80, 8)}]
+    source = io.BytesIO(gzip.compress('\n'.join(map(json.dumps, lines)).encode('utf-8') + b'\n{roto\n'))
+    report = import_catalog(source, data_path, ndjson=True)
+    assert report.accepted == {'categories': 1, 'playlists': 0, 'videos': 1}
+    assert [r['position'] for r in report.rejected] == [2, 4]
+
+
+def test_open_upload_sniffs_gzip():
+    assert open_upload(io.BytesIO(gzip.compress(b'{"a": 1}'))).read() == b'{"a": 1}'
+    plain = io.BytesIO(b'{"a": 1}')
+    assert open_upload(plain) is plain
+    assert plain.read() == b'{"a": 1}'
+    # Menos de dos bytes: no es gzip y se lee entero
+    assert open_upload(io.BytesIO(b'x')).read() == b'x'
+
+
+def csv_upload(*rows):
+    lines = ['title,description,video_url,thumbnail,category,playlist'] + [','.join(row) for row in rows]
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def test_ingest_assigns_ids_after_existing_videos(data_path):
+    catalog = load(data_path)
+    catalog['playlists'] = [playlist(4, 1, name='Favoritos', videos=[1])]
+    catalog['videos'].append(video(9, 1))
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f)
+
+    report = ingest_videos(csv_upload(
+        ('Uno', '', 'https://example.com/a.mp4', '', 'categoría 1', ''),
+        ('Dos', 'texto', 'https://example.com/b.mp4', '', '1', 'favoritos'),
+        ('Sin categoría', '', 'https://example.com/c.mp4', '', 'Otra', ''),
+        ('Sin url', '', '', '', '1', ''),
+    ), data_path)
+
+    assert report.accepted['videos'] == 2
+    assert [r['position'] for r in report.rejected] == [4, 5]
+    catalog = load(data_path)
+    assert [v['id'] for v in catalog['videos']] == [1, 9, 10, 11]
+    assert catalog['videos'][3]['playlist_id'] == 4
+    assert catalog['playlists'][0]['videos'] == [1, 11]
+
+
+def test_ingest_rechecks_ids_taken_while_reading(data_path):
+    def lock():
+        # Otro administrador añade un video y borra la categoría 2 mientras se leían las filas
+        catalog = load(data_path)
+        catalog['videos'].append(video(2, 1))
+        catalog['categories'] = [category(1)]
+        with open(data_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        return nullcontext()
+
+    catalog = load(data_path)
+    catalog['categories'].append(category(2))
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f)
+
+    report = ingest_videos(csv_upload(('Nuevo', '', 'https://example.com/n.mp4', '', '1', ''),
+                                      ('Huérfano', '', 'https://example.com/h.mp4', '', '2', '')),
+                           data_path, lock=lock)
+    assert report.accepted['videos'] == 1
+    assert report.rejected[0]['errors'] == ['Categoría no encontrada: 2']
+    assert [(v['id'], v['title']) for v in load(data_path)['videos']] == \
+        [(1, 'Video 1'), (2, 'Video 2'), (3, 'Nuevo')]
+
+
+def test_strict_ingest_adds_nothing_on_errors(data_path):
+    before = load(data_path)
+    rows = '\n'.join(json.dumps(row) for row in (
+        {'title': 'Bien', 'video_url': 'https://example.com/a.mp4', 'category_id': 1},
+        {'title': 'Mal', 'video_url': 'https://example.com/b.mp4', 'category_id': 1, 'playlist': 'no existe'},
+    ))
+    with pytest.raises(CatalogImportError) as raised:
+        ingest_videos(io.BytesIO(rows.encode('utf-8')), data_path, fmt='ndjson', strict=True)
+    assert raised.value.report.rejected[0]['errors'] == ['Playlist no encontrada: no existe']
+    assert load(data_path) == before
@@ -0,0 +1,129 @@
+"""Cola de trabajos: reclamación, reintentos, recuperación, cancelación y unicidad"""
+import threading
+import time
+
+import pytest
+
+from jobs import (CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobCancelled, JobError,
+                  JobQueue)
+from link_health import LinkHealthChecker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / 'jobs.db', retry_delay=0, stale_after=60)
+
+
+def test_jobs_run_in_order_once(queue):
+    ran = []
+    queue.register('echo', lambda job, value: ran.append(value) or {'value': value})
+    first = queue.enqueue('echo', {'value': 1})
+    queue.enqueue('echo', {'value': 2}, delay=60)
+    queue.enqueue('echo', {'value': 3})
+
+    assert queue.run_next() and queue.run_next()
+    assert not queue.run_next()
+    assert ran == [1, 3]
+    job = queue.get(first)
+    assert (job['status'], job['result'], job['progress'], job['attempts']) == (SUCCEEDED, {'value': 1}, 1, 1)
+    with pytest.raises(ValueError):
+        queue.enqueue('desconocido')
+
+
+def test_transient_errors_are_retried(queue):
+    attempts = []
+
+    @queue.register('flaky', max_attempts=3)
+    def flaky(job):
+        attempts.append(job.attempt)
+        raise OSError('sin conexión')
+
+    @queue.register('final')
+    def final(job):
+        raise JobError('archivo no válido', result={'rejected': 1})
+
+    flaky_id = queue.enqueue('flaky')
+    final_id = queue.enqueue('final')
+    while queue.run_next():
+        pass
+    assert attempts == [1, 2, 3]
+    job = queue.get(flaky_id)
+    assert (job['status'], job['attempts'], job['error']) == (FAILED, 3, 'OSError: sin conexión')
+    job = queue.get(final_id)
+    assert (job['status'], job['attempts'], job['result']) == (FAILED, 1, {'rejected': 1})
+
+
+def test_stale_jobs_are_recovered(queue):
+    queue.register('noop', lambda job: None, max_attempts=2)
+    job_id = queue.enqueue('noop')
+    # Un worker lo reclama y desaparece sin terminarlo
+    assert queue._claim('caído')['id'] == job_id
+    assert queue._claim('otro') is None
+    with queue._connect() as db:
+        db.execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (time.time() - 120, job_id))
+    queue._recover_stale()
+    assert queue.get(job_id)['status'] == QUEUED
+
+    # Sin intentos restantes se da por fallido
+    assert queue._claim('caído')['attempts'] == 2
+    with queue._connect() as db:
+        db.execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (time.time() - 120, job_id))
+    queue._recover_stale()
+    assert queue.get(job_id)['status'] == FAILED
+
+
+def test_cancel_queued_and_running_jobs(queue):
+    started, release = threading.Event(), threading.Event()
+
+    @queue.register('long')
+    def long_job(job, n):
+        started.set()
+        release.wait(5)
+        job.progress(0.5)
+        return 'terminado'
+
+    queued_id = queue.enqueue('long', {'n': 1})
+    queue.cancel(queued_id)
+    assert queue.get(queued_id)['status'] == CANCELLED
+    assert not queue.run_next()
+
+    running_id = queue.enqueue('long', {'n': 2})
+    worker = threading.Thread(target=queue.run_next)
+    worker.start()
+    assert started.wait(5)
+    assert queue.cancel(running_id)['status'] == RUNNING
+    release.set()
+    worker.join(5)
+    assert queue.get(running_id)['status'] == CANCELLED
+
+
+def test_unique_enqueue_from_many_threads(queue):
+    queue.register('index', lambda job: None)
+    barrier = threading.Barrier(8)
+    ids = []
+
+    def enqueue():
+        barrier.wait()
+        ids.append(queue.enqueue('index', unique=True))
+
+    threads = [threading.Thread(target=enqueue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 1
+    # Una vez en marcha, se puede encolar otro
+    assert queue._claim('w')['id'] == ids[0]
+    assert queue.enqueue('index', unique=True) != ids[0]
+    assert queue.enqueue('index', {'other': 1}, unique=True) != ids[0]
+
+
+def test_link_check_passes_exclude_each_other(tmp_path):
+    checker = LinkHealthChecker(tmp_path / 'links.db', lambda url: None)
+    with checker.pass_lock():
+        # Una pasada periódica no espera: se la salta
+        assert checker.run_pass(['ftp://example.com/a']) == 0
+        with checker.pass_lock(wait=False) as acquired:
+            assert not acquired
+    assert checker.run_pass(['ftp://example.com/a']) == 1
+    assert checker.statuses()['ftp://example.com/a']['error'] == 'Archivo no encontrado'
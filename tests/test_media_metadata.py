@@ -0,0 +1,69 @@
+"""Metadatos de video leídos por rangos HTTP de un servidor local"""
+import struct
+from datetime import datetime
+
+import mp4
+from media_metadata import MetadataIndexer, needs_indexing, next_retry
+
+
+def make_mp4(duration=12.5, width=640, height=360, mdat_size=300 * 1024):
+    """MP4 mínimo con mdat delante de moov, como los que no tienen faststart"""
+    timescale = 1000
+    mvhd = struct.pack('>B3xIIII', 0, 0, 0, timescale, int(duration * timescale)) + bytes(80)
+    tkhd = bytes(76) + struct.pack('>II', width << 16, height << 16)
+    hdlr = bytes(8) + b'vide' + bytes(12)
+    stsd = struct.pack('>4xI', 1) + struct.pack('>I4s', 86, b'avc1') + bytes(78)
+    moov = [b'moov', [
+        [b'mvhd', mvhd],
+        [b'trak', [
+            [b'tkhd', tkhd],
+            [b'mdia', [[b'hdlr', hdlr], [b'minf', [[b'stbl', [[b'stsd', stsd]]]]]]],
+        ]],
+    ]]
+    return mp4.serialize_boxes([[b'ftyp', b'isom\x00\x00\x02\x00isom'], [b'mdat', bytes(mdat_size)], moov])
+
+
+def test_metadata_over_http_ranges(origin):
+    content = make_mp4()
+    origin.files['/video.mp4'] = content
+    indexer = MetadataIndexer(lambda url: None)
+
+    metadata = indexer.read(f'{origin.url}/video.mp4')
+
+    assert metadata['duration'] == 12.5
+    assert (metadata['width'], metadata['height']) == (640, 360)
+    assert metadata['video_codec'] == 'avc1'
+    # Solo cabeceras y moov: nunca el archivo entero
+    assert all(range_header for _, range_header in origin.requests)
+    assert len(origin.requests) <= 4
+
+
+def test_transient_errors_are_retried_and_invalid_files_are_not(origin):
+    origin.files['/video.mp4'] = make_mp4()
+    origin.files['/broken.mp4'] = bytes(100 * 1024)
+    origin.failing.add('/video.mp4')
+    videos = [{'id': 1, 'video_url': f'{origin.url}/video.mp4'},
+              {'id': 2, 'video_url': f'{origin.url}/broken.mp4'}]
+    indexer = MetadataIndexer(lambda url: None)
+
+    results = indexer.index(videos)
+    for video in videos:
+        video['media'] = results[video['id']]
+
+    assert 'error' in videos[0]['media'] and videos[0]['media']['attempts'] == 1
+    assert 'retry_after' not in videos[1]['media']
+    assert not needs_indexing(videos[1])
+    retry_at = next_retry(videos)
+    assert retry_at > datetime.now()
+    assert not needs_indexing(videos[0])
+    assert needs_indexing(videos[0], now=retry_at)
+
+    origin.failing.clear()
+    results = indexer.index(videos, force=True)
+    assert results[1]['duration'] == 12.5
+    assert 'error' not in results[1]
+
+    # Un fallo pasajero no sustituye los metadatos que ya se tenían de la misma URL
+    videos[0]['media'] = results[1]
+    origin.failing.add('/video.mp4')
+    assert 1 not in indexer.index(videos, force=True)
@@ -0,0 +1,85 @@
+"""Métricas: formato de exposición, suma entre procesos e hilos e histogramas acumulados"""
+import os
+import re
+import threading
+
+import pytest
+
+from metrics import Metrics
+
+SAMPLE_RE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)')
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse(text):
+    """{(nombre, etiquetas): valor} del texto de exposición, comprobando cada línea"""
+    samples, types = {}, {}
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        if line.startswith('# HELP '):
+            continue
+        name, labels, value = SAMPLE_RE.fullmatch(line).groups()
+        parsed = tuple(LABEL_RE.findall(labels or ''))
+        assert ','.join(f'{k}="{v}"' for k, v in parsed) == (labels or '')
+        samples[(name, parsed)] = float(value)
+    return samples, types
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    metrics = Metrics(tmp_path, buckets=(0.1, 1))
+    metrics.counter('requests_total', 'Peticiones')
+    metrics.histogram('duration_seconds', 'Duración')
+    return metrics
+
+
+def test_exposition_and_cumulative_buckets(metrics):
+    for value in (0.05, 0.05, 0.5, 3):
+        metrics.observe('duration_seconds', value, endpoint='index')
+    metrics.inc('requests_total', endpoint='index', status=200)
+    metrics.inc('requests_total', endpoint='ver "video"\n', status=404)
+
+    samples, types = parse(metrics.render())
+    assert types == {'vc7day_requests_total': 'counter', 'vc7day_duration_seconds': 'histogram'}
+    buckets = [samples[('vc7day_duration_seconds_bucket', (('endpoint', 'index'), ('le', le)))]
+               for le in ('0.1', '1.0', '+Inf')]
+    assert buckets == [2, 3, 4]
+    assert samples[('vc7day_duration_seconds_count', (('endpoint', 'index'),))] == 4
+    assert samples[('vc7day_duration_seconds_sum', (('endpoint', 'index'),))] == pytest.approx(3.6)
+    assert samples[('vc7day_requests_total', (('endpoint', 'ver \\"video\\"\\n'), ('status', '404')))] == 1
+
+
+def test_processes_and_threads_are_summed(metrics, tmp_path):
+    def work():
+        for _ in range(1000):
+            metrics.inc('requests_total', endpoint='index')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    pid = os.fork()
+    if pid == 0:
+        # Un worker distinto escribe su propio archivo
+        try:
+            work()
+            metrics.observe('duration_seconds', 0.5, endpoint='index')
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    samples, _ = parse(metrics.render())
+    assert samples[('vc7day_requests_total', (('endpoint', 'index'),))] == 5000
+    assert samples[('vc7day_duration_seconds_count', (('endpoint', 'index'),))] == 1
+    files = os.listdir(tmp_path)
+    assert {name.split('-')[0] for name in files} == {str(os.getpid()), str(pid)}
+    # Los hilos que terminaron dejan su archivo a los siguientes
+    assert len([name for name in files if name.startswith(f'{os.getpid()}-')]) <= 4
+    # Un Metrics nuevo (otro proceso leyendo) suma los mismos archivos
+    assert Metrics(tmp_path).collect() == metrics.collect()
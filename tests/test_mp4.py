@@ -0,0 +1,71 @@
+"""Reescritura faststart: moov delante y offsets de los chunks corregidos"""
+import os
+import struct
+
+import pytest
+
+import mp4
+
+FTYP = [b'ftyp', b'isom\x00\x00\x02\x00isom']
+
+
+def chunk_table(box_type, offsets):
+    width = 'I' if box_type == b'stco' else 'Q'
+    return [box_type, struct.pack(f'>4xI{len(offsets)}{width}', len(offsets), *offsets)]
+
+
+def moov_with(table):
+    return [b'moov', [[b'trak', [[b'mdia', [[b'minf', [[b'stbl', [table]]]]]]]]]]
+
+
+def chunk_offsets(path):
+    """Cajas de primer nivel de un archivo, tipo de la tabla de chunks y sus offsets"""
+    with open(path, 'rb') as f:
+        read_at = mp4.file_reader(f)
+        boxes = mp4.top_level_boxes(read_at, os.fstat(f.fileno()).st_size)
+        _, offset, size = next(box for box in boxes if box[0] == b'moov')
+        moov = mp4.parse_boxes(read_at(offset + 8, size - 8))
+    stbl = mp4.find_boxes(moov, (b'trak', b'mdia', b'minf', b'stbl'))[0]
+    box_type, payload = stbl[0]
+    count = struct.unpack_from('>I', payload, 4)[0]
+    width = 'I' if box_type == b'stco' else 'Q'
+    return boxes, box_type, list(struct.unpack_from(f'>{count}{width}', payload, 8))
+
+
+@pytest.mark.parametrize('table_type', [b'stco', b'co64'])
+def test_faststart_moves_moov_and_rewrites_offsets(tmp_path, table_type):
+    payload = os.urandom(20000)
+    # ftyp (24 bytes) + cabecera de mdat (8): los datos empiezan en 32
+    offsets = [32, 32 + 1000, 32 + 15000]
+    src = tmp_path / 'src.mp4'
+    src.write_bytes(mp4.serialize_boxes([FTYP, [b'mdat', payload], moov_with(chunk_table(table_type, offsets))]))
+    dst = tmp_path / 'dst.mp4'
+
+    assert mp4.faststart(str(src), str(dst))
+
+    boxes, new_type, new_offsets = chunk_offsets(dst)
+    assert [box[0] for box in boxes] == [b'ftyp', b'moov', b'mdat']
+    assert new_type == table_type
+    # mdat se desplaza exactamente lo que ocupa moov, y cada chunk apunta a los mismos datos
+    moov_size = boxes[1][2]
+    assert new_offsets == [offset + moov_size for offset in offsets]
+    original, rewritten = src.read_bytes(), dst.read_bytes()
+    assert len(rewritten) == len(original)
+    for old, new in zip(offsets, new_offsets):
+        assert rewritten[new:new + 100] == original[old:old + 100]
+
+
+def test_faststart_leaves_files_that_already_have_moov_first(tmp_path):
+    src = tmp_path / 'src.mp4'
+    src.write_bytes(mp4.serialize_boxes([FTYP, moov_with(chunk_table(b'stco', [100])), [b'mdat', bytes(100)]]))
+    dst = tmp_path / 'dst.mp4'
+    assert not mp4.faststart(str(src), str(dst))
+    assert not dst.exists()
+
+
+def test_faststart_rejects_offsets_outside_the_file(tmp_path):
+    src = tmp_path / 'src.mp4'
+    src.write_bytes(mp4.serialize_boxes([FTYP, [b'mdat', bytes(100)], moov_with(chunk_table(b'stco', [10 ** 6]))]))
+    with pytest.raises(mp4.MP4Error):
+        mp4.faststart(str(src), str(tmp_path / 'dst.mp4'))
+    assert os.listdir(tmp_path) == ['src.mp4']
@@ -0,0 +1,60 @@
+"""Registro de peticiones lentas: líneas JSON de varios procesos y rotación desde fuera"""
+import json
+import os
+import time
+
+from slow_log import SlowRequestLog
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_workers_append_whole_lines(tmp_path):
+    path = tmp_path / 'logs' / 'slow.jsonl'
+    log = SlowRequestLog(str(path))
+    log.log({'worker': 'parent', 'n': -1})
+    children = []
+    for worker in range(4):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for n in range(200):
+                    log.log({'worker': worker, 'n': n, 'path': '/video/' + 'x' * 300})
+                log.stop()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    for pid in children:
+        assert os.waitpid(pid, 0)[1] == 0
+    log.stop()
+
+    entries = read_lines(path)
+    assert len(entries) == 4 * 200 + 1
+    for worker in range(4):
+        assert [e['n'] for e in entries if e['worker'] == worker] == list(range(200))
+
+
+def wait_for_lines(path, count):
+    deadline = time.monotonic() + 5
+    while len(read_lines(path)) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_reopens_file_after_external_rotation(tmp_path):
+    path = tmp_path / 'slow.jsonl'
+    log = SlowRequestLog(str(path))
+    log.log({'path': '/antes'})
+    log.log({'path': '/antes-2'})
+    # El hilo escritor sigue con el archivo abierto cuando se rota
+    wait_for_lines(path, 2)
+    # Lo que haría logrotate sin copytruncate
+    rotated = tmp_path / 'slow.jsonl.1'
+    os.rename(path, rotated)
+    log.log({'path': '/despues'})
+    log.stop()
+
+    assert [e['path'] for e in read_lines(rotated)] == ['/antes', '/antes-2']
+    assert [e['path'] for e in read_lines(path)] == ['/despues']
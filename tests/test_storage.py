@@ -0,0 +1,190 @@
+"""CatalogStore: versiones inmutables para los lectores y escrituras transaccionales"""
+import json
+import sys
+import threading
+
+import pytest
+
+from storage import CatalogStore
+
+
+def make_catalog(videos=200):
+    return {
+        'categories': [{'id': 1, 'name': 'Uno'}, {'id': 2, 'name': 'Dos'}],
+        'playlists': [{'id': 1, 'name': 'Lista', 'category_id': 1, 'videos': list(range(1, 11))}],
+        'settings': {'related_videos_count': 6},
+        'videos': [{'id': i, 'title': f'Video {i}', 'video_url': f'https://example.com/{i}.mp4',
+                    'category_id': 1 + i % 2, 'playlist_id': 1 if i <= 10 else None,
+                    'related_videos': [i + 1] if i < videos else [], 'views': 0, 'likes': 0,
+                    'created_at': f'2025-01-01T00:00:{i % 60:02d}'}
+                   for i in range(1, videos + 1)],
+    }
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(make_catalog()), encoding='utf-8')
+    return str(path)
+
+
+def test_readers_keep_their_version(data_path):
+    store = CatalogStore(data_path)
+    before = store.read()
+    video = before.videos[5]
+    with store.write() as catalog:
+        catalog.update_video(5, title='Cambiado', category_id=1, related_videos=[])
+        catalog.increment(6, 'views')
+        catalog.delete_video(7)
+        catalog.settings['related_videos_count'] = 3
+
+    assert video['title'] == 'Video 5'
+    assert before.videos[6]['views'] == 0
+    assert 7 in before.videos and 7 in before.playlists[1]['videos']
+    assert 5 in {v['id'] for v in before.videos_in_category(2)}
+    assert [v['id'] for v in before.videos_referencing(6)] == [5]
+    assert before.settings['related_videos_count'] == 6
+
+    after = store.read()
+    assert after.videos[5]['title'] == 'Cambiado'
+    assert after.videos_referencing(6) == []
+    assert 5 in {v['id'] for v in after.videos_in_category(1)}
+    assert 5 not in {v['id'] for v in after.videos_in_category(2)}
+    assert 7 not in after.videos and 7 not in after.playlists[1]['videos']
+    assert after.data['videos'].count(after.videos[5]) == 1
+    assert after.settings['related_videos_count'] == 3
+
+
+def test_failed_write_leaves_the_current_version(data_path):
+    store = CatalogStore(data_path)
+    before = store.read()
+    with open(data_path, 'rb') as f:
+        saved = f.read()
+
+    with pytest.raises(RuntimeError):
+        with store.write() as catalog:
+            catalog.update_video(1, title='A medias')
+            catalog.delete_playlist(1)
+            raise RuntimeError('falla a mitad de la transacción')
+
+    assert store.read() is before
+    assert before.videos[1]['title'] == 'Video 1'
+    assert before.videos[1]['playlist_id'] == 1
+    assert [v['id'] for v in before.videos_with_playlist(1)] == list(range(1, 11))
+    with open(data_path, 'rb') as f:
+        assert f.read() == saved
+
+
+def test_concurrent_reads_and_writes(data_path):
+    # Cambios de hilo muy frecuentes para que las lecturas coincidan con las escrituras
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    store = CatalogStore(data_path)
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                catalog = store.read()
+                total, page = catalog.query('videos', 'title', text='video 1', limit=20)
+                assert len(page) == min(total, 20)
+                catalog.query('videos', 'views', descending=True, category_id=1)
+                for video in catalog.videos_in_category(2):
+                    assert video['category_id'] == 2
+                assert len(catalog.videos) == len(catalog.data['videos'])
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for i in range(1, 41):
+            with store.write() as catalog:
+                catalog.increment(i, 'views')
+                catalog.update_video(i, category_id=1 + (i + 1) % 2, title=f'Video {i} editado')
+                if i % 5 == 0:
+                    catalog.delete_video(i + 100)
+                catalog.add_video({'id': 1000 + i, 'title': f'Video nuevo {i}', 'video_url': 'x',
+                                   'category_id': 1, 'related_videos': [i]})
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+        sys.setswitchinterval(previous)
+
+    assert errors == []
+    catalog = store.read()
+    assert len(catalog.videos) == 200 - 8 + 40
+    assert catalog.videos[3]['views'] == 1
+    assert {v['id'] for v in catalog.videos_referencing(3)} == {2, 1003}
+
+
+def test_other_processes_catch_up_from_the_journal(data_path, monkeypatch):
+    writer, reader = CatalogStore(data_path), CatalogStore(data_path)
+    before = reader.read()
+    writer.read()
+    with writer.write() as catalog:
+        catalog.update_video(2, title='Editado', related_videos=[9])
+        catalog.delete_video(3)
+        catalog.settings['related_videos_count'] = 9
+    with writer.write() as catalog:
+        catalog.add_video({'id': 500, 'title': 'Nuevo', 'video_url': 'x', 'category_id': 2,
+                           'related_videos': [2]})
+
+    def no_reload():
+        raise AssertionError('debería ponerse al día con el diario')
+
+    monkeypatch.setattr(reader, '_reload', no_reload)
+    after = reader.read()
+    assert after is not before
+    assert after.videos[2]['title'] == 'Editado'
+    assert [v['id'] for v in after.videos_referencing(9)] == [2, 8]
+    assert 3 not in after.videos and 3 not in after.playlists[1]['videos']
+    assert [v['id'] for v in after.videos_referencing(2)] == [1, 500]
+    assert after.settings['related_videos_count'] == 9
+    assert after.data['videos'] == writer.read().data['videos']
+    # La versión anterior y sus registros no cambiaron
+    assert before.videos[2]['title'] == 'Video 2'
+    assert 3 in before.videos and 500 not in before.videos
+    assert [v['id'] for v in before.videos_referencing(9)] == [8]
+    assert before.settings['related_videos_count'] == 6
+
+
+def test_changes_without_journal_entries_reload_everything(data_path):
+    writer, reader = CatalogStore(data_path), CatalogStore(data_path)
+    reader.read()
+    with writer.write() as catalog:
+        catalog.update_video(1, title='Editado')
+    # Un cambio hecho por fuera de la aplicación no deja entrada en el diario
+    data = make_catalog()
+    data['videos'][0]['title'] = 'Desde fuera'
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    assert reader.read().videos[1]['title'] == 'Desde fuera'
+
+    # Un diario roto tampoco se aplica a medias
+    with writer.write() as catalog:
+        catalog.update_video(1, title='Otra vez')
+    with open(f'{data_path}.journal', 'a', encoding='utf-8') as f:
+        f.write('{"roto": \n')
+    assert reader.read().videos[1]['title'] == 'Otra vez'
+
+
+def test_apply_changes_replaces_records(data_path):
+    current = CatalogStore(data_path).read()
+    catalog = current.copy()
+    old = current.videos[4]
+    catalog.apply_changes({'videos': {'4': {**old, 'category_id': 2, 'related_videos': []},
+                                      '6': None},
+                           'playlists': {'1': {**current.playlists[1], 'videos': [4]}}},
+                          {'related_videos_count': 1})
+    assert catalog.videos[4] is not old and old['category_id'] == 1
+    assert 4 in {v['id'] for v in catalog.videos_in_category(2)}
+    assert 4 not in {v['id'] for v in current.videos_in_category(2)}
+    assert catalog.videos_referencing(5) == [] and current.videos_referencing(5) == [old]
+    assert 6 not in catalog.videos and 6 in current.videos
+    assert [p['id'] for p in catalog.playlists_containing(4)] == [1]
+    assert catalog.playlists_containing(5) == []
+    assert current.playlists[1]['videos'] == list(range(1, 11))
@@ -0,0 +1,114 @@
+"""Cabeceras Range del proxy de video y caché faststart"""
+import fcntl
+import os
+import time
+
+import pytest
+
+import mp4
+from streaming import (FaststartCache, RangeNotSatisfiable, StreamProxy, UpstreamError, _url_key,
+                       parse_range)
+
+
+def test_single_ranges():
+    assert parse_range(None, 1000) is None
+    assert parse_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_range('bytes=500-', 1000) == (500, 999)
+    assert parse_range('bytes = 900 - 5000', 1000) == (900, 999)
+
+
+def test_suffix_ranges():
+    assert parse_range('bytes=-100', 1000) == (900, 999)
+    # Un sufijo mayor que el archivo es el archivo entero
+    assert parse_range('bytes=-5000', 1000) == (0, 999)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=-0', 1000)
+
+
+def test_unsatisfiable_ranges():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=1000-', 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=2000-3000', 1000)
+
+
+def test_ranges_answered_with_the_whole_file():
+    # Varios rangos, rangos al revés y unidades desconocidas: 200 con el archivo completo
+    assert parse_range('bytes=0-99,200-299', 1000) is None
+    assert parse_range('bytes=500-100', 1000) is None
+    assert parse_range('items=0-10', 1000) is None
+    assert parse_range('bytes=-', 1000) is None
+
+
+def test_faststart_cache_downloads_once_across_workers(origin, tmp_path):
+    content = mp4.serialize_boxes([[b'ftyp', b'isom\x00\x00\x02\x00isom'], [b'mdat', bytes(5000)],
+                                   [b'moov', [[b'mvhd', bytes(100)]]]])
+    origin.files['/video.mp4'] = content
+    url = f'{origin.url}/video.mp4'
+    # Dos workers con la misma carpeta
+    first = FaststartCache(tmp_path, StreamProxy())
+    second = FaststartCache(tmp_path, StreamProxy())
+    scheduled = []
+
+    def schedule(fn, *args):
+        scheduled.append((fn, args))
+
+    assert first.lookup(url, schedule) is None
+    assert second.lookup(url, schedule) is None
+    # Mientras el primero tiene el bloqueo, el segundo no descarga y lo deja para más tarde
+    lock_path = os.path.join(tmp_path, f"{_url_key(f'{url}|{len(content)}|None|None')}.mp4.lock")
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        fn, args = scheduled.pop()
+        fn(*args)
+    assert not any(path == '/video.mp4' and byte_range is None for path, byte_range in origin.requests)
+    assert second.lookup(url, schedule) is None
+    assert len(scheduled) == 1
+
+    fn, args = scheduled.pop()
+    fn(*args)
+    path = first.lookup(url, schedule)
+    assert path is not None
+    with open(path, 'rb') as f:
+        assert [box[0] for box in mp4.top_level_boxes(mp4.file_reader(f), len(content))] == \
+            [b'ftyp', b'moov', b'mdat']
+    # El otro worker encuentra la copia cuando le toca volver a mirar
+    second._states.clear()
+    assert second.lookup(url, schedule) == path
+    assert sum(1 for path, byte_range in origin.requests if byte_range is None) == 1
+
+
+class FlakyProxy(StreamProxy):
+    """Proxy cuya descarga completa falla mientras failing sea True"""
+    failing = True
+
+    def _open_upstream(self, url, range_header=None, *args, **kwargs):
+        if range_header is None and self.failing:
+            raise UpstreamError('El origen respondió 503')
+        return super()._open_upstream(url, range_header, *args, **kwargs)
+
+
+def test_faststart_cache_retries_after_upstream_errors(origin, tmp_path):
+    origin.files['/video.mp4'] = mp4.serialize_boxes([[b'mdat', bytes(5000)], [b'moov', [[b'mvhd', bytes(100)]]]])
+    url = f'{origin.url}/video.mp4'
+    proxy = FlakyProxy()
+    cache = FaststartCache(tmp_path, proxy, retry_after=0.2)
+    run = lambda fn, *args: fn(*args)
+
+    assert cache.lookup(url, run) is None
+    proxy.failing = False
+    # Hasta que pasa retry_after no se vuelve a intentar
+    assert cache.lookup(url, run) is None
+    time.sleep(0.2)
+    assert cache.lookup(url, run) is None
+    assert cache.lookup(url, run) is not None
+
+
+def test_faststart_cache_skips_files_that_cannot_be_rewritten(origin, tmp_path):
+    origin.files['/video.webm'] = b'\x1a\x45\xdf\xa3' + bytes(5000)
+    url = f'{origin.url}/video.webm'
+    cache = FaststartCache(tmp_path, StreamProxy())
+    scheduled = []
+    assert cache.lookup(url, lambda fn, *args: scheduled.append(fn(*args))) is None
+    assert cache.lookup(url, lambda fn, *args: scheduled.append(fn(*args))) is None
+    assert len(scheduled) == 1
@@ -0,0 +1,30 @@
+"""Miniaturas descargadas de un servidor HTTP local, redimensionadas y en caché"""
+from io import BytesIO
+
+from PIL import Image
+
+from thumbnails import ThumbnailCache
+
+
+def make_image(width=1280, height=720):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_thumbnail_is_resized_and_cached(origin, tmp_path):
+    origin.files['/cover.jpg'] = make_image()
+    cache = ThumbnailCache(tmp_path)
+    url = f'{origin.url}/cover.jpg'
+
+    path, etag = cache.get(url, 320, 180, 'webp')
+    with Image.open(path) as image:
+        assert image.format == 'WEBP'
+        assert image.size == (320, 180)
+
+    # Mismo tamaño: sale de la caché; otro tamaño: se genera desde la copia local
+    assert cache.get(url, 320, 180, 'webp') == (path, etag)
+    other_path, _ = cache.get(url, 640, 360, 'jpeg')
+    with Image.open(other_path) as image:
+        assert image.size == (640, 360)
+    assert len(origin.requests) == 1
@@ -0,0 +1,94 @@
+"""Subidas por partes: orden, checksums, finalización y concurrencia"""
+import hashlib
+import io
+import os
+
+import pytest
+
+from uploads import UploadConflict, UploadError, UploadNotFound, UploadStore
+
+CHUNK = 1024
+CONTENT = os.urandom(3 * CHUNK + 100)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(tmp_path / 'partial', tmp_path / 'media', chunk_size=CHUNK)
+
+
+def send(store, upload_id, index, data=None, sha256=None):
+    data = CONTENT[index * CHUNK:(index + 1) * CHUNK] if data is None else data
+    return store.write_chunk(upload_id, index * CHUNK, len(data), io.BytesIO(data), sha256=sha256)
+
+
+def test_chunks_in_any_order(store):
+    upload_id = store.create('video.mp4', len(CONTENT), {})['upload_id']
+    for index in (3, 1, 0):
+        send(store, upload_id, index)
+    status = store.status(upload_id)
+    assert status['missing'] == [2]
+    assert status['received']['3'] == hashlib.sha256(CONTENT[3 * CHUNK:]).hexdigest()
+    with pytest.raises(UploadError):
+        with store.finalize(upload_id):
+            pass
+
+    send(store, upload_id, 2)
+    with store.finalize(upload_id) as (final_name, meta):
+        assert meta['filename'] == 'video.mp4'
+    with open(os.path.join(store.upload_folder, final_name), 'rb') as f:
+        assert f.read() == CONTENT
+    with pytest.raises(UploadNotFound):
+        store.status(upload_id)
+
+
+def test_bad_checksum_leaves_the_chunk_missing(store):
+    upload_id = store.create('video.mp4', len(CONTENT), {})['upload_id']
+    send(store, upload_id, 0)
+    # Un reenvío con otros datos no deja la parte como recibida
+    with pytest.raises(UploadError):
+        send(store, upload_id, 0, data=bytes(CHUNK), sha256=hashlib.sha256(CONTENT[:CHUNK]).hexdigest())
+    assert 0 in store.status(upload_id)['missing']
+    with pytest.raises(UploadError):
+        send(store, upload_id, 1, data=CONTENT[:10])
+
+    good = hashlib.sha256(CONTENT[:CHUNK]).hexdigest()
+    assert send(store, upload_id, 0, sha256=good.upper()) == good
+    assert 0 not in store.status(upload_id)['missing']
+
+
+def test_failed_finalize_can_be_retried(store):
+    upload_id = store.create('video.mp4', len(CONTENT), {})['upload_id']
+    for index in range(4):
+        send(store, upload_id, index)
+
+    with pytest.raises(RuntimeError):
+        with store.finalize(upload_id) as (final_name, meta):
+            raise RuntimeError('no se pudo crear el video')
+    assert not os.path.exists(os.path.join(store.upload_folder, final_name))
+    assert store.status(upload_id)['missing'] == []
+
+    with store.finalize(upload_id) as (final_name, meta):
+        pass
+    with open(os.path.join(store.upload_folder, final_name), 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_concurrent_finalize_is_a_conflict(store):
+    upload_id = store.create('video.mp4', len(CONTENT), {})['upload_id']
+    for index in range(4):
+        send(store, upload_id, index)
+
+    with store.finalize(upload_id) as (final_name, meta):
+        with pytest.raises(UploadConflict):
+            with store.finalize(upload_id):
+                pass
+        with pytest.raises(UploadConflict):
+            send(store, upload_id, 0)
+        with pytest.raises(UploadConflict):
+            store.abort(upload_id)
+    # Cuando la otra petición consigue finalizar, la subida ya no existe
+    with pytest.raises(UploadNotFound):
+        with store.finalize(upload_id):
+            pass
+    with open(os.path.join(store.upload_folder, final_name), 'rb') as f:
+        assert f.read() == CONTENT
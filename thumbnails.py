@@ -0,0 +1,205 @@
+"""Miniaturas redimensionadas servidas desde una caché local en disco.
+
+La imagen de origen se descarga una sola vez y se guarda por el hash de su
+contenido; cada tamaño pedido se genera con Pillow a partir de esa copia y
+se guarda como WebP o JPEG. Cuando la caché supera su tamaño máximo se
+borran los archivos usados hace más tiempo.
+"""
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from upstream import create_session
+
+# Tamaños que usan las plantillas y su versión 2x para pantallas densas
+ALLOWED_SIZES = {
+    (320, 180), (640, 360),
+    (360, 202), (720, 404),
+    (200, 112), (400, 224),
+    (168, 94), (336, 188),
+}
+
+# formato -> (formato de Pillow, mimetype)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+# Texto de las imágenes de reemplazo según el tipo de miniatura
+PLACEHOLDER_LABELS = {
+    'video': 'Thumbnail',
+    'playlist': 'Playlist',
+}
+
+
+class ThumbnailError(Exception):
+    """No se pudo descargar o procesar la imagen de origen"""
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, session=None,
+                 timeout=10, quality=80):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.quality = quality
+
+        self.sources_dir = os.path.join(self.cache_dir, 'sources')
+        self.renders_dir = os.path.join(self.cache_dir, 'renders')
+        self.urls_dir = os.path.join(self.cache_dir, 'urls')
+        for folder in (self.sources_dir, self.renders_dir, self.urls_dir):
+            os.makedirs(folder, exist_ok=True)
+
+        # Un lock por franja de URLs evita descargar dos veces la misma imagen
+        self._stripes = [threading.Lock() for _ in range(64)]
+        self._size_lock = threading.Lock()
+        self._total_bytes = None
+
+    def get(self, source_url, width, height, fmt='webp'):
+        """Devuelve (ruta, etag) de la miniatura, generándola si hace falta"""
+        if (width, height) not in ALLOWED_SIZES:
+            raise ValueError(f'Tamaño no permitido: {width}x{height}')
+        pil_format = FORMATS[fmt][0]
+
+        url_key = hashlib.sha256(source_url.encode('utf-8')).hexdigest()
+        with self._stripes[int(url_key[:8], 16) % len(self._stripes)]:
+            digest = self._source_digest(source_url, url_key)
+            name = f'{digest}-{width}x{height}.{fmt}'
+            path = os.path.join(self.renders_dir, name)
+
+            if os.path.exists(path):
+                _touch(path)
+                return path, name
+
+            source_path = os.path.join(self.sources_dir, digest)
+            try:
+                with Image.open(source_path) as image:
+                    # Para JPEG, draft() decodifica directamente a menor escala
+                    image.draft('RGB', (width * 2, height * 2))
+                    image = ImageOps.exif_transpose(image).convert('RGB')
+                    thumb = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            except (OSError, Image.DecompressionBombError) as e:
+                raise ThumbnailError(f'Imagen de origen no válida: {e}')
+
+            buffer = BytesIO()
+            thumb.save(buffer, pil_format, quality=self.quality, optimize=True)
+            _write_atomic(path, buffer.getvalue())
+            self._account(buffer.tell())
+
+        return path, name
+
+    def _source_digest(self, source_url, url_key):
+        """Hash del contenido de la imagen de origen, descargándola si no está en disco"""
+        url_path = os.path.join(self.urls_dir, url_key)
+        try:
+            with open(url_path, 'r') as f:
+                digest = f.read().strip()
+            source_path = os.path.join(self.sources_dir, digest)
+            if os.path.exists(source_path):
+                _touch(source_path)
+                return digest
+        except FileNotFoundError:
+            pass
+
+        body = self._fetch(source_url)
+        digest = hashlib.sha256(body).hexdigest()
+        source_path = os.path.join(self.sources_dir, digest)
+        if not os.path.exists(source_path):
+            _write_atomic(source_path, body)
+            self._account(len(body))
+        _write_atomic(url_path, digest.encode('ascii'))
+        return digest
+
+    def _fetch(self, source_url):
+        if not source_url.startswith(('http://', 'https://')):
+            raise ThumbnailError(f'URL de origen no soportada: {source_url}')
+        try:
+            with self.session.get(source_url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    raise ThumbnailError(f'El origen respondió {response.status_code}')
+                chunks = []
+                received = 0
+                for chunk in response.iter_content(64 * 1024):
+                    received += len(chunk)
+                    if received > MAX_SOURCE_BYTES:
+                        raise ThumbnailError('La imagen de origen es demasiado grande')
+                    chunks.append(chunk)
+        except OSError as e:
+            # requests.RequestException hereda de OSError
+            raise ThumbnailError(f'No se pudo descargar la imagen: {e}')
+        return b''.join(chunks)
+
+    def _account(self, nbytes):
+        with self._size_lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+            else:
+                self._total_bytes += nbytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Borra los archivos menos usados hasta bajar al 90% del máximo"""
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def _entries(self):
+        for folder in (self.sources_dir, self.renders_dir):
+            for entry in os.scandir(folder):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    yield entry
+
+
+def render_placeholders(sizes=ALLOWED_SIZES, labels=PLACEHOLDER_LABELS):
+    """Genera en memoria las imágenes de reemplazo: {(tipo, ancho, alto): bytes PNG}"""
+    placeholders = {}
+    for kind, label in labels.items():
+        for width, height in sizes:
+            image = Image.new('RGB', (width, height), (51, 51, 51))
+            draw = ImageDraw.Draw(image)
+            font = _placeholder_font(max(10, height // 8))
+            left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+            position = ((width - (right - left)) / 2 - left, (height - (bottom - top)) / 2 - top)
+            draw.text(position, label, fill=(255, 255, 255), font=font)
+
+            buffer = BytesIO()
+            image.save(buffer, 'PNG', optimize=True)
+            placeholders[(kind, width, height)] = buffer.getvalue()
+    return placeholders
+
+
+def _placeholder_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 solo tiene la fuente bitmap de tamaño fijo
+        return ImageFont.load_default()
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,249 @@
+"""Subida de videos por partes, reanudable.
+
+El cliente crea la subida indicando nombre y tamaño, envía cada parte con
+su offset (en cualquier orden, y reintentando las que fallen) y al final
+la cierra. Cada parte se escribe directamente en su posición del archivo
+en disco, leyendo el cuerpo de la petición por bloques, así que la memoria
+usada no depende del tamaño del video.
+
+Estructura en disco de cada subida en curso:
+
+    <partial_folder>/<upload_id>/meta.json      nombre, tamaño y campos del video
+    <partial_folder>/<upload_id>/data           el archivo (disperso hasta completarse)
+    <partial_folder>/<upload_id>/chunks/<n>     sha256 de cada parte ya escrita
+    <partial_folder>/<upload_id>/lock           flock de la subida
+
+Cada parte tiene su propio archivo de registro, así que varias partes
+pueden llegar a la vez (incluso a workers distintos) sin pisarse. El
+registro de una parte se borra antes de escribirla y solo se vuelve a
+crear cuando los datos llegaron completos y con el checksum correcto: un
+reenvío que falle deja la parte como pendiente, nunca como recibida con
+otros datos.
+
+Escribir una parte toma el flock de la subida compartido y finalizarla o
+cancelarla lo toma exclusivo, sin esperar en ningún caso: si dos
+peticiones intentan finalizar la misma subida (un doble clic, un
+reintento, o cada una en un worker) solo una mueve el archivo y la otra
+recibe UploadConflict, igual que una parte que llega mientras se finaliza.
+
+Una subida caduca expire_after segundos después de la última parte
+recibida (la fecha de modificación de meta.json), no desde que se creó.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+from werkzeug.utils import secure_filename
+
+READ_SIZE = 64 * 1024
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Petición de subida no válida"""
+
+
+class UploadNotFound(UploadError):
+    """La subida no existe o ya se cerró"""
+
+
+class UploadConflict(UploadError):
+    """Otra petición está finalizando la subida o escribiendo en ella"""
+
+
+class UploadStore:
+    def __init__(self, partial_folder, upload_folder, chunk_size=8 * 1024 * 1024,
+                 max_bytes=20 * 1024 * 1024 * 1024, expire_after=24 * 3600):
+        self.partial_folder = os.path.abspath(partial_folder)
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.expire_after = expire_after
+        os.makedirs(self.partial_folder, exist_ok=True)
+
+    def create(self, filename, size, fields):
+        """Registra una subida nueva y devuelve su estado"""
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError('Nombre de archivo no válido')
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('Tamaño de archivo no válido')
+        if size > self.max_bytes:
+            raise UploadError('El archivo supera el tamaño máximo permitido')
+
+        self.remove_expired()
+
+        upload_id = uuid.uuid4().hex
+        folder = self._folder(upload_id)
+        os.makedirs(os.path.join(folder, 'chunks'))
+        # Archivo disperso del tamaño final: cada parte se escribe en su sitio
+        with open(os.path.join(folder, 'data'), 'wb') as f:
+            f.truncate(size)
+
+        meta = {
+            'id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'fields': fields,
+            'created_at': time.time(),
+        }
+        with open(os.path.join(folder, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """Estado de la subida: partes recibidas con su checksum y partes que faltan"""
+        meta = self._meta(upload_id)
+        received = self._received(upload_id)
+        total = self._chunk_count(meta)
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'chunk_size': meta['chunk_size'],
+            'chunks': total,
+            'received': {str(index): checksum for index, checksum in sorted(received.items())},
+            'missing': [index for index in range(total) if index not in received],
+        }
+
+    def write_chunk(self, upload_id, offset, length, stream, sha256=None):
+        """Copia una parte desde stream a su posición del archivo
+
+        Devuelve el sha256 de la parte. Si se indica sha256 y no coincide,
+        la parte no se registra y el cliente debe reenviarla.
+        """
+        with self._locked(upload_id, exclusive=False):
+            meta = self._meta(upload_id)
+            chunk_size = meta['chunk_size']
+            if offset < 0 or offset % chunk_size or offset >= meta['size']:
+                raise UploadError(f'Offset no válido: {offset}')
+            index = offset // chunk_size
+            expected = min(chunk_size, meta['size'] - offset)
+            if length != expected:
+                raise UploadError(f'La parte {index} debe tener {expected} bytes')
+
+            folder = self._folder(upload_id)
+            record = os.path.join(folder, 'chunks', str(index))
+            # Mientras se escribe, la parte deja de contar como recibida
+            try:
+                os.remove(record)
+            except FileNotFoundError:
+                pass
+            # Actividad de la subida: retrasa su caducidad
+            os.utime(os.path.join(folder, 'meta.json'))
+
+            digest = hashlib.sha256()
+            fd = os.open(os.path.join(folder, 'data'), os.O_WRONLY)
+            try:
+                position = offset
+                remaining = length
+                while remaining > 0:
+                    block = stream.read(min(READ_SIZE, remaining))
+                    if not block:
+                        raise UploadError(f'La parte {index} llegó incompleta')
+                    digest.update(block)
+                    os.pwrite(fd, block, position)
+                    position += len(block)
+                    remaining -= len(block)
+                checksum = digest.hexdigest()
+                if sha256 and sha256.lower() != checksum:
+                    raise UploadError(f'El checksum de la parte {index} no coincide')
+                # La parte solo se da por recibida cuando los datos están en disco
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            with open(f'{record}.tmp', 'w') as f:
+                f.write(checksum)
+            os.replace(f'{record}.tmp', record)
+        return checksum
+
+    @contextmanager
+    def finalize(self, upload_id):
+        """Mueve el archivo completo a upload_folder y entrega (nombre final, meta)
+
+        Si el bloque with falla (por ejemplo, al crear el video), el archivo
+        vuelve a la subida, que se puede finalizar de nuevo.
+        """
+        with self._locked(upload_id, exclusive=True):
+            # Comprobado con el bloqueo: otra petición pudo finalizarla mientras tanto
+            meta = self._meta(upload_id)
+            missing = [i for i in range(self._chunk_count(meta)) if i not in self._received(upload_id)]
+            if missing:
+                raise UploadError(f'Faltan {len(missing)} partes por subir')
+
+            folder = self._folder(upload_id)
+            final_name = f"{upload_id[:8]}-{meta['filename']}"
+            os.makedirs(self.upload_folder, exist_ok=True)
+            data_path = os.path.join(folder, 'data')
+            final_path = os.path.join(self.upload_folder, final_name)
+            # shutil.move usa rename si ambas carpetas están en el mismo disco
+            shutil.move(data_path, final_path)
+            try:
+                yield final_name, meta
+            except BaseException:
+                shutil.move(final_path, data_path)
+                raise
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def abort(self, upload_id):
+        with self._locked(upload_id, exclusive=True):
+            self._meta(upload_id)
+            shutil.rmtree(self._folder(upload_id), ignore_errors=True)
+
+    def remove_expired(self):
+        limit = time.time() - self.expire_after
+        for entry in os.scandir(self.partial_folder):
+            meta_path = os.path.join(entry.path, 'meta.json')
+            try:
+                if entry.is_dir() and os.path.getmtime(meta_path) < limit:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def _locked(self, upload_id, exclusive):
+        """flock de la subida sin esperar; UploadConflict si otra petición lo impide"""
+        try:
+            f = open(os.path.join(self._folder(upload_id), 'lock'), 'a')
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        with f:
+            try:
+                fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict('La subida se está finalizando' if not exclusive else
+                                     'La subida se está finalizando o tiene partes en curso')
+            yield
+
+    def _folder(self, upload_id):
+        if not UPLOAD_ID_RE.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        return os.path.join(self.partial_folder, upload_id)
+
+    def _meta(self, upload_id):
+        try:
+            with open(os.path.join(self._folder(upload_id), 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+
+    def _received(self, upload_id):
+        received = {}
+        for entry in os.scandir(os.path.join(self._folder(upload_id), 'chunks')):
+            if entry.name.isdigit():
+                with open(entry.path, 'r') as f:
+                    received[int(entry.name)] = f.read().strip()
+        return received
+
+    @staticmethod
+    def _chunk_count(meta):
+        return -(-meta['size'] // meta['chunk_size'])
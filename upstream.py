@@ -0,0 +1,26 @@
+"""Sesiones HTTP compartidas para hablar con los servidores de origen.
+
+Miniaturas, video y comprobaciones de enlaces reutilizan conexiones
+keep-alive en lugar de abrir una conexión nueva por cada petición.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'VC7Day/1.0'
+
+
+def create_session(pool_connections=10, pool_maxsize=10, pool_block=False):
+    """Crea una sesión con un pool de conexiones por host.
+
+    pool_maxsize limita las conexiones abiertas hacia cada host y, con
+    pool_block=True, las peticiones que superan ese límite esperan a que
+    se libere una conexión en lugar de abrir otra.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session